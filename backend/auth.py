@@ -2,17 +2,21 @@
 Authentication module: Tailscale headers → JWT fallback → 401.
 """
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-import bcrypt
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from loguru import logger
 
-from database import get_db, User
+from database import get_async_db, User
+from services.principal_cache import principal_cache, tailscale_key, token_key
+from services.password_hasher import hash_password_sync, verify_password_sync
 
 # Config
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "comfyui-wrapper-secret-change-me-in-production")
@@ -23,11 +27,12 @@ bearer_scheme = HTTPBearer(auto_error=False)
 
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    """Blocking hash (CLI scripts); request handlers use services.password_hasher."""
+    return hash_password_sync(password)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
+    return verify_password_sync(plain, hashed)
 
 
 def create_access_token(user_id: int, username: str) -> str:
@@ -36,21 +41,27 @@ def create_access_token(user_id: int, username: str) -> str:
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def _get_tailscale_user(request: Request, db: Session) -> Optional[User]:
+async def _get_tailscale_user(request: Request, db: AsyncSession) -> Optional[User]:
     """Check Tailscale identity headers, auto-create user if new."""
     ts_login = request.headers.get("Tailscale-User-Login")
     if not ts_login:
         return None
 
-    user = db.query(User).filter(User.tailscale_login == ts_login).first()
+    cache_key = tailscale_key(ts_login)
+    user = principal_cache.get(cache_key)
     if user:
         return user
 
+    user = await db.scalar(select(User).where(User.tailscale_login == ts_login).limit(1))
+    if user:
+        principal_cache.put(cache_key, user)
+        return user
+
     # Auto-create from Tailscale headers
     ts_name = request.headers.get("Tailscale-User-Name", ts_login.split("@")[0])
     ts_pic = request.headers.get("Tailscale-User-Profile-Pic")
 
-    is_first = db.query(User).count() == 0
+    is_first = await db.scalar(select(func.count()).select_from(User)) == 0
     user = User(
         username=ts_login,
         display_name=ts_name,
@@ -59,28 +70,45 @@ def _get_tailscale_user(request: Request, db: Session) -> Optional[User]:
         is_admin=is_first,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     if is_first:
-        _adopt_orphaned_data(db, user.id)
+        await db.run_sync(_adopt_orphaned_data, user.id)
 
     logger.info(f"Auto-created Tailscale user: {ts_login} (admin={is_first})")
+    principal_cache.put(cache_key, user)
     return user
 
 
-def _get_jwt_user(credentials: Optional[HTTPAuthorizationCredentials], db: Session) -> Optional[User]:
+async def _get_jwt_user(credentials: Optional[HTTPAuthorizationCredentials], db: AsyncSession) -> Optional[User]:
     """Decode JWT Bearer token."""
     if not credentials:
         return None
+    return await _get_token_user(credentials.credentials, db)
+
+
+async def _get_token_user(token: str, db: AsyncSession) -> Optional[User]:
+    cache_key = token_key(token)
+    user = principal_cache.get(cache_key)
+    if user:
+        return user
+
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = int(payload.get("sub", 0))
-        if not user_id:
-            return None
-        return db.query(User).filter(User.id == user_id).first()
     except (JWTError, ValueError):
         return None
+    if not user_id:
+        return None
+    user = await db.get(User, user_id)
+    if user:
+        # Never serve a cached principal past the token's own expiry
+        expires_at = None
+        if payload.get("exp"):
+            expires_at = time.monotonic() + (float(payload["exp"]) - time.time())
+        principal_cache.put(cache_key, user, expires_at)
+    return user
 
 
 def _adopt_orphaned_data(db: Session, user_id: int):
@@ -95,17 +123,17 @@ def _adopt_orphaned_data(db: Session, user_id: int):
 
 async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
 ) -> User:
     """FastAPI dependency: Tailscale → JWT → 401."""
     # Priority 1: Tailscale headers
-    user = _get_tailscale_user(request, db)
+    user = await _get_tailscale_user(request, db)
     if user:
         return user
 
     # Priority 2: JWT Bearer token
-    user = _get_jwt_user(credentials, db)
+    user = await _get_jwt_user(credentials, db)
     if user:
         return user
 
@@ -116,15 +144,15 @@ async def get_current_user(
     )
 
 
-async def get_current_user_ws(token: Optional[str], db: Session) -> Optional[User]:
+async def get_current_admin(user: User = Depends(get_current_user)) -> User:
+    """FastAPI dependency: the current user, 403 unless they are an admin."""
+    if not user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return user
+
+
+async def get_current_user_ws(token: Optional[str], db: AsyncSession) -> Optional[User]:
     """Get user from WebSocket query param token."""
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload.get("sub", 0))
-        if not user_id:
-            return None
-        return db.query(User).filter(User.id == user_id).first()
-    except (JWTError, ValueError):
-        return None
+    return await _get_token_user(token, db)
@@ -0,0 +1,105 @@
+"""
+Mixed read/write SQLite benchmark: default engine vs database.create_db_engine.
+
+Simulates the production pattern: a few writer threads inserting gallery rows
+(auto-save) while reader threads page through the gallery. Reports throughput
+and "database is locked" errors for each engine configuration.
+
+Usage (from backend/):
+    python benchmarks/bench_sqlite.py --seconds 5 --readers 8 --writers 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Base, GalleryImage, create_db_engine  # noqa: E402
+
+
+def _row(i: int) -> GalleryImage:
+    return GalleryImage(
+        prompt_id=f"bench-{i}", user_id=1, workflow_id="default", filename=f"img_{i}.png",
+        subfolder="", prompt_positive="benchmark " * 20, prompt_negative="", model="bench.safetensors",
+        width=1024, height=1024, steps=8, cfg=1.0,
+    )
+
+
+def run(label: str, engine, seconds: float, readers: int, writers: int, seed_rows: int) -> dict:
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        db.add_all([_row(i) for i in range(seed_rows)])
+        db.commit()
+
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def reader():
+        while time.perf_counter() < stop:
+            try:
+                with Session() as db:
+                    db.query(GalleryImage.id, GalleryImage.filename).filter(GalleryImage.user_id == 1) \
+                        .order_by(GalleryImage.created_at.desc(), GalleryImage.id.desc()).limit(50).all()
+                with lock:
+                    counts["reads"] += 1
+            except OperationalError:
+                with lock:
+                    counts["locked"] += 1
+
+    def writer(offset: int):
+        i = seed_rows + offset * 1_000_000
+        while time.perf_counter() < stop:
+            try:
+                with Session() as db:
+                    db.add_all([_row(i + n) for n in range(4)])  # one prompt = a small batch
+                    db.commit()
+                i += 4
+                with lock:
+                    counts["writes"] += 1
+            except OperationalError:
+                with lock:
+                    counts["locked"] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    result = {
+        "label": label,
+        "reads_per_s": round(counts["reads"] / seconds, 1),
+        "write_batches_per_s": round(counts["writes"] / seconds, 1),
+        "locked_errors": counts["locked"],
+    }
+    print(f"{label:<10} reads/s={result['reads_per_s']:>9}  write batches/s={result['write_batches_per_s']:>8}  locked={result['locked_errors']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seed-rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = create_engine(f"sqlite:///{os.path.join(tmp, 'before.db')}", connect_args={"check_same_thread": False})
+        after = create_db_engine(f"sqlite:///{os.path.join(tmp, 'after.db')}")
+        run("before", before, args.seconds, args.readers, args.writers, args.seed_rows)
+        run("after", after, args.seconds, args.readers, args.writers, args.seed_rows)
+
+
+if __name__ == "__main__":
+    main()
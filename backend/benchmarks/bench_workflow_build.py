@@ -0,0 +1,71 @@
+"""
+Micro-benchmark: workflow builds per second, JSON round-trip copy vs compiled templates.
+
+The "legacy" path reproduces the previous build: json.loads(json.dumps(graph))
+followed by in-place parameter writes. The "compiled" path is
+services.workflow_service.build_comfy_workflow.
+
+Usage (from backend/):
+    python benchmarks/bench_workflow_build.py --builds 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schemas.comfy_schemas import ImageGenerateRequest  # noqa: E402
+from services.workflow_registry import workflow_registry  # noqa: E402
+from services.workflow_service import build_comfy_workflow, select_template  # noqa: E402
+
+
+def load_source(name: str) -> dict:
+    with open(workflow_registry.entries[name].path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def legacy_build(request: ImageGenerateRequest, graph: dict) -> dict:
+    workflow = json.loads(json.dumps(graph))
+    template = select_template(request)
+    values = {
+        "positive_prompt": request.positive_prompt, "negative_prompt": request.negative_prompt,
+        "width": request.width, "height": request.height, "batch_size": request.batch_size,
+        "seed": random.randint(0, 2**32 - 1), "extra_seed": random.randint(0, 2**32 - 1),
+        "steps": request.steps, "cfg": request.cfg, "sampler_name": request.sampler_name,
+    }
+    for node_id, input_name, param in template.slots:
+        if param in values:
+            workflow[node_id]["inputs"][input_name] = values[param]
+    return workflow
+
+
+def bench(label: str, fn, builds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(builds):
+        fn()
+    elapsed = time.perf_counter() - started
+    rate = builds / elapsed
+    print(f"{label:<28} {rate:>12,.0f} builds/s  ({elapsed * 1e6 / builds:.1f} us/build)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--builds", type=int, default=20000)
+    args = parser.parse_args()
+    workflow_registry.load()
+
+    for name, workflow_id, model in (("turbo_aio", "turbo-gen", None), ("upscale", "upscale", None),
+                                     ("flux", "flux-realism", "flux1-dev.safetensors")):
+        request = ImageGenerateRequest(positive_prompt="a lighthouse at dusk", workflow_id=workflow_id, model=model)
+        assert select_template(request) is workflow_registry.get(name)
+        source = load_source(name)
+        legacy = bench(f"{name} json round-trip", lambda: legacy_build(request, source), args.builds)
+        compiled = bench(f"{name} compiled", lambda: build_comfy_workflow(request), args.builds)
+        print(f"{'':<28} {compiled / legacy:>11.1f}x\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, JSON, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, Float, JSON, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
@@ -7,11 +9,85 @@ from sqlalchemy.orm import sessionmaker, relationship
 import os
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATABASE_URL = f"sqlite:///{os.path.join(PROJECT_ROOT, 'app.db')}"
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# SQLite tuning (per connection). WAL lets gallery reads proceed while auto-save writes.
+DB_JOURNAL_MODE = os.environ.get("COMFY_DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.environ.get("COMFY_DB_SYNCHRONOUS", "NORMAL")
+DB_MMAP_SIZE = int(os.environ.get("COMFY_DB_MMAP_MB", "256")) * 1024 * 1024
+DB_CACHE_SIZE_KB = int(os.environ.get("COMFY_DB_CACHE_MB", "64")) * 1024
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("COMFY_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_POOL_SIZE = int(os.environ.get("COMFY_DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.environ.get("COMFY_DB_MAX_OVERFLOW", "8"))
+
+
+def sqlite_pragmas(journal_mode: str = DB_JOURNAL_MODE, synchronous: str = DB_SYNCHRONOUS,
+                   mmap_size: int = DB_MMAP_SIZE, cache_size_kb: int = DB_CACHE_SIZE_KB,
+                   busy_timeout_ms: int = DB_BUSY_TIMEOUT_MS) -> dict:
+    """Pragmas applied to every new SQLite connection (None = leave SQLite default)."""
+    return {
+        "journal_mode": journal_mode,
+        "synchronous": synchronous,
+        "mmap_size": mmap_size,
+        "cache_size": -cache_size_kb if cache_size_kb else None, # negative = KiB, not pages
+        "busy_timeout": busy_timeout_ms,
+        "temp_store": "MEMORY",
+    }
+
+
+def create_db_engine(url: str = DATABASE_URL, pragmas: dict = None, pool_size: int = DB_POOL_SIZE,
+                     max_overflow: int = DB_MAX_OVERFLOW, **kwargs):
+    """Create a SQLite engine with tuned pragmas and a pool suited to the database kind.
+
+    File databases get a QueuePool (one SQLite connection per thread in flight,
+    reused across requests); in-memory databases must share a single connection
+    (StaticPool) or every session would see its own empty database.
+    """
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    in_memory = url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+    if in_memory:
+        kwargs.setdefault("poolclass", StaticPool)
+    else:
+        kwargs.setdefault("poolclass", QueuePool)
+        kwargs.setdefault("pool_size", pool_size)
+        kwargs.setdefault("max_overflow", max_overflow)
+
+    connect_args = {"check_same_thread": False, **kwargs.pop("connect_args", {})}
+    new_engine = create_engine(url, connect_args=connect_args, **kwargs)
+
+    _install_pragmas(new_engine, pragmas, in_memory)
+    return new_engine
+
+
+def create_async_db_engine(url: str = ASYNC_DATABASE_URL, pragmas: dict = None, **kwargs):
+    """Async (aiosqlite) engine for handlers on the event loop; same pragmas as the sync engine."""
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    in_memory = url.split("://", 1)[1] in ("", "/:memory:") or "mode=memory" in url
+    if in_memory:
+        kwargs.setdefault("poolclass", StaticPool)
+    new_engine = create_async_engine(url, **kwargs)
+    _install_pragmas(new_engine.sync_engine, pragmas, in_memory)
+    return new_engine
+
+
+def _install_pragmas(target_engine, pragmas: dict, in_memory: bool):
+    @event.listens_for(target_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                if value is None or (in_memory and name == "journal_mode"):
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+engine = create_db_engine()
+async_engine = create_async_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: ORM objects stay readable after commit without lazy IO on the loop
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -66,7 +142,24 @@ class GalleryImage(Base):
     height = Column(Integer)
     steps = Column(Integer)
     cfg = Column(Float)
-    image_data = Column(Text, nullable=True) # Persistent base64 image data
+    image_data = Column(Text, nullable=True) # Legacy base64 image data (moved to blob store)
+    image_hash = Column(String, nullable=True, index=True) # SHA-256 key in services.blob_store
+    image_size = Column(Integer, nullable=True)
+    image_mime = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Keyset pagination: newest-first listing per user (and per workflow)
+        Index("ix_gallery_user_workflow_created_id", "user_id", "workflow_id", "created_at", "id"),
+        Index("ix_gallery_user_created_id", "user_id", "created_at", "id"),
+    )
+
+class PromptMetadata(Base):
+    """Metadata of prompts still running in ComfyUI (services.metadata_store), kept across restarts."""
+    __tablename__ = "prompt_metadata"
+    prompt_id = Column(String, primary_key=True)
+    comfy_url = Column(String, index=True)
+    data = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 def seed_defaults(db_session):
@@ -128,3 +221,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
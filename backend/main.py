@@ -11,10 +11,18 @@ from routes.comfy import router as comfy_router
 from routes.persistence import router as persistence_router
 from routes.gallery import router as gallery_router
 from routes.auth import router as auth_router
-from services.websocket_manager import get_manager
-from routes.comfy import DEFAULT_COMFYUI_URL
-from database import init_db, SessionLocal, AppConfig
+from services.websocket_manager import get_manager, managers as ws_managers
+from services.http_client_pool import client_pool
+from services.image_executor import image_executor
+from services.password_hasher import password_hasher
+from services.workflow_registry import workflow_registry
+from services.comfy_pool import comfy_pool
+from services.generation_scheduler import generation_scheduler
+from routes.comfy import DEFAULT_COMFYUI_URL, get_comfy_url
+from database import init_db, AsyncSessionLocal, async_engine
 from migrate_add_auth import run_migration
+from migrate_image_data_to_blobs import run_migration as run_blob_migration
+from migrate_add_gallery_indexes import run_migration as run_gallery_index_migration
 
 from services.logging_service import log_manager
 from fastapi import WebSocket, WebSocketDisconnect
@@ -34,19 +42,23 @@ async def startup_event():
     # Set loop for logging
     log_manager.loop = asyncio.get_running_loop()
     
-    # Run auth migration BEFORE init_db (migration adds columns that models now expect)
+    # Run migrations BEFORE init_db (migrations add columns that models now expect)
     run_migration()
+    run_blob_migration()
+    run_gallery_index_migration()
     init_db()
+
+    # Validate + index workflow templates once, then hot-reload on change
+    await asyncio.to_thread(workflow_registry.load)
+    workflow_registry.start_watching()
+    comfy_pool.start_monitoring()
     
     # Get Config from DB
-    db = SessionLocal()
     try:
-        config = db.query(AppConfig).filter(AppConfig.key == "comfyui_url").first()
-        url = config.value if config else DEFAULT_COMFYUI_URL
+        async with AsyncSessionLocal() as db:
+            url = await get_comfy_url(db)
     except Exception:
         url = DEFAULT_COMFYUI_URL
-    finally:
-        db.close()
     
     # Connect WS Manager in background (non-blocking)
     manager = get_manager(url)
@@ -54,8 +66,15 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    manager = get_manager(DEFAULT_COMFYUI_URL)
-    await manager.disconnect()
+    # Every node and per-user URL has its own manager: flush their metadata and drain their saves
+    await asyncio.gather(*(manager.disconnect() for manager in list(ws_managers.values())))
+    await workflow_registry.stop_watching()
+    await comfy_pool.stop_monitoring()
+    await generation_scheduler.stop()
+    await client_pool.aclose()
+    image_executor.shutdown()
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
 # CORS for local development with Next.js frontend
 app.add_middleware(
@@ -0,0 +1,43 @@
+"""
+Idempotent SQLite migration: adds the composite indexes used by keyset
+pagination of the gallery listing (GET /api/gallery/page).
+Safe to run multiple times - CREATE INDEX IF NOT EXISTS.
+"""
+import sqlite3
+from loguru import logger
+
+from migrate_add_auth import get_db_path, table_exists
+
+INDEXES = {
+    "ix_gallery_user_workflow_created_id": "gallery (user_id, workflow_id, created_at, id)",
+    "ix_gallery_user_created_id": "gallery (user_id, created_at, id)",
+}
+
+
+def run_migration():
+    db_path = get_db_path()
+    logger.info(f"Running gallery index migration on {db_path}")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        if not table_exists(cursor, "gallery"):
+            logger.info("Table 'gallery' does not exist yet, skipping")
+            return
+
+        for name, target in INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        cursor.execute("ANALYZE gallery")
+
+        conn.commit()
+        logger.success("Gallery index migration completed successfully")
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,109 @@
+"""
+Idempotent SQLite migration: moves gallery.image_data base64 blobs into the
+content-addressed blob store (services/blob_store.py).
+
+run_migration() only adds the image_hash / image_size / image_mime columns and
+is safe to call on every startup. Running this file as a script additionally
+moves existing image_data rows out of the table, one batch at a time, and
+compacts the database afterwards.
+"""
+import sqlite3
+from loguru import logger
+
+from services.blob_store import blob_store, decode_data_url
+from migrate_add_auth import get_db_path, column_exists, table_exists
+
+NEW_COLUMNS = {
+    "image_hash": "TEXT",
+    "image_size": "INTEGER",
+    "image_mime": "TEXT",
+}
+
+
+def run_migration():
+    db_path = get_db_path()
+    logger.info(f"Running image blob column migration on {db_path}")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        if not table_exists(cursor, "gallery"):
+            logger.info("Table 'gallery' does not exist yet, skipping")
+            return
+
+        for column, col_type in NEW_COLUMNS.items():
+            if not column_exists(cursor, "gallery", column):
+                cursor.execute(f"ALTER TABLE gallery ADD COLUMN {column} {col_type}")
+                logger.success(f"Added '{column}' column to 'gallery' table")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_gallery_image_hash ON gallery (image_hash)")
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def migrate_rows(batch_size: int = 50, vacuum: bool = True) -> int:
+    """Move every non-NULL gallery.image_data into the blob store. Returns rows moved."""
+    run_migration()
+    db_path = get_db_path()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    moved = 0
+    skipped = 0
+
+    try:
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT id, image_data FROM gallery WHERE image_data IS NOT NULL AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            for row_id, image_data in rows:
+                last_id = row_id
+                decoded = decode_data_url(image_data)
+                if not decoded:
+                    logger.warning(f"Row {row_id}: image_data is not a base64 data URL, leaving in place")
+                    skipped += 1
+                    continue
+                mime, data = decoded
+                digest, size = blob_store.put(data)
+                cursor.execute(
+                    "UPDATE gallery SET image_hash = ?, image_size = ?, image_mime = ?, image_data = NULL WHERE id = ?",
+                    (digest, size, mime, row_id),
+                )
+                moved += 1
+
+            # Commit per batch so a crash only redoes one batch (puts are idempotent)
+            conn.commit()
+            logger.info(f"Moved {moved} images to blob store so far...")
+
+        logger.success(f"Blob migration complete: {moved} moved, {skipped} skipped")
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Blob migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+    if vacuum and moved:
+        # Reclaim the space the base64 TEXT columns used
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("VACUUM")
+            logger.success("Database compacted")
+        finally:
+            conn.close()
+
+    return moved
+
+
+if __name__ == "__main__":
+    migrate_rows()
@@ -2,16 +2,18 @@
 Auth API endpoints: register, login, me, update profile.
 """
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 from loguru import logger
 
-from database import get_db, User
-from auth import (
-    hash_password, verify_password, create_access_token,
-    get_current_user, _adopt_orphaned_data,
-)
+from database import get_db, get_async_db, User
+from auth import create_access_token, get_current_user, _adopt_orphaned_data
+from services.endpoint_cache import endpoint_cache
+from services.principal_cache import principal_cache
+from services.password_hasher import password_hasher
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -46,36 +48,48 @@ class ProfileUpdate(BaseModel):
 
 
 @router.post("/register")
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.username == req.username).first():
+async def register(req: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
+    if await db.scalar(select(User.id).where(User.username == req.username).limit(1)):
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    is_first = db.query(User).count() == 0
+    password_hash = await password_hasher.hash(req.password)
+    is_first = await db.scalar(select(func.count()).select_from(User)) == 0
     user = User(
         username=req.username,
         display_name=req.display_name or req.username,
-        password_hash=hash_password(req.password),
+        password_hash=password_hash,
         is_admin=is_first,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     if is_first:
-        _adopt_orphaned_data(db, user.id)
+        await db.run_sync(_adopt_orphaned_data, user.id)
 
     token = create_access_token(user.id, user.username)
     return {"token": token, "user": UserResponse.model_validate(user)}
 
 
 @router.post("/login")
-def login(req: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == req.username).first()
+async def login(req: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.username == req.username).limit(1))
     if not user or not user.password_hash:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(req.password, user.password_hash):
+    if not await password_hasher.verify(req.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    if password_hasher.needs_rehash(user.password_hash):
+        # Cost policy changed since this hash was made: upgrade it while we know the password
+        try:
+            user.password_hash = await password_hasher.hash(req.password)
+            await db.commit()
+            password_hasher.rehashed += 1
+            logger.info(f"AUTH: Rehashed password for {user.username} (cost {password_hasher.rounds})")
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"AUTH: Could not rehash password for {user.username}: {e}")
+
     token = create_access_token(user.id, user.username)
     return {"token": token, "user": UserResponse.model_validate(user)}
 
@@ -99,9 +113,14 @@ def update_me(update: ProfileUpdate, user: User = Depends(get_current_user), db:
         merged_user = db.merge(user)
         db.commit()
         db.refresh(merged_user)
+        if update.comfyui_url is not None:
+            endpoint_cache.invalidate(merged_user.id)
         logger.success(f"Profile updated for {merged_user.username}. URL in DB: {merged_user.comfyui_url}")
         return merged_user
     except Exception as e:
         db.rollback()
         logger.error(f"Failed to update profile: {e}")
         raise HTTPException(status_code=500, detail=f"Database update failed: {str(e)}")
+    finally:
+        # The cached principal was mutated above; reload it from the DB next time
+        principal_cache.invalidate_user(user.id)
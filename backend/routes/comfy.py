@@ -1,55 +1,61 @@
+import asyncio
 
 import random
-import io
 import json
+import uuid
 import httpx
 from typing import Dict, Any, List, Optional
-from fastapi import APIRouter, HTTPException, Query, Depends, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse, Response
-from sqlalchemy.orm import Session
-from PIL import Image
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, Response, FileResponse, JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 from loguru import logger
 
-from database import get_db, AppConfig, User
-from schemas.comfy_schemas import ImageGenerateRequest, ImageStatusResponse
-from services.workflow_service import build_comfy_workflow
-from services.websocket_manager import get_manager
-from auth import get_current_user, get_current_user_ws
+from database import get_async_db, AsyncSessionLocal, AppConfig, User, GalleryImage
+from schemas.comfy_schemas import ImageGenerateRequest, ImageStatusResponse, BatchGenerateRequest, BatchGenerateResponse, BatchItem
+from services.workflow_service import build_comfy_workflow, select_template
+from services.websocket_manager import get_manager, managers as ws_managers, Subscription
+from services.client_outbox import client_outboxes
+from services.http_client_pool import get_comfy_client, client_pool
+from services.prompt_tracker import prompt_tracker, TERMINAL_STATUSES
+from services.thumbnail_cache import thumbnail_cache, render_thumbnail, view_source, FORMATS as THUMBNAIL_FORMATS
+from services.http_ranges import etag_matches
+from services.image_executor import image_executor
+from services.endpoint_cache import endpoint_cache, ENDPOINT_CONFIG_KEY
+from services.principal_cache import principal_cache
+from services.password_hasher import password_hasher
+from services.workflow_registry import workflow_registry
+from services.model_catalog import model_catalog, CatalogValidationError
+from services.comfy_pool import comfy_pool
+from services.generation_scheduler import generation_scheduler, Job, QueueFullError, model_key
+from auth import get_current_admin, get_current_user, get_current_user_ws
 
 router = APIRouter(prefix="/api/comfy", tags=["comfy"])
 
 # Configuration
 DEFAULT_COMFYUI_URL = "http://192.168.0.14:8188"
-TAILSCALE_HTTP_PROXY = "http://localhost:1056"  # Tailscale userspace HTTP proxy
 
-
-def _is_tailscale_url(url: str) -> bool:
-    """Check if URL points to a Tailscale address (100.x.x.x)."""
-    try:
-        from urllib.parse import urlparse
-        host = urlparse(url).hostname or ""
-        return host.startswith("100.")
-    except Exception:
-        return False
-
-
-def get_comfy_client(url: str, timeout: float = 30.0) -> httpx.AsyncClient:
-    """Create httpx client, using Tailscale HTTP proxy for 100.x.x.x addresses."""
-    if _is_tailscale_url(url):
-        logger.debug(f"Using Tailscale HTTP proxy for {url}")
-        return httpx.AsyncClient(timeout=timeout, proxy=TAILSCALE_HTTP_PROXY)
-    return httpx.AsyncClient(timeout=timeout, trust_env=False)
-
-def get_comfy_url(db: Session, user: User = None) -> str:
-    """Get ComfyUI URL: per-user → per-user config → global config → default."""
+async def get_comfy_url(db: AsyncSession, user: User = None) -> str:
+    """Get ComfyUI URL: per-user → per-user config → global config → default (cached per user)."""
     if user and user.comfyui_url:
         return user.comfyui_url
+    user_id = user.id if user else None
+    cached = endpoint_cache.get(user_id)
+    if cached:
+        return cached
+
+    generation = endpoint_cache.generation
+    url = None
     if user:
-        config = db.query(AppConfig).filter(AppConfig.key == "comfyui_url", AppConfig.user_id == user.id).first()
-        if config:
-            return config.value
-    config = db.query(AppConfig).filter(AppConfig.key == "comfyui_url").first()
-    return config.value if config else DEFAULT_COMFYUI_URL
+        url = await db.scalar(
+            select(AppConfig.value).where(AppConfig.key == ENDPOINT_CONFIG_KEY, AppConfig.user_id == user.id).limit(1)
+        )
+    if not url:
+        url = await db.scalar(select(AppConfig.value).where(AppConfig.key == ENDPOINT_CONFIG_KEY).limit(1))
+    url = url or DEFAULT_COMFYUI_URL
+    endpoint_cache.set(user_id, url, generation)
+    return url
 
 @router.get("/debug/{msg}")
 async def debug_log(msg: str):
@@ -57,13 +63,13 @@ async def debug_log(msg: str):
     return {"status": "ok"}
 
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def health_check(db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
     """Check health of backend and ComfyUI connection."""
-    url = get_comfy_url(db, user)
+    url = await get_comfy_url(db, user)
     try:
-        async with get_comfy_client(url, timeout=5.0) as client:
-            resp = await client.get(f"{url}/system_stats")
-            comfy_status = "connected" if resp.status_code == 200 else "error"
+        client = get_comfy_client(url)
+        resp = await client.get(f"{url}/system_stats", timeout=5.0)
+        comfy_status = "connected" if resp.status_code == 200 else "error"
     except Exception as e:
         logger.error(f"ComfyUI health check failed: {e}")
         comfy_status = "offline"
@@ -75,18 +81,131 @@ async def health_check(db: Session = Depends(get_db), user: User = Depends(get_c
     }
 
 @router.get("/queue")
-async def get_queue(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    """Get ComfyUI queue status."""
-    url = get_comfy_url(db, user)
-    async with get_comfy_client(url, timeout=10.0) as client:
-        resp = await client.get(f"{url}/queue")
-        return resp.json()
+async def get_queue(db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
+    """Get ComfyUI queue status, plus the wrapper-side queue with the user's positions and ETAs."""
+    url = await get_comfy_url(db, user)
+    client = get_comfy_client(url)
+    resp = await client.get(f"{url}/queue", timeout=10.0)
+    data = resp.json()
+    data["wrapper"] = generation_scheduler.queue_status(url, user.id)
+    return data
+
+def _queue_full(e: QueueFullError) -> HTTPException:
+    logger.warning(f"GENERATE: Rejected ({e})")
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def _catalog_response(key: str, request: Request, db: AsyncSession, user: User):
+    url = await get_comfy_url(db, user)
+    entry = await model_catalog.get(url, get_comfy_client(url))
+    if entry is None:
+        raise HTTPException(status_code=503, detail=f"ComfyUI catalog unavailable at {url}")
+    etag = entry.etags[key]
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({key: entry.data[key]}, headers=headers)
+
+@router.get("/models")
+async def list_models(request: Request, db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
+    """Installed checkpoints + diffusion models (cached catalog, ETag-revalidated)."""
+    return await _catalog_response("models", request, db, user)
+
+@router.get("/loras")
+async def list_loras(request: Request, db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
+    """Installed LoRAs (cached catalog, ETag-revalidated)."""
+    return await _catalog_response("loras", request, db, user)
+
+@router.get("/samplers")
+async def list_samplers(request: Request, db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
+    """KSampler sampler names (cached catalog, ETag-revalidated)."""
+    return await _catalog_response("samplers", request, db, user)
+
+async def _validate_request(url: str, request: ImageGenerateRequest):
+    """Reject names ComfyUI does not have before the prompt takes a queue slot (400)."""
+    template = select_template(request)
+    try:
+        await model_catalog.validate(
+            url, get_comfy_client(url),
+            model=request.model if "model" in template.params else None,
+            lora_names=(request.lora_names or request.loras_names or []) if template.supports_loras else (),
+            sampler_name=request.sampler_name if "sampler_name" in template.params else None,
+        )
+    except CatalogValidationError as e:
+        logger.warning(f"GENERATE: Rejected request: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _queue_prompt(
+    url: str, workflow: Dict, request: ImageGenerateRequest, user: User, prompt_id: Optional[str] = None
+) -> str:
+    """POST a built workflow to ComfyUI and register it for tracking + auto-save. Returns the prompt_id."""
+    # Use a consistent client_id to ensure we receive status updates via the specific WS connection
+    ws_manager = get_manager(url)
+    client_id = ws_manager.client_id
+
+    logger.info(f"GENERATE: Sending request to ComfyUI at {url}/prompt (client_id: {client_id})")
+
+    body = {"prompt": workflow, "client_id": client_id}
+    registered = None
+    if prompt_id:
+        body["prompt_id"] = prompt_id
+        # ComfyUI may start it before /prompt returns: its first events must already reach the owner
+        if prompt_tracker.get(prompt_id) is None:
+            registered = prompt_id
+        prompt_tracker.register(prompt_id, user.id)
+    try:
+        client = get_comfy_client(url)
+        response = await client.post(f"{url}/prompt", json=body, timeout=120.0)
+
+        logger.debug(f"GENERATE: ComfyUI response status: {response.status_code}")
+
+        if response.status_code != 200:
+            logger.error(f"GENERATE: ComfyUI error: {response.text}")
+            response.raise_for_status()
+
+        result = response.json()
+        prompt_id = result.get("prompt_id")
+
+        if not prompt_id:
+            logger.error(f"GENERATE: No prompt_id in response: {result}")
+            raise HTTPException(status_code=500, detail="No prompt_id returned from ComfyUI")
+    except Exception:
+        # Not queued: drop the state registered above so nobody waits on it as pending
+        # (held jobs were registered by the scheduler, which marks them failed itself)
+        if registered is not None:
+            prompt_tracker.prompts.pop(registered, None)
+        raise
+
+    logger.success(f"GENERATE: Successfully queued prompt {prompt_id}")
+
+    # Register metadata for auto-save via WebSocket
+    ws_manager.register_metadata(prompt_id, {
+        "prompt_positive": request.positive_prompt,
+        "prompt_negative": request.negative_prompt,
+        "workflow_id": request.workflow_id,
+        "model": request.model or "default",
+        "width": request.width,
+        "height": request.height,
+        "steps": request.steps,
+        "cfg": request.cfg,
+        "user_id": user.id,
+    })
+    return prompt_id
+
+async def _schedule_prompt(url: str, workflow: Dict, request: ImageGenerateRequest, user: User) -> str:
+    """Hand a built workflow to the scheduler: queued on the best node now, or held until a slot frees."""
+    async def submit(node_url: str, prompt_id: str) -> str:
+        return await _queue_prompt(node_url, workflow, request, user, prompt_id)
+
+    job = Job(str(uuid.uuid4()), url, model_key(workflow), user.id, submit,
+              model=request.model, weight=generation_scheduler.weight_for(user.username))
+    return await generation_scheduler.submit(job)
 
 @router.post("/generate")
-async def generate_image(request: ImageGenerateRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def generate_image(request: ImageGenerateRequest, db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
     """Submit a generation request to ComfyUI."""
     logger.info(f"GENERATE: Incoming request for model {request.model or 'default'} with workflow {request.workflow_id}")
-    url = get_comfy_url(db, user)
+    url = await get_comfy_url(db, user)
+    await _validate_request(url, request)
     
     try:
         logger.debug(f"GENERATE: Building workflow for {request.workflow_id}...")
@@ -96,51 +215,15 @@ async def generate_image(request: ImageGenerateRequest, db: Session = Depends(ge
         node_ids = list(workflow.keys())
         logger.info(f"GENERATE: Workflow built with {len(node_ids)} nodes: {node_ids}")
         
-        # Use a consistent client_id to ensure we receive status updates via the specific WS connection
-        ws_manager = get_manager(url)
-        client_id = ws_manager.client_id
+        prompt_id = await _schedule_prompt(url, workflow, request, user)
         
-        logger.info(f"GENERATE: Sending request to ComfyUI at {url}/prompt (client_id: {client_id})")
-        
-        async with get_comfy_client(url, timeout=120.0) as client:
-            response = await client.post(
-                f"{url}/prompt",
-                json={"prompt": workflow, "client_id": client_id}
-            )
-            
-            logger.debug(f"GENERATE: ComfyUI response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"GENERATE: ComfyUI error: {response.text}")
-                response.raise_for_status()
-                
-            result = response.json()
-            prompt_id = result.get("prompt_id")
-            
-            if not prompt_id:
-                logger.error(f"GENERATE: No prompt_id in response: {result}")
-                raise HTTPException(status_code=500, detail="No prompt_id returned from ComfyUI")
-
-            logger.success(f"GENERATE: Successfully queued prompt {prompt_id}")
-            
-            # Register metadata for auto-save via WebSocket
-            ws_manager.register_metadata(prompt_id, {
-                "prompt_positive": request.positive_prompt,
-                "prompt_negative": request.negative_prompt,
-                "workflow_id": request.workflow_id,
-                "model": request.model or "default",
-                "width": request.width,
-                "height": request.height,
-                "steps": request.steps,
-                "cfg": request.cfg,
-                "user_id": user.id,
-            })
-            
-            return {
-                "prompt_id": prompt_id,
-                "status": "queued",
-                "message": "Generation started"
-            }
+        return {
+            "prompt_id": prompt_id,
+            "status": "queued",
+            "message": "Generation started"
+        }
+    except QueueFullError as e:
+        raise _queue_full(e)
     except httpx.HTTPStatusError as e:
         logger.error(f"GENERATE: HTTP Error: {e.response.status_code} - {e.response.text}")
         raise HTTPException(status_code=e.response.status_code, detail=f"ComfyUI HTTP error: {str(e)}")
@@ -148,199 +231,438 @@ async def generate_image(request: ImageGenerateRequest, db: Session = Depends(ge
         logger.exception(f"GENERATE: Unexpected error: {e}")
         raise HTTPException(status_code=503, detail=f"ComfyUI unavailable or error: {str(e)}")
 
+@router.post("/generate/batch")
+async def generate_batch(
+    request: BatchGenerateRequest, db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)
+) -> BatchGenerateResponse:
+    """Build `count` workflows and queue them all back-to-back, without waiting for any to finish."""
+    url = await get_comfy_url(db, user)
+    logger.info(f"GENERATE BATCH: Queuing {request.count} x {request.workflow_id} for user {user.id}")
+    await _validate_request(url, request)
+    try:
+        # All or nothing: the whole batch must fit in the wrapper queue
+        generation_scheduler.check_admission(url, user.id, request.count)
+    except QueueFullError as e:
+        raise _queue_full(e)
+
+    # Build everything first so the queue is filled in one tight pass
+    workflows = [build_comfy_workflow(request) for _ in range(request.count)]
+    items = []
+    for index, workflow in enumerate(workflows):
+        try:
+            prompt_id = await _schedule_prompt(url, workflow, request, user)
+            items.append({"index": index, "prompt_id": prompt_id, "error": None})
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"GENERATE BATCH: Item {index} failed to queue: {detail}")
+            items.append({"index": index, "prompt_id": None, "error": detail})
+
+    prompt_ids = [item["prompt_id"] for item in items if item["prompt_id"]]
+    if not prompt_ids:
+        raise HTTPException(status_code=503, detail=f"ComfyUI unavailable or error: {items[0]['error']}")
+
+    batch_id = uuid.uuid4().hex
+    prompt_tracker.register_batch(batch_id, items, user.id)
+    return BatchGenerateResponse(
+        batch_id=batch_id,
+        status="queued" if len(prompt_ids) == len(items) else "partial",
+        prompt_ids=prompt_ids,
+        items=[BatchItem(index=i["index"], prompt_id=i["prompt_id"],
+                         status="queued" if i["prompt_id"] else "failed", error=i["error"]) for i in items],
+    )
+
+def _get_tracked_batch(batch_id: str, user: User):
+    batch = prompt_tracker.get_batch(batch_id)
+    if not batch or not _can_view_prompt(batch, user):
+        raise HTTPException(status_code=404, detail="Batch not tracked")
+    return batch
+
+@router.get("/batch/{batch_id}")
+async def batch_status(
+    batch_id: str,
+    since: int = -1,
+    timeout: float = Query(0, ge=0, le=60),
+    user: User = Depends(get_current_user),
+):
+    """Aggregate batch progress; with `timeout`, long-polls until any item changes past `since`."""
+    _get_tracked_batch(batch_id, user)
+    return await prompt_tracker.wait_for_batch_update(batch_id, since, timeout)
+
+@router.get("/batch/{batch_id}/events")
+async def batch_events(batch_id: str, user: User = Depends(get_current_user)):
+    """Server-Sent Events stream of aggregate batch progress until every item is terminal."""
+    _get_tracked_batch(batch_id, user)
+
+    async def event_stream():
+        since = -1
+        while True:
+            snapshot = await prompt_tracker.wait_for_batch_update(batch_id, since, 15.0)
+            if snapshot is None:
+                break
+            if snapshot["version"] == since and snapshot["status"] in ("pending", "processing"):
+                yield ": keep-alive\n\n"
+                continue
+            since = snapshot["version"]
+            yield f"event: batch\ndata: {json.dumps(snapshot)}\n\n"
+            if snapshot["status"] not in ("pending", "processing"):
+                break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/status/{prompt_id}")
-async def check_status(prompt_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> ImageStatusResponse:
+async def check_status(prompt_id: str, db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)) -> ImageStatusResponse:
     """Check the status of a generation."""
     logger.debug(f"STATUS: Checking status for {prompt_id}")
-    url = get_comfy_url(db, user)
+    # Prompts queued through this backend are answered from the WS-driven tracker
+    state = prompt_tracker.get(prompt_id)
+    if state and _can_view_prompt(state, user):
+        return ImageStatusResponse(**state.snapshot())
+
+    url = comfy_pool.node_for(prompt_id) or await get_comfy_url(db, user)
     try:
-        async with get_comfy_client(url, timeout=30.0) as client:
-            # Check queue
-            logger.debug(f"STATUS: Fetching queue from {url}/queue")
-            queue_response = await client.get(f"{url}/queue")
-            queue_data = queue_response.json()
-            
-            for item in queue_data.get("queue_running", []):
-                if item[1] == prompt_id:
-                    logger.debug(f"STATUS: Prompt {prompt_id} is currently PROCESSING")
-                    return ImageStatusResponse(
-                        prompt_id=prompt_id, status="processing", ready=False
-                    )
-            
-            for item in queue_data.get("queue_pending", []):
-                if item[1] == prompt_id:
-                    logger.debug(f"STATUS: Prompt {prompt_id} is PENDING in queue")
-                    return ImageStatusResponse(
-                        prompt_id=prompt_id, status="pending", ready=False
-                    )
-            
-            # Check history
-            logger.debug(f"STATUS: Fetching history from {url}/history/{prompt_id}")
-            history_response = await client.get(f"{url}/history/{prompt_id}")
-            history_data = history_response.json()
-            
-            prompt_data = history_data.get(prompt_id)
-            if not prompt_data:
-                logger.debug(f"STATUS: Prompt {prompt_id} NOT FOUND in history or queue")
+        client = get_comfy_client(url)
+        # Check queue
+        logger.debug(f"STATUS: Fetching queue from {url}/queue")
+        queue_response = await client.get(f"{url}/queue", timeout=30.0)
+        queue_data = queue_response.json()
+        
+        for item in queue_data.get("queue_running", []):
+            if item[1] == prompt_id:
+                logger.debug(f"STATUS: Prompt {prompt_id} is currently PROCESSING")
                 return ImageStatusResponse(
-                    prompt_id=prompt_id, status="not_found", ready=False
+                    prompt_id=prompt_id, status="processing", ready=False
                 )
-            
-            status = prompt_data.get("status", {})
-            if not status.get("completed"):
-                logger.debug(f"STATUS: Prompt {prompt_id} is INCOMPLETE in history")
+        
+        for item in queue_data.get("queue_pending", []):
+            if item[1] == prompt_id:
+                logger.debug(f"STATUS: Prompt {prompt_id} is PENDING in queue")
                 return ImageStatusResponse(
-                    prompt_id=prompt_id,
-                    status=status.get("status_str", "processing"),
-                    ready=False
+                    prompt_id=prompt_id, status="pending", ready=False
                 )
-            
-            # Get images
-            logger.info(f"STATUS: Prompt {prompt_id} COMPLETED. Extracting outputs...")
-            outputs = prompt_data.get("outputs", {})
-            image_urls = []
-            filenames = []
-            first_filename = None
-            first_subfolder = ""
-            
-            # Look for nodes 7, 11, 10, 9 or ANY output with images
-            found_images = False
-            for node_id in ["7", "11", "10", "9", "45", "46"]:
-                if node_id in outputs and "images" in outputs[node_id]:
-                    for img in outputs[node_id]["images"]:
+        
+        # Check history
+        logger.debug(f"STATUS: Fetching history from {url}/history/{prompt_id}")
+        history_response = await client.get(f"{url}/history/{prompt_id}", timeout=30.0)
+        history_data = history_response.json()
+        
+        prompt_data = history_data.get(prompt_id)
+        if not prompt_data:
+            logger.debug(f"STATUS: Prompt {prompt_id} NOT FOUND in history or queue")
+            return ImageStatusResponse(
+                prompt_id=prompt_id, status="not_found", ready=False
+            )
+        
+        status = prompt_data.get("status", {})
+        if not status.get("completed"):
+            logger.debug(f"STATUS: Prompt {prompt_id} is INCOMPLETE in history")
+            return ImageStatusResponse(
+                prompt_id=prompt_id,
+                status=status.get("status_str", "processing"),
+                ready=False
+            )
+        
+        # Get images
+        logger.info(f"STATUS: Prompt {prompt_id} COMPLETED. Extracting outputs...")
+        outputs = prompt_data.get("outputs", {})
+        image_urls = []
+        filenames = []
+        first_filename = None
+        first_subfolder = ""
+        
+        # Look for nodes 7, 11, 10, 9 or ANY output with images
+        found_images = False
+        for node_id in ["7", "11", "10", "9", "45", "46"]:
+            if node_id in outputs and "images" in outputs[node_id]:
+                for img in outputs[node_id]["images"]:
+                    filename = img.get("filename", "")
+                    subfolder = img.get("subfolder", "")
+                    filenames.append(filename)
+                    if not first_filename:
+                        first_filename = filename
+                        first_subfolder = subfolder
+                    url_img = f"/api/comfy/image?filename={filename}&type=output&prompt_id={prompt_id}"
+                    if subfolder:
+                        url_img += f"&subfolder={subfolder}"
+                    image_urls.append(url_img)
+                found_images = True
+                break
+        
+        if not found_images:
+            # Try fallback: any node with "images"
+            for node_id, node_output in outputs.items():
+                if "images" in node_output:
+                    for img in node_output["images"]:
                         filename = img.get("filename", "")
                         subfolder = img.get("subfolder", "")
                         filenames.append(filename)
                         if not first_filename:
                             first_filename = filename
                             first_subfolder = subfolder
-                        url_img = f"/api/comfy/image?filename={filename}&type=output"
+                        url_img = f"/api/comfy/image?filename={filename}&type=output&prompt_id={prompt_id}"
                         if subfolder:
                             url_img += f"&subfolder={subfolder}"
                         image_urls.append(url_img)
-                    found_images = True
                     break
-            
-            if not found_images:
-                # Try fallback: any node with "images"
-                for node_id, node_output in outputs.items():
-                    if "images" in node_output:
-                        for img in node_output["images"]:
-                            filename = img.get("filename", "")
-                            subfolder = img.get("subfolder", "")
-                            filenames.append(filename)
-                            if not first_filename:
-                                first_filename = filename
-                                first_subfolder = subfolder
-                            url_img = f"/api/comfy/image?filename={filename}&type=output"
-                            if subfolder:
-                                url_img += f"&subfolder={subfolder}"
-                            image_urls.append(url_img)
-                        break
-
-            logger.success(f"STATUS: Prompt {prompt_id} finished in ComfyUI with {len(image_urls)} images")
-            
-            # CRITICAL: Synchronization with Auto-Save
-            # If ComfyUI is done, wait a tiny bit to see if it's already in our DB Gallery
-            # This prevents the frontend from refreshing the gallery before the save is finalized.
-            if first_filename:
-                gallery_entry = db.query(GalleryImage).filter(GalleryImage.prompt_id == prompt_id).first()
-                if not gallery_entry:
-                    logger.warning(f"STATUS: Prompt {prompt_id} done in Comfy, but NOT YET in Gallery DB. Returning 'processing' to buy time.")
-                    return ImageStatusResponse(
-                        prompt_id=prompt_id,
-                        status="saving", # Special status to indicate it's done but being saved
-                        ready=False
-                    )
 
-            return ImageStatusResponse(
-                prompt_id=prompt_id,
-                status="completed",
-                ready=True,
-                filename=first_filename,
-                filenames=filenames,
-                subfolder=first_subfolder,
-                image_url=image_urls[0] if image_urls else None,
-                image_urls=image_urls
-            )
+        logger.success(f"STATUS: Prompt {prompt_id} finished in ComfyUI with {len(image_urls)} images")
+        
+        # CRITICAL: Synchronization with Auto-Save
+        # If ComfyUI is done, wait a tiny bit to see if it's already in our DB Gallery
+        # This prevents the frontend from refreshing the gallery before the save is finalized.
+        if first_filename:
+            gallery_entry = await db.scalar(select(GalleryImage.id).where(GalleryImage.prompt_id == prompt_id).limit(1))
+            if not gallery_entry:
+                logger.warning(f"STATUS: Prompt {prompt_id} done in Comfy, but NOT YET in Gallery DB. Returning 'processing' to buy time.")
+                return ImageStatusResponse(
+                    prompt_id=prompt_id,
+                    status="saving", # Special status to indicate it's done but being saved
+                    ready=False
+                )
+
+        return ImageStatusResponse(
+            prompt_id=prompt_id,
+            status="completed",
+            ready=True,
+            filename=first_filename,
+            filenames=filenames,
+            subfolder=first_subfolder,
+            image_url=image_urls[0] if image_urls else None,
+            image_urls=image_urls
+        )
     except Exception as e:
         logger.error(f"STATUS: Connection error to ComfyUI: {e}")
         raise HTTPException(status_code=503, detail=f"ComfyUI unavailable: {str(e)}")
 
+def _can_view_prompt(state, user: User) -> bool:
+    return state.user_id is None or state.user_id == user.id or user.is_admin
+
+def _get_tracked_prompt(prompt_id: str, user: User):
+    state = prompt_tracker.get(prompt_id)
+    if not state or not _can_view_prompt(state, user):
+        raise HTTPException(status_code=404, detail="Prompt not tracked")
+    return state
+
+@router.get("/status/{prompt_id}/wait")
+async def wait_status(
+    prompt_id: str,
+    since: int = 0,
+    timeout: float = Query(25.0, ge=0, le=60),
+    user: User = Depends(get_current_user),
+) -> ImageStatusResponse:
+    """Long-poll: respond once the prompt's state version exceeds `since` (or on timeout)."""
+    _get_tracked_prompt(prompt_id, user)
+    snapshot = await prompt_tracker.wait_for_update(prompt_id, since, timeout)
+    return ImageStatusResponse(**snapshot)
+
+@router.get("/status/{prompt_id}/events")
+async def status_events(prompt_id: str, user: User = Depends(get_current_user)):
+    """Server-Sent Events stream of status changes until the prompt reaches a terminal state."""
+    _get_tracked_prompt(prompt_id, user)
+
+    async def event_stream():
+        since = -1
+        while True:
+            snapshot = await prompt_tracker.wait_for_update(prompt_id, since, 15.0)
+            if snapshot is None:
+                break
+            if snapshot["version"] == since:
+                yield ": keep-alive\n\n"
+                continue
+            since = snapshot["version"]
+            yield f"event: status\ndata: {json.dumps(snapshot)}\n\n"
+            if snapshot["status"] in TERMINAL_STATUSES:
+                break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Request headers forwarded to ComfyUI /view, and response headers passed back
+IMAGE_FORWARD_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+IMAGE_FORWARD_RESPONSE_HEADERS = (
+    "content-length", "content-range", "content-encoding", "accept-ranges",
+    "etag", "last-modified", "cache-control", "content-disposition",
+)
+
 @router.get("/image")
-async def get_image(filename: str, subfolder: str = "", type: str = "output", db: Session = Depends(get_db)):
-    """Retrieve an image from ComfyUI (public - used by <img src>)."""
-    url = get_comfy_url(db)
-    async with get_comfy_client(url, timeout=30.0) as client:
-        resp = await client.get(f"{url}/view?filename={filename}&subfolder={subfolder}&type={type}")
-        return Response(content=resp.content, media_type=resp.headers.get("content-type"))
+async def get_image(
+    request: Request,
+    filename: str,
+    subfolder: str = "",
+    type: str = "output",
+    prompt_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Stream an image from ComfyUI (public - used by <img src>) without buffering it in memory.
+
+    `prompt_id` routes the fetch to the pool node that ran the prompt.
+    """
+    url = comfy_pool.node_for(prompt_id) or await get_comfy_url(db)
+    client = get_comfy_client(url)
+    upstream = client.build_request(
+        "GET",
+        f"{url}/view",
+        params={"filename": filename, "subfolder": subfolder, "type": type},
+        headers={h: request.headers[h] for h in IMAGE_FORWARD_REQUEST_HEADERS if h in request.headers},
+        timeout=30.0,
+    )
+    try:
+        resp = await client.send(upstream, stream=True)
+    except httpx.HTTPError as e:
+        logger.error(f"IMAGE: ComfyUI unavailable for {filename}: {e}")
+        raise HTTPException(status_code=503, detail="ComfyUI unavailable")
+
+    headers = {h: resp.headers[h] for h in IMAGE_FORWARD_RESPONSE_HEADERS if h in resp.headers}
+    media_type = resp.headers.get("content-type")
+
+    # Bodyless / error responses: nothing worth streaming
+    if resp.status_code == 304 or resp.status_code >= 400:
+        body = await resp.aread()
+        await resp.aclose()
+        if resp.status_code == 304:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, status_code=resp.status_code, media_type=media_type)
+
+    return StreamingResponse(
+        resp.aiter_raw(),
+        status_code=resp.status_code,
+        media_type=media_type,
+        headers=headers,
+        background=BackgroundTask(resp.aclose),
+    )
 
 @router.get("/thumbnail")
-async def get_thumbnail(filename: str, subfolder: str = "", max_size: int = 300, db: Session = Depends(get_db)):
-    """Retrieve a thumbnail from ComfyUI (public - used by <img src>)."""
-    url = get_comfy_url(db)
-    async with get_comfy_client(url, timeout=30.0) as client:
-        resp = await client.get(f"{url}/view?filename={filename}&subfolder={subfolder}&type=output")
+async def get_thumbnail(
+    request: Request,
+    filename: str,
+    subfolder: str = "",
+    max_size: int = Query(300, ge=16, le=2048),
+    format: str = "webp",
+    prompt_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Retrieve a thumbnail (public - used by <img src>), served from the disk cache when possible."""
+    if format not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    media_type = THUMBNAIL_FORMATS[format][1]
+
+    # Every node names its outputs ComfyUI_00001_.png, ...: the cache entry is per node
+    url = comfy_pool.node_for(prompt_id) or await get_comfy_url(db)
+    source = view_source(url, filename, subfolder)
+    cached = await asyncio.to_thread(thumbnail_cache.get, source, max_size, format)
+    if cached is None:
+        client = get_comfy_client(url)
+        resp = await client.get(f"{url}/view?filename={filename}&subfolder={subfolder}&type=output", timeout=30.0)
         if resp.status_code != 200:
             raise HTTPException(status_code=resp.status_code, detail="Image not found")
-        img = Image.open(io.BytesIO(resp.content))
-        img.thumbnail((max_size, max_size), Image.LANCZOS)
-        buf = io.BytesIO()
-        img.save(buf, format="WEBP", quality=80)
-        buf.seek(0)
-        return Response(content=buf.read(), media_type="image/webp")
+        data = await image_executor.run("thumbnail", render_thumbnail, resp.content, max_size, format)
+        cached = await asyncio.to_thread(thumbnail_cache.put, source, max_size, format, data)
+
+    path, etag = cached
+    # File names are reused (across nodes, and once an output folder is cleared): revalidate every time
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@router.get("/metrics")
+async def get_metrics(user: User = Depends(get_current_admin)):
+    """Runtime metrics for the wrapper's internal pools and caches (admins only: they expose every user's nodes)."""
+    return {
+        "http_pool": client_pool.get_stats(),
+        "thumbnail_cache": thumbnail_cache.get_stats(),
+        "image_executor": image_executor.get_stats(),
+        "endpoint_cache": endpoint_cache.get_stats(),
+        "principal_cache": principal_cache.get_stats(),
+        "password_hasher": password_hasher.get_stats(),
+        "workflow_registry": workflow_registry.get_stats(),
+        "model_catalog": model_catalog.get_stats(),
+        "comfy_pool": comfy_pool.get_stats(),
+        "scheduler": generation_scheduler.get_stats(),
+        "websocket": {url: manager.get_stats() for url, manager in ws_managers.items()},
+        "ws_outbox": client_outboxes.get_stats(),
+    }
 
 @router.post("/interrupt")
-async def interrupt(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def interrupt(db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
     """Interrupt current generation."""
-    url = get_comfy_url(db, user)
-    async with get_comfy_client(url, timeout=10.0) as client:
-        resp = await client.post(f"{url}/interrupt")
-        return resp.json()
+    url = await get_comfy_url(db, user)
+    client = get_comfy_client(url)
+    resp = await client.post(f"{url}/interrupt", timeout=10.0)
+    return resp.json()
 
 @router.post("/clear-vram")
-async def clear_vram(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def clear_vram(db: AsyncSession = Depends(get_async_db), user: User = Depends(get_current_user)):
     """Clear ComfyUI VRAM (unload models)."""
-    url = get_comfy_url(db, user)
-    async with get_comfy_client(url, timeout=10.0) as client:
-        # ComfyUI doesn't have a direct clear-vram endpoint usually, 
-        # but some custom nodes do or we can trigger it via GC.
-        # This is a placeholder for common practice.
-        resp = await client.post(f"{url}/free")
-        return resp.json()
+    url = await get_comfy_url(db, user)
+    client = get_comfy_client(url)
+    # ComfyUI doesn't have a direct clear-vram endpoint usually, 
+    # but some custom nodes do or we can trigger it via GC.
+    # This is a placeholder for common practice.
+    resp = await client.post(f"{url}/free", timeout=10.0)
+    return resp.json()
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = Query(None)):
-    """Bridge for ComfyUI WebSocket updates."""
+async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = Query(None), watch_all: bool = Query(False)):
+    """Bridge for ComfyUI WebSocket updates.
+
+    Prompt events only reach the prompt's owner; admins can pass `watch_all=1` to see everyone's.
+    """
     await websocket.accept()
     
-    db = next(get_db())
+    user = None
     try:
-        user = await get_current_user_ws(token, db)
-        url = get_comfy_url(db, user)
+        async with AsyncSessionLocal() as db:
+            user = await get_current_user_ws(token, db)
+            url = await get_comfy_url(db, user)
     except Exception as e:
         logger.error(f"WS Auth Error: {e}")
         url = DEFAULT_COMFYUI_URL
-    finally:
-        db.close()
 
-    manager = get_manager(url)
-    
-    # Define handler for broadcasts
-    async def send_to_client(data):
-        try:
-            await websocket.send_json(data)
-        except:
+    # Prompts may run on any node of the user's pool: listen to all of them
+    managers = [get_manager(node_url) for node_url in comfy_pool.candidates(url)]
+
+    async def remove_everywhere():
+        for manager in managers:
             await manager.remove_client(send_to_client)
 
-    await manager.add_client(send_to_client)
+    async def dropped():
+        # Send failed or the client fell too far behind: stop routing to it and hang up
+        await remove_everywhere()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def send(item):
+        # Binary items are preview frames relayed from ComfyUI
+        if isinstance(item, (bytes, bytearray)):
+            await websocket.send_bytes(bytes(item))
+        else:
+            await websocket.send_json(item)
+
+    # Broadcasts only enqueue; the outbox's writer task does the (possibly slow) socket send
+    outbox = client_outboxes.open(send, on_close=dropped)
+    send_to_client = outbox.put
+
+    subscription = Subscription(user.id if user else None, bool(user and user.is_admin), watch_all)
+    for manager in managers:
+        await manager.add_client(send_to_client, subscription)
     
     try:
         while True:
             # Just keep connection alive, we primarily send updates from ComfyUI -> Client
             await websocket.receive_text()
     except WebSocketDisconnect:
-        await manager.remove_client(send_to_client)
+        pass
     except Exception as e:
         logger.error(f"WS Bridge Error: {e}")
-        await manager.remove_client(send_to_client)
+    finally:
+        await remove_everywhere()
+        await outbox.close()
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import json
+import asyncio
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Optional
-from pydantic import BaseModel
+from sqlalchemy import desc, and_, or_
+from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, computed_field
 from datetime import datetime
 
 from database import get_db, GalleryImage, User
 from auth import get_current_user
+from services.blob_store import blob_store, decode_data_url, is_valid_hash
+from services.http_ranges import etag_matches, parse_range, iter_file
+from services.image_executor import image_executor
+from services.thumbnail_cache import thumbnail_cache, blob_source, render_thumbnail, FORMATS as THUMBNAIL_FORMATS
 
 router = APIRouter(prefix="/api/gallery", tags=["gallery"])
 
@@ -27,10 +36,26 @@ class GalleryItemCreate(BaseModel):
 class GalleryItemResponse(GalleryItemCreate):
     id: int
     created_at: datetime
+    image_hash: Optional[str] = None
+    image_size: Optional[int] = None
+    image_mime: Optional[str] = None
+
+    @computed_field
+    @property
+    def image_url(self) -> Optional[str]:
+        return f"/api/gallery/blobs/{self.image_hash}" if self.image_hash else None
     
     class Config:
         orm_mode = True
 
+def _delete_unreferenced_blobs(db: Session, hashes):
+    """Remove blobs no remaining gallery row points at (blobs are deduplicated)."""
+    # Savers committing a row meanwhile put the blob back right after (blob_store.keep)
+    with blob_store.lock:
+        for digest in set(h for h in hashes if h):
+            if not db.query(GalleryImage.id).filter(GalleryImage.image_hash == digest).first():
+                blob_store.delete(digest)
+
 @router.get("", response_model=List[GalleryItemResponse])
 def get_gallery(workflow_id: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     """Get gallery images for a specific workflow, newest first."""
@@ -39,9 +64,92 @@ def get_gallery(workflow_id: Optional[str] = None, limit: int = 50, db: Session
         query = query.filter(GalleryImage.workflow_id == workflow_id)
     return query.order_by(desc(GalleryImage.created_at)).limit(limit).all()
 
+# Columns selectable through `fields=`; image_data is heavy and must be asked for explicitly
+PAGE_FIELDS = {
+    "id", "prompt_id", "workflow_id", "filename", "subfolder", "prompt_positive", "prompt_negative",
+    "model", "width", "height", "steps", "cfg", "image_hash", "image_size", "image_mime",
+    "image_data", "created_at", "image_url",
+}
+DEFAULT_PAGE_FIELDS = PAGE_FIELDS - {"image_data"}
+MAX_PAGE_SIZE = 200
+
+class GalleryPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+def _encode_cursor(created_at: datetime, item_id: int) -> str:
+    raw = json.dumps({"c": created_at.isoformat(), "i": item_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["c"]), int(data["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/page", response_model=GalleryPage)
+def get_gallery_page(
+    workflow_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """Newest-first gallery page using (created_at, id) keyset pagination.
+
+    `fields` is a comma-separated projection; by default every column except
+    image_data is returned. Pass the returned `next_cursor` to get the next page.
+    """
+    requested = set(f.strip() for f in fields.split(",") if f.strip()) if fields else set(DEFAULT_PAGE_FIELDS)
+    unknown = requested - PAGE_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    # id/created_at are always needed to build the cursor; image_url derives from image_hash
+    columns = (requested - {"image_url"}) | {"id", "created_at"}
+    if "image_url" in requested:
+        columns.add("image_hash")
+    column_list = sorted(columns)
+
+    query = db.query(*[getattr(GalleryImage, c) for c in column_list]).filter(GalleryImage.user_id == user.id)
+    if workflow_id and workflow_id != "all":
+        query = query.filter(GalleryImage.workflow_id == workflow_id)
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.filter(
+            GalleryImage.created_at <= cursor_created_at,
+            or_(
+                GalleryImage.created_at < cursor_created_at,
+                and_(GalleryImage.created_at == cursor_created_at, GalleryImage.id < cursor_id),
+            ),
+        )
+
+    rows = query.order_by(desc(GalleryImage.created_at), desc(GalleryImage.id)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        record = dict(zip(column_list, row))
+        if "image_url" in requested:
+            record["image_url"] = f"/api/gallery/blobs/{record['image_hash']}" if record.get("image_hash") else None
+        items.append({k: v for k, v in record.items() if k in requested})
+
+    next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id) if has_more and rows else None
+    return GalleryPage(items=items, next_cursor=next_cursor)
+
 @router.post("", response_model=GalleryItemResponse)
 def add_to_gallery(item: GalleryItemCreate, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     """Save an image reference to gallery."""
+    image_hash = image_size = image_mime = None
+    decoded = decode_data_url(item.image_data) if item.image_data else None
+    if decoded:
+        image_mime, data = decoded
+        image_hash, image_size = blob_store.put(data)
+
     db_item = GalleryImage(
         filename=item.filename,
         subfolder=item.subfolder,
@@ -54,10 +162,16 @@ def add_to_gallery(item: GalleryItemCreate, db: Session = Depends(get_db), user:
         steps=item.steps,
         cfg=item.cfg,
         user_id=user.id,
-        image_data=item.image_data
+        image_hash=image_hash,
+        image_size=image_size,
+        image_mime=image_mime,
+        # Anything that is not a data URL is kept as-is for backwards compatibility
+        image_data=None if decoded else item.image_data
     )
     db.add(db_item)
     db.commit()
+    if decoded:
+        blob_store.keep(data)
     db.refresh(db_item)
     return db_item
 
@@ -68,13 +182,84 @@ def delete_from_gallery(id: int, db: Session = Depends(get_db), user: User = Dep
     if not item:
         raise HTTPException(status_code=404, detail="Image not found")
 
+    image_hash = item.image_hash
     db.delete(item)
     db.commit()
+    _delete_unreferenced_blobs(db, [image_hash])
     return {"status": "deleted", "id": id}
 
 @router.delete("")
 def clear_gallery(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
     """Clear all images from gallery history."""
-    db.query(GalleryImage).filter(GalleryImage.user_id == user.id).delete()
+    query = db.query(GalleryImage).filter(GalleryImage.user_id == user.id)
+    hashes = [row.image_hash for row in query.with_entities(GalleryImage.image_hash).distinct()]
+    query.delete()
     db.commit()
+    _delete_unreferenced_blobs(db, hashes)
     return {"status": "cleared"}
+
+@router.get("/blobs/{image_hash}")
+def get_blob(image_hash: str, request: Request, db: Session = Depends(get_db)):
+    """Stream stored image bytes (public - used by <img src>). Supports ETag and Range."""
+    if not is_valid_hash(image_hash) or not blob_store.exists(image_hash):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{image_hash}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # Content-addressed: the bytes behind a hash never change
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    path = blob_store.path_for(image_hash)
+    size = os.path.getsize(path)
+    row = db.query(GalleryImage.image_mime).filter(GalleryImage.image_hash == image_hash).first()
+    media_type = (row.image_mime if row else None) or "application/octet-stream"
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range:
+        start, end = byte_range
+        headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+        return StreamingResponse(iter_file(path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(iter_file(path), media_type=media_type, headers=headers)
+
+@router.get("/blobs/{image_hash}/thumbnail")
+async def get_blob_thumbnail(
+    image_hash: str,
+    request: Request,
+    max_size: int = Query(300, ge=16, le=2048),
+    format: str = "webp",
+):
+    """Thumbnail of a stored image (public - used by <img src>). Pregenerated at auto-save, else rendered once."""
+    if format not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if not is_valid_hash(image_hash):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    source = blob_source(image_hash)
+    cached = await asyncio.to_thread(thumbnail_cache.get, source, max_size, format)
+    if cached is None:
+        data = await asyncio.to_thread(blob_store.get, image_hash)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        rendered = await image_executor.run("thumbnail", render_thumbnail, data, max_size, format)
+        cached = await asyncio.to_thread(thumbnail_cache.put, source, max_size, format, rendered)
+
+    path, etag = cached
+    # Content-addressed source: the thumbnail for a hash and size never changes
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=THUMBNAIL_FORMATS[format][1], headers=headers)
@@ -6,6 +6,7 @@ from pydantic import BaseModel
 
 from database import get_db, AppConfig, GenerationPreset, User
 from auth import get_current_user
+from services.endpoint_cache import endpoint_cache, ENDPOINT_CONFIG_KEY
 
 router = APIRouter(prefix="/api/store", tags=["store"])
 
@@ -50,6 +51,9 @@ def set_config(item: ConfigItem, db: Session = Depends(get_db), user: User = Dep
         db.add(db_item)
     db.commit()
     db.refresh(db_item)
+    if item.key == ENDPOINT_CONFIG_KEY:
+        # Any user's row can back the global fallback, so drop every resolved endpoint
+        endpoint_cache.invalidate()
     return db_item
 
 @router.get("/config")
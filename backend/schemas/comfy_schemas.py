@@ -2,6 +2,8 @@
 from typing import Optional, List
 from pydantic import BaseModel, Field
 
+MAX_BATCH_COUNT = 32
+
 class ImageGenerateRequest(BaseModel):
     """Request to generate an image."""
     positive_prompt: str
@@ -17,6 +19,22 @@ class ImageGenerateRequest(BaseModel):
     batch_size: int = 1
     workflow_id: str = "default"
 
+class BatchGenerateRequest(ImageGenerateRequest):
+    """Queue `count` independent generations (fresh seed each) in one call."""
+    count: int = Field(1, ge=1, le=MAX_BATCH_COUNT)
+
+class BatchItem(BaseModel):
+    index: int
+    prompt_id: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+
+class BatchGenerateResponse(BaseModel):
+    batch_id: str
+    status: str
+    prompt_ids: List[str]
+    items: List[BatchItem]
+
 class ImageStatusResponse(BaseModel):
     """Response with generation status."""
     prompt_id: str
@@ -27,3 +45,8 @@ class ImageStatusResponse(BaseModel):
     subfolder: Optional[str] = None
     image_url: Optional[str] = None
     image_urls: List[str] = Field(default_factory=list)
+    node: Optional[str] = None
+    progress_value: int = 0
+    progress_max: int = 0
+    error: Optional[str] = None
+    version: int = 0
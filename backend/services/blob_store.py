@@ -0,0 +1,102 @@
+"""
+Content-addressed on-disk store for gallery image bytes.
+
+Blobs are keyed by SHA-256 and sharded as <root>/ab/cd/<hash> so no single
+directory grows unbounded. Writes go to a temp file in the target shard and
+are published with os.replace, so readers never see partial files. Identical
+images are stored once.
+
+Since a blob may already exist when a new row starts referencing it, deletes
+check for references under `lock`, and savers call keep() after committing
+their rows to put back a blob a delete removed in between.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+from loguru import logger
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BLOB_ROOT = os.environ.get("COMFY_BLOB_DIR", os.path.join(PROJECT_ROOT, "blobs"))
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_valid_hash(digest: str) -> bool:
+    return bool(digest) and bool(_HASH_RE.match(digest))
+
+
+def decode_data_url(data_url: str) -> Optional[Tuple[str, bytes]]:
+    """Split a `data:<mime>;base64,<payload>` string into (mime, bytes)."""
+    if not data_url or not data_url.startswith("data:") or "," not in data_url:
+        return None
+    header, payload = data_url.split(",", 1)
+    mime = header[5:].split(";", 1)[0] or "application/octet-stream"
+    try:
+        return mime, base64.b64decode(payload)
+    except (binascii.Error, ValueError):
+        return None
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_ROOT):
+        self.root = root
+        self.lock = threading.RLock()  # reference check + delete vs. keep()
+
+    def path_for(self, digest: str) -> str:
+        if not is_valid_hash(digest):
+            raise ValueError(f"Invalid blob hash: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return is_valid_hash(digest) and os.path.isfile(self.path_for(digest))
+
+    def put(self, data: bytes) -> Tuple[str, int]:
+        """Store bytes, returning (sha256, size). No-op if already present."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if os.path.isfile(path):
+            return digest, len(data)
+
+        shard = os.path.dirname(path)
+        os.makedirs(shard, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=shard, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        logger.debug(f"BLOB: Stored {digest} ({len(data)} bytes)")
+        return digest, len(data)
+
+    def keep(self, *blobs: bytes):
+        """Call after committing rows that reference `blobs`: restores any deleted meanwhile."""
+        with self.lock:
+            for data in blobs:
+                self.put(data)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        if not self.exists(digest):
+            return None
+        with open(self.path_for(digest), "rb") as f:
+            return f.read()
+
+    def delete(self, digest: str):
+        """Remove a blob (callers must check no row still references it, holding `lock`)."""
+        if self.exists(digest):
+            os.unlink(self.path_for(digest))
+
+
+blob_store = BlobStore()
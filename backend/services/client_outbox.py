@@ -0,0 +1,165 @@
+"""
+Bounded outbound queues for browser connections on /api/comfy/ws.
+
+Each connection gets a ClientOutbox drained by its own writer task, so the
+ComfyUI listener only appends to a deque and a stalled client never applies
+backpressure to the upstream socket. When the queue is full:
+- `progress`, `progress_state`, `crystools.monitor` and `status` are
+  coalesced: queued entries with the same type and prompt are replaced by the
+  newest one (moved to the back, so it stays after the events preceding it)
+- previews (binary frames) are stale and dropped, oldest first; an incoming
+  preview is dropped if nothing else can make room
+- everything else (`executed`, `execution_success`, `gallery_updated`, ...)
+  is never dropped; a client that falls OUTBOX_OVERFLOW_LIMIT entries behind
+  is disconnected instead
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, Union
+
+from loguru import logger
+
+OUTBOX_SIZE = int(os.environ.get("COMFY_WS_OUTBOX_SIZE", "64"))
+OUTBOX_OVERFLOW_LIMIT = int(os.environ.get("COMFY_WS_OUTBOX_OVERFLOW", str(OUTBOX_SIZE * 4)))
+# Latest-wins events: only the newest one per (type, prompt) matters to the UI
+COALESCE_TYPES = {"progress", "progress_state", "crystools.monitor", "status"}
+
+Item = Union[Dict, bytes]
+
+
+def _is_preview(item: Item) -> bool:
+    return isinstance(item, (bytes, bytearray))
+
+
+def _coalesce_key(item: Item) -> Optional[Tuple[str, Optional[str]]]:
+    if _is_preview(item) or item.get("type") not in COALESCE_TYPES:
+        return None
+    data = item.get("data")
+    return item["type"], data.get("prompt_id") if isinstance(data, dict) else None
+
+
+class ClientOutbox:
+    def __init__(
+        self,
+        send: Callable[[Item], Awaitable[Any]],
+        on_close: Optional[Callable[[], Awaitable[Any]]] = None,
+        maxsize: int = OUTBOX_SIZE,
+        overflow_limit: int = OUTBOX_OVERFLOW_LIMIT,
+        registry: Optional["OutboxRegistry"] = None,
+    ):
+        self.send = send
+        self.on_close = on_close
+        self.maxsize = maxsize
+        self.overflow_limit = max(overflow_limit, maxsize)
+        self.registry = registry
+        self.items: deque = deque()
+        self.closed = False
+        self.stats = {"queued": 0, "sent": 0, "coalesced": 0, "dropped": 0, "peak": 0}
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "ClientOutbox":
+        self._task = asyncio.get_running_loop().create_task(self._write())
+        return self
+
+    def put(self, item: Item):
+        """Queue `item` for the writer; never blocks. Applies the drop/coalesce policy when full."""
+        if self.closed:
+            return
+        self.stats["queued"] += 1
+        if len(self.items) >= self.maxsize and not self._make_room(item):
+            self._count("dropped")
+            return
+        self.items.append(item)
+        self.stats["peak"] = max(self.stats["peak"], len(self.items))
+        self._ready.set()
+        if len(self.items) > self.overflow_limit:
+            logger.warning(f"OUTBOX: Client {len(self.items)} events behind, disconnecting")
+            if self.registry:
+                self.registry.overflows += 1
+            self._close()
+
+    def _make_room(self, item: Item) -> bool:
+        """Free a slot for `item`; False if `item` itself should be dropped."""
+        key = _coalesce_key(item)
+        if key is not None:
+            stale = [queued for queued in self.items if _coalesce_key(queued) == key]
+            for queued in stale:
+                self.items.remove(queued)
+                self._count("coalesced")
+            if stale:
+                return True
+        for queued in self.items:
+            if _is_preview(queued):
+                self.items.remove(queued)
+                self._count("dropped")
+                return True
+        # Previews are the only thing dropped on arrival; terminal events overflow the soft bound
+        return not _is_preview(item)
+
+    def _count(self, stat: str):
+        self.stats[stat] += 1
+        if self.registry:
+            self.registry.totals[stat] += 1
+
+    async def _write(self):
+        while not self.closed:
+            if not self.items:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            item = self.items.popleft()
+            try:
+                await self.send(item)
+            except Exception as e:
+                logger.debug(f"OUTBOX: Send failed, closing client: {e}")
+                self._close()
+                return
+            self._count("sent")
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.items.clear()
+        self._ready.set()
+        if self.registry:
+            self.registry.active.discard(self)
+        if self.on_close is not None:
+            asyncio.get_running_loop().create_task(self.on_close())
+
+    async def close(self):
+        """Stop the writer (connection ended); queued events are discarded."""
+        self._close()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+            self._task = None
+
+
+class OutboxRegistry:
+    """Tracks open outboxes for metrics."""
+
+    def __init__(self):
+        self.active: Set[ClientOutbox] = set()
+        self.totals = {"sent": 0, "coalesced": 0, "dropped": 0}
+        self.overflows = 0
+
+    def open(self, send: Callable[[Item], Awaitable[Any]], on_close: Optional[Callable[[], Awaitable[Any]]] = None) -> ClientOutbox:
+        outbox = ClientOutbox(send, on_close, registry=self).start()
+        self.active.add(outbox)
+        return outbox
+
+    def get_stats(self) -> Dict:
+        pending = [len(outbox.items) for outbox in self.active]
+        return {
+            "clients": len(self.active),
+            "pending": sum(pending),
+            "max_pending": max(pending, default=0),
+            "size": OUTBOX_SIZE,
+            "overflow_disconnects": self.overflows,
+            **self.totals,
+        }
+
+
+client_outboxes = OutboxRegistry()
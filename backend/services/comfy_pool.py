@@ -0,0 +1,182 @@
+"""
+Pool of ComfyUI nodes with load-aware dispatch.
+
+COMFY_POOL_NODES lists the shared GPU boxes (comma separated URLs). A resolved
+ComfyUI URL that belongs to the pool dispatches across all of its nodes; any
+other URL (e.g. a user's own box) is used on its own, exactly as before.
+
+Per node the pool tracks:
+- health: a failed dispatch or /queue poll marks the node down; it is only
+  tried as a last resort until a poll or WS reconnect sees it again
+- queue depth: `queue_remaining` from WS `status` events and periodic /queue
+  polls, plus prompts dispatched since that observation
+- model affinity: the model key of the last prompt sent to the node, which
+  is what ComfyUI has loaded once its queue drains (no checkpoint swap)
+
+Every dispatched prompt id is mapped back to its node so status and image
+requests reach the box that actually ran it.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from services.http_client_pool import get_comfy_client
+from services.model_catalog import model_catalog
+
+POOL_NODES = [u.strip().rstrip("/") for u in os.environ.get("COMFY_POOL_NODES", "").split(",") if u.strip()]
+POOL_POLL_INTERVAL = float(os.environ.get("COMFY_POOL_POLL_INTERVAL", "5"))
+# Queue slots a checkpoint swap is worth when comparing nodes
+POOL_AFFINITY_WEIGHT = float(os.environ.get("COMFY_POOL_AFFINITY_WEIGHT", "2"))
+MAX_TRACKED_PROMPT_NODES = 10000
+
+
+class ComfyNode:
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.queue_remaining = 0
+        self.dispatched_since_status = 0
+        self.queue_observed_at: Optional[float] = None
+        self.last_model: Optional[str] = None
+        self.dispatched = 0
+        self.last_seen: Optional[float] = None
+
+    @property
+    def load(self) -> int:
+        return self.queue_remaining + self.dispatched_since_status
+
+    def snapshot(self) -> Dict:
+        return {
+            "healthy": self.healthy,
+            "queue_remaining": self.queue_remaining,
+            "load": self.load,
+            "last_model": self.last_model,
+            "dispatched": self.dispatched,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_seen": round(time.monotonic() - self.last_seen, 1) if self.last_seen else None,
+        }
+
+
+class ComfyPool:
+    def __init__(self, urls: List[str] = POOL_NODES, affinity_weight: float = POOL_AFFINITY_WEIGHT):
+        self.members = list(dict.fromkeys(urls))
+        self.affinity_weight = affinity_weight
+        self.nodes: Dict[str, ComfyNode] = {url: ComfyNode(url) for url in self.members}
+        self.prompt_nodes: "OrderedDict[str, str]" = OrderedDict()
+        self.failovers = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def node(self, url: str) -> ComfyNode:
+        """State for `url` (nodes outside the pool are tracked too, for metrics and health)."""
+        node = self.nodes.get(url)
+        if node is None:
+            node = self.nodes[url] = ComfyNode(url)
+        return node
+
+    def candidates(self, url: str) -> List[str]:
+        """Nodes a request resolved to `url` may run on."""
+        return list(self.members) if url in self.members else [url]
+
+    def rank(self, url: str, model: Optional[str] = None, affinity: Optional[str] = None) -> List[str]:
+        """Candidates best-first: healthy, has `model`, shortest queue after the `affinity` bonus."""
+        def key(item):
+            index, node_url = item
+            node = self.node(node_url)
+            catalog = model_catalog.entries.get(node_url)
+            lacks_model = bool(model and catalog and catalog.sets["models"] and model not in catalog.sets["models"])
+            bonus = self.affinity_weight if affinity and node.last_model == affinity else 0
+            return (not node.healthy, lacks_model, node.load - bonus, index)
+        return [node_url for _, node_url in sorted(enumerate(self.candidates(url)), key=key)]
+
+    # --- Observations ---
+
+    def record_dispatch(self, prompt_id: str, url: str, affinity: Optional[str] = None):
+        node = self.node(url)
+        node.dispatched += 1
+        node.dispatched_since_status += 1
+        if affinity:
+            node.last_model = affinity
+        self.mark_up(url)
+        self.prompt_nodes[prompt_id] = url
+        self.prompt_nodes.move_to_end(prompt_id)
+        while len(self.prompt_nodes) > MAX_TRACKED_PROMPT_NODES:
+            self.prompt_nodes.popitem(last=False)
+
+    def node_for(self, prompt_id: Optional[str]) -> Optional[str]:
+        return self.prompt_nodes.get(prompt_id) if prompt_id else None
+
+    def observe_status(self, url: str, payload: Dict):
+        """WS `status` event: {"status": {"exec_info": {"queue_remaining": N}}}."""
+        remaining = payload.get("status", {}).get("exec_info", {}).get("queue_remaining")
+        if isinstance(remaining, int):
+            node = self.node(url)
+            node.queue_remaining = remaining
+            node.dispatched_since_status = 0
+            node.queue_observed_at = node.last_seen = time.monotonic()
+
+    def mark_up(self, url: str):
+        node = self.node(url)
+        if not node.healthy:
+            logger.info(f"POOL: Node {url} is back")
+        node.healthy = True
+        node.failures = 0
+        node.last_seen = time.monotonic()
+
+    def mark_down(self, url: str, error: str):
+        node = self.node(url)
+        if node.healthy:
+            logger.warning(f"POOL: Node {url} marked down: {error}")
+        node.healthy = False
+        node.failures += 1
+        node.last_error = error
+
+    # --- Health polling ---
+
+    async def poll_once(self):
+        async def poll(url: str):
+            try:
+                resp = await get_comfy_client(url).get(f"{url}/queue", timeout=5.0)
+                resp.raise_for_status()
+                data = resp.json()
+            except Exception as e:
+                self.mark_down(url, str(e) or type(e).__name__)
+                return
+            node = self.node(url)
+            node.queue_remaining = len(data.get("queue_running", [])) + len(data.get("queue_pending", []))
+            node.dispatched_since_status = 0
+            node.queue_observed_at = time.monotonic()
+            self.mark_up(url)
+
+        await asyncio.gather(*(poll(url) for url in self.members))
+
+    async def monitor(self, interval: float = POOL_POLL_INTERVAL):
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(interval)
+
+    def start_monitoring(self):
+        if len(self.members) > 1 and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self.monitor())
+
+    async def stop_monitoring(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "members": self.members,
+            "nodes": {url: node.snapshot() for url, node in self.nodes.items()},
+            "tracked_prompts": len(self.prompt_nodes),
+            "failovers": self.failovers,
+        }
+
+
+comfy_pool = ComfyPool()
@@ -0,0 +1,69 @@
+"""
+Resolved ComfyUI endpoint cache for routes.comfy.get_comfy_url.
+
+Maps user id (None = anonymous/global lookup) to the resolved ComfyUI URL so
+the hot request path skips the AppConfig queries. Entries expire after a TTL
+and are invalidated write-through by the routes that change the inputs
+(persistence.set_config, auth.update_me).
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+ENDPOINT_CACHE_TTL = float(os.environ.get("COMFY_ENDPOINT_CACHE_TTL", "300"))
+ENDPOINT_CONFIG_KEY = "comfyui_url"
+
+
+class EndpointCache:
+    def __init__(self, ttl: float = ENDPOINT_CACHE_TTL):
+        self.ttl = ttl
+        # user_id -> (url, expires_at)
+        self.entries: Dict[Optional[int], Tuple[str, float]] = {}
+        # Bumped on every invalidation so a lookup that raced a write is not cached
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()  # set_config/update_me run in the threadpool
+
+    def get(self, user_id: Optional[int]) -> Optional[str]:
+        entry = self.entries.get(user_id)
+        if entry and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def set(self, user_id: Optional[int], url: str, generation: int):
+        """Store a resolved URL unless an invalidation happened since `generation` was read."""
+        with self._lock:
+            if generation == self.generation:
+                self.entries[user_id] = (url, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop one user's entry, or everything when user_id is None."""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+        logger.debug(f"ENDPOINT CACHE: Invalidated {'all users' if user_id is None else f'user {user_id}'}")
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+endpoint_cache = EndpointCache()
@@ -0,0 +1,403 @@
+"""
+Wrapper-side generation queue: admission control, per-user fair queuing and
+model-affinity scheduling in front of ComfyUI `/prompt`.
+
+ComfyUI runs its queue strictly FIFO, so one user scripting hundreds of
+generations starves everyone else, and interleaving checkpoints (Flux, Z-Image
+Turbo AIO, the SeedVR2 upscaler) forces a model reload between prompts that
+can cost more than the sampling itself. Instead of pushing every request
+straight into ComfyUI, each node only holds COMFY_SCHEDULER_INFLIGHT_PER_NODE
+of our prompts at a time and the rest wait here:
+
+- admission: at most COMFY_SCHEDULER_MAX_QUEUE jobs wait in total and
+  COMFY_SCHEDULER_MAX_QUEUE_PER_USER per user; beyond that submit() raises
+  QueueFullError with a Retry-After estimate
+- fairness: weighted fair queuing over users. Every dispatch charges the
+  user 1/weight of virtual time (COMFY_SCHEDULER_WEIGHTS="alice=2,bob=0.5",
+  default 1) and only users within one job of the least-served one are
+  eligible for the next slot
+- affinity: among eligible users, the oldest job using the models the node
+  has loaded (last dispatched to it) goes first, otherwise the head of the
+  least-served user. Within a user a job can be overtaken at most
+  COMFY_SCHEDULER_MAX_SKIPS times
+- with a free slot and nothing waiting, a request is submitted inline, so an
+  idle system behaves exactly as before (and errors surface on the request)
+
+Prompt ids are minted here and sent as ComfyUI's `prompt_id`, so a held job
+has its final id and tracker state from the moment it is accepted.
+
+Whenever affinity avoids the swap the fair order would have caused,
+COMFY_MODEL_SWAP_SECONDS is added to the `swap_seconds_saved` estimate.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+from services.comfy_pool import comfy_pool
+from services.prompt_tracker import prompt_tracker
+
+INFLIGHT_PER_NODE = int(os.environ.get("COMFY_SCHEDULER_INFLIGHT_PER_NODE", "2"))
+MAX_QUEUE = int(os.environ.get("COMFY_SCHEDULER_MAX_QUEUE", "200"))
+MAX_QUEUE_PER_USER = int(os.environ.get("COMFY_SCHEDULER_MAX_QUEUE_PER_USER", "50"))
+MAX_SKIPS = int(os.environ.get("COMFY_SCHEDULER_MAX_SKIPS", "4"))
+MODEL_SWAP_SECONDS = float(os.environ.get("COMFY_MODEL_SWAP_SECONDS", "20"))
+# Starting estimate for ETA / Retry-After until real durations are measured
+DEFAULT_JOB_SECONDS = float(os.environ.get("COMFY_SCHEDULER_JOB_SECONDS", "30"))
+# Safety net for prompts whose completion we never hear about (ComfyUI restarted, WS down)
+INFLIGHT_TIMEOUT = float(os.environ.get("COMFY_SCHEDULER_INFLIGHT_TIMEOUT", "1800"))
+RECHECK_INTERVAL = 0.5
+MAX_SUBMIT_ATTEMPTS = 3
+MAX_RETRY_AFTER = 300
+
+# Upstream answers that mean "this node can't take work right now" -> try the next one
+FAILOVER_STATUS_CODES = {502, 503, 504}
+MODEL_INPUTS = ("ckpt_name", "unet_name", "model")
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            weights[name.strip()] = float(value)
+    return weights
+
+
+USER_WEIGHTS = _parse_weights(os.environ.get("COMFY_SCHEDULER_WEIGHTS", ""))
+
+
+def model_key(workflow: Dict) -> str:
+    """Models a workflow needs resident: file-name inputs of its loader nodes."""
+    names = set()
+    for node in workflow.values():
+        if "Load" not in node.get("class_type", ""):
+            continue
+        for name in MODEL_INPUTS:
+            value = node["inputs"].get(name)
+            if isinstance(value, str):
+                names.add(value)
+    return "+".join(sorted(names)) or "default"
+
+
+class QueueFullError(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """One generation waiting for (or being handed to) a ComfyUI node."""
+
+    def __init__(self, prompt_id: str, url: str, model_key: str, user_id: Optional[int],
+                 submit: Callable[[str, str], Awaitable[str]], model: Optional[str] = None, weight: float = 1.0):
+        self.prompt_id = prompt_id
+        self.url = url
+        self.model_key = model_key
+        self.user_id = user_id
+        self.submit = submit  # (node_url, prompt_id) -> prompt_id as reported by ComfyUI
+        self.model = model
+        self.weight = weight
+        self.skips = 0
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in FAILOVER_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+class GenerationScheduler:
+    def __init__(self, inflight_per_node: int = INFLIGHT_PER_NODE, max_skips: int = MAX_SKIPS,
+                 swap_seconds: float = MODEL_SWAP_SECONDS, max_queue: int = MAX_QUEUE,
+                 max_queue_per_user: int = MAX_QUEUE_PER_USER, weights: Optional[Dict[str, float]] = None):
+        self.inflight_per_node = inflight_per_node
+        self.max_skips = max_skips
+        self.swap_seconds = swap_seconds
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.weights = USER_WEIGHTS if weights is None else weights
+        # pool candidates -> FIFO of held jobs
+        self.queues: Dict[Tuple[str, ...], List[Job]] = {}
+        # node_url -> {prompt_id: submitted_at}
+        self.inflight: Dict[str, Dict[str, float]] = {}
+        # Weighted fair queuing: user -> virtual service received; clock = virtual time of the last dispatch
+        self.vtime: Dict[Optional[int], float] = {}
+        self.virtual_clock = 0.0
+        self.job_seconds = DEFAULT_JOB_SECONDS  # EWMA of observed per-prompt service time
+        self._last_done: Dict[str, float] = {}
+        self._kick: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.submitted_inline = 0
+        self.held = 0
+        self.dispatched_held = 0
+        self.rejected = 0
+        self.swaps = 0
+        self.swaps_avoided = 0
+        self.swap_seconds_saved = 0.0
+        self.fairness_overrides = 0
+        self.failed = 0
+
+    def weight_for(self, username: Optional[str]) -> float:
+        return max(self.weights.get(username or "", 1.0), 0.01)
+
+    # --- Capacity ---
+
+    def _release_finished(self):
+        now = time.monotonic()
+        for node_url, prompts in self.inflight.items():
+            node = comfy_pool.node(node_url)
+            for prompt_id, submitted_at in list(prompts.items()):
+                state = prompt_tracker.get(prompt_id)
+                done = state is None or state.status not in ("pending", "processing")
+                # ComfyUI reported an empty queue after we submitted: the prompt has left it
+                drained = node.queue_remaining == 0 and (node.queue_observed_at or 0) > submitted_at
+                if done or drained or now - submitted_at > INFLIGHT_TIMEOUT:
+                    del prompts[prompt_id]
+                    if state is not None and (done or drained):
+                        # Service time: from submission or the node's previous completion, whichever is later
+                        started = max(submitted_at, self._last_done.get(node_url, 0.0))
+                        self.job_seconds += 0.2 * ((now - started) - self.job_seconds)
+                        self._last_done[node_url] = now
+
+    def _free_nodes(self, url: str, model: Optional[str] = None, affinity: Optional[str] = None) -> List[str]:
+        return [node_url for node_url in comfy_pool.rank(url, model, affinity)
+                if len(self.inflight.get(node_url, ())) < self.inflight_per_node]
+
+    # --- Admission ---
+
+    def waiting(self, user_id: Optional[int] = None) -> int:
+        return sum(1 for queue in self.queues.values() for job in queue if user_id is None or job.user_id == user_id)
+
+    def _throughput(self, url: str) -> float:
+        """Jobs per second the candidate nodes of `url` complete."""
+        healthy = sum(1 for node_url in comfy_pool.candidates(url) if comfy_pool.node(node_url).healthy)
+        return max(healthy, 1) / max(self.job_seconds, 1.0)
+
+    def check_admission(self, url: str, user_id: Optional[int], count: int = 1):
+        """Raise QueueFullError if `count` more held jobs would exceed the queue bounds."""
+        if self.waiting() + count > self.max_queue:
+            reason, excess = "Generation queue is full", self.waiting() + count - self.max_queue
+        elif self.waiting(user_id) + count > self.max_queue_per_user:
+            reason, excess = "Too many queued generations", self.waiting(user_id) + count - self.max_queue_per_user
+        else:
+            return
+        self.rejected += 1
+        retry_after = min(MAX_RETRY_AFTER, max(1, math.ceil(excess / self._throughput(url))))
+        raise QueueFullError(f"{reason}; retry in {retry_after}s", retry_after)
+
+    # --- Submission ---
+
+    async def submit(self, job: Job) -> str:
+        """Queue `job` on ComfyUI now if a slot is free and nobody is waiting, else hold it."""
+        queue = self.queues.setdefault(tuple(comfy_pool.candidates(job.url)), [])
+        self._release_finished()
+        if not queue:
+            nodes = self._free_nodes(job.url, job.model, job.model_key)
+            if nodes:
+                self.submitted_inline += 1
+                return await self._dispatch(job, nodes)
+
+        self.check_admission(job.url, job.user_id)
+        if not any(waiting.user_id == job.user_id for waiting in queue):
+            # A user (re)joining starts at the current virtual time: idle periods are not banked
+            self.vtime[job.user_id] = max(self.vtime.get(job.user_id, 0.0), self.virtual_clock)
+        queue.append(job)
+        self.held += 1
+        prompt_tracker.register(job.prompt_id, job.user_id)
+        logger.info(f"SCHEDULER: Holding prompt {job.prompt_id} ({job.model_key}), {len(queue)} waiting")
+        self._ensure_worker()
+        self._kick.set()
+        return job.prompt_id
+
+    async def _dispatch(self, job: Job, nodes: List[str]) -> str:
+        """Submit to the first node that accepts it, failing over past unreachable ones."""
+        for attempt, node_url in enumerate(nodes):
+            try:
+                prompt_id = await job.submit(node_url, job.prompt_id)
+            except Exception as e:
+                if not _retryable(e):
+                    raise
+                comfy_pool.mark_down(node_url, str(e) or type(e).__name__)
+                if attempt == len(nodes) - 1:
+                    raise
+                comfy_pool.failovers += 1
+                logger.warning(f"SCHEDULER: Node {node_url} unavailable, failing over to {nodes[attempt + 1]}")
+                continue
+            if prompt_id != job.prompt_id:
+                # Older ComfyUI builds mint their own id; the client may already hold ours
+                logger.warning(f"SCHEDULER: ComfyUI at {node_url} ignored prompt id {job.prompt_id}, got {prompt_id}")
+                prompt_tracker.alias(job.prompt_id, prompt_id)
+            loaded = comfy_pool.node(node_url).last_model
+            if loaded and loaded != job.model_key:
+                self.swaps += 1
+            self._charge(job)
+            comfy_pool.record_dispatch(prompt_id, node_url, job.model_key)
+            self.inflight.setdefault(node_url, {})[prompt_id] = time.monotonic()
+            return prompt_id
+
+    def _charge(self, job: Job):
+        """Weighted fair queuing: a dispatch costs the user 1/weight of virtual time."""
+        start = self.vtime.get(job.user_id, self.virtual_clock)
+        self.virtual_clock = max(self.virtual_clock, start)
+        self.vtime[job.user_id] = start + 1.0 / job.weight
+
+    def _by_user(self, queue: List[Job]) -> "OrderedDict[Optional[int], List[Job]]":
+        by_user: "OrderedDict[Optional[int], List[Job]]" = OrderedDict()
+        for job in queue:
+            by_user.setdefault(job.user_id, []).append(job)
+        return by_user
+
+    def _pick(self, queue: List[Job], loaded: Optional[str]) -> Job:
+        by_user = self._by_user(queue)
+        vtime = {user: self.vtime.setdefault(user, self.virtual_clock) for user in by_user}
+        least = min(by_user, key=lambda user: (vtime[user], by_user[user][0].enqueued_at))
+        # Within one job of the least-served user: room to group by model without breaking fairness
+        eligible = [user for user in by_user if vtime[user] <= vtime[least] + 1.0]
+        fair = by_user[least][0]
+
+        overdue = [by_user[user][0] for user in eligible if by_user[user][0].skips >= self.max_skips]
+        if overdue:
+            chosen = min(overdue, key=lambda job: job.enqueued_at)
+        else:
+            matching = [job for user in eligible for job in by_user[user] if job.model_key == loaded]
+            chosen = min(matching, key=lambda job: job.enqueued_at) if matching else fair
+        if loaded and chosen.model_key != loaded:
+            if any(job.model_key == loaded for job in queue):
+                self.fairness_overrides += 1
+        elif loaded and fair.model_key != loaded:
+            self.swaps_avoided += 1
+            self.swap_seconds_saved += self.swap_seconds
+
+        for job in by_user[chosen.user_id]:
+            if job is chosen:
+                break
+            job.skips += 1
+        queue.remove(chosen)
+        return chosen
+
+    async def _drain(self, queue: List[Job]):
+        while queue:
+            nodes = self._free_nodes(queue[0].url)
+            if not nodes:
+                return
+            job = self._pick(queue, comfy_pool.node(nodes[0]).last_model)
+            try:
+                await self._dispatch(job, nodes)
+                self.dispatched_held += 1
+                logger.debug(f"SCHEDULER: Dispatched held prompt {job.prompt_id} after "
+                             f"{time.monotonic() - job.enqueued_at:.1f}s ({job.skips} skips)")
+            except Exception as e:
+                job.attempts += 1
+                if _retryable(e) and job.attempts < MAX_SUBMIT_ATTEMPTS:
+                    queue.insert(0, job)
+                    return
+                self.failed += 1
+                logger.error(f"SCHEDULER: Giving up on prompt {job.prompt_id}: {e}")
+                prompt_tracker.handle_event("execution_error", {
+                    "prompt_id": job.prompt_id, "exception_message": f"Could not queue on ComfyUI: {e}",
+                })
+
+    # --- Reporting ---
+
+    def positions(self, url: str, user_id: Optional[int]) -> List[Dict]:
+        """Estimated position / ETA of a user's held jobs under fair sharing.
+
+        The k-th waiting job of a user with weight w runs after roughly
+        min(n_v, k * w_v / w) jobs of every other user v, plus everything in flight.
+        """
+        queue = self.queues.get(tuple(comfy_pool.candidates(url)), [])
+        by_user = self._by_user(queue)
+        mine = by_user.get(user_id, [])
+        inflight = sum(len(self.inflight.get(node_url, ())) for node_url in comfy_pool.candidates(url))
+        throughput = self._throughput(url)
+        result = []
+        for k, job in enumerate(mine, start=1):
+            ahead = k - 1 + sum(
+                min(len(jobs), math.ceil(k * jobs[0].weight / job.weight))
+                for user, jobs in by_user.items() if user != user_id
+            )
+            result.append({
+                "prompt_id": job.prompt_id,
+                "position": ahead + 1,
+                "eta_seconds": round((ahead + inflight + 1) / throughput, 1),
+                "waited_seconds": round(time.monotonic() - job.enqueued_at, 1),
+            })
+        return result
+
+    def queue_status(self, url: str, user_id: Optional[int]) -> Dict:
+        return {
+            "waiting": len(self.queues.get(tuple(comfy_pool.candidates(url)), [])),
+            "inflight": {node_url: len(self.inflight.get(node_url, ())) for node_url in comfy_pool.candidates(url)},
+            "inflight_per_node": self.inflight_per_node,
+            "max_queue_per_user": self.max_queue_per_user,
+            "job_seconds": round(self.job_seconds, 1),
+            "jobs": self.positions(url, user_id),
+        }
+
+    # --- Worker ---
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._kick = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._kick.wait(), RECHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._kick.clear()
+            self._release_finished()
+            for queue in list(self.queues.values()):
+                try:
+                    await self._drain(queue)
+                except Exception as e:
+                    logger.error(f"SCHEDULER: Drain failed: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        waiting = [job for queue in self.queues.values() for job in queue]
+        by_model: Dict[str, int] = {}
+        by_user: Dict[str, int] = {}
+        for job in waiting:
+            by_model[job.model_key] = by_model.get(job.model_key, 0) + 1
+            by_user[str(job.user_id)] = by_user.get(str(job.user_id), 0) + 1
+        return {
+            "waiting": len(waiting),
+            "waiting_by_model": by_model,
+            "waiting_by_user": by_user,
+            "oldest_wait": round(max((now - job.enqueued_at for job in waiting), default=0.0), 1),
+            "inflight": {url: len(prompts) for url, prompts in self.inflight.items()},
+            "inflight_per_node": self.inflight_per_node,
+            "max_queue": self.max_queue,
+            "max_queue_per_user": self.max_queue_per_user,
+            "max_skips": self.max_skips,
+            "job_seconds": round(self.job_seconds, 1),
+            "submitted_inline": self.submitted_inline,
+            "held": self.held,
+            "dispatched_held": self.dispatched_held,
+            "rejected": self.rejected,
+            "swaps": self.swaps,
+            "swaps_avoided": self.swaps_avoided,
+            "swap_seconds_saved": round(self.swap_seconds_saved, 1),
+            "fairness_overrides": self.fairness_overrides,
+            "failed": self.failed,
+        }
+
+
+generation_scheduler = GenerationScheduler()
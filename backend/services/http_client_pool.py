@@ -0,0 +1,187 @@
+"""
+Shared httpx client registry for ComfyUI backends.
+
+One long-lived AsyncClient per (base URL, proxy mode) so status polls, image
+fetches and auto-save downloads reuse keep-alive connections instead of paying
+a fresh TCP (and Tailscale proxy) handshake on every call.
+"""
+import asyncio
+import importlib.util
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from loguru import logger
+
+TAILSCALE_HTTP_PROXY = "http://localhost:1056"  # Tailscale userspace HTTP proxy
+
+# Pool tuning (env overridable)
+MAX_CONNECTIONS = int(os.environ.get("COMFY_HTTP_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("COMFY_HTTP_MAX_KEEPALIVE", "16"))
+KEEPALIVE_EXPIRY = float(os.environ.get("COMFY_HTTP_KEEPALIVE_EXPIRY", "60"))
+DEFAULT_TIMEOUT = float(os.environ.get("COMFY_HTTP_TIMEOUT", "30"))
+
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 keep-alive without it.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+HTTP2_ENABLED = HTTP2_AVAILABLE and os.environ.get("COMFY_HTTP2", "1") != "0"
+
+
+def _is_tailscale_url(url: str) -> bool:
+    """Check if URL points to a Tailscale address (100.x.x.x)."""
+    try:
+        host = urlparse(url).hostname or ""
+        return host.startswith("100.")
+    except Exception:
+        return False
+
+
+def _pool_key(url: str) -> Tuple[str, str]:
+    """Registry key: scheme://host:port of the backend plus proxy mode."""
+    parsed = urlparse(url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    mode = "tailscale" if _is_tailscale_url(url) else "direct"
+    return origin, mode
+
+
+class PoolStats:
+    """Counters for one pooled client."""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.in_flight = 0
+        self.errors = 0
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+
+class _StatsTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport that counts requests and fresh TCP connects."""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def _trace(self, event_name: str, info: Dict):
+        if event_name.endswith("connect_tcp.complete"):
+            self.stats.new_connections += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        request.extensions = {**request.extensions, "trace": self._trace}
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.in_flight -= 1
+
+    def pool_state(self) -> Dict[str, int]:
+        """Snapshot of the underlying httpcore pool (open / idle / waiting)."""
+        pool = getattr(self, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        pending = getattr(pool, "_requests", []) or []
+        return {
+            "connections_open": len(connections),
+            "connections_idle": sum(1 for c in connections if c.is_idle()),
+            "waiting": sum(1 for r in pending if r.is_queued()),
+        }
+
+
+class ComfyClientPool:
+    """Registry of long-lived AsyncClients keyed by ComfyUI origin and proxy mode."""
+
+    def __init__(self):
+        self.clients: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+        self.transports: Dict[Tuple[str, str], _StatsTransport] = {}
+        self.stats: Dict[Tuple[str, str], PoolStats] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+
+    def _check_loop(self):
+        """Connections are bound to the loop that opened them; start over on a new loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._loop is not loop:
+            if self.clients:
+                logger.debug("HTTP POOL: Event loop changed, discarding pooled clients")
+            self.clients.clear()
+            self.transports.clear()
+            self._loop = loop
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """Return the shared client for the backend serving `url`."""
+        self._check_loop()
+        key = _pool_key(url)
+        client = self.clients.get(key)
+        if client is not None and not client.is_closed:
+            return client
+
+        stats = self.stats.setdefault(key, PoolStats())
+        proxy = TAILSCALE_HTTP_PROXY if key[1] == "tailscale" else None
+        transport = _StatsTransport(
+            stats,
+            limits=self._limits(),
+            http2=HTTP2_ENABLED,
+            proxy=proxy,
+            trust_env=proxy is not None,
+        )
+        client = httpx.AsyncClient(
+            transport=transport,
+            timeout=DEFAULT_TIMEOUT,
+            trust_env=proxy is not None,
+        )
+        self.clients[key] = client
+        self.transports[key] = transport
+        logger.info(f"HTTP POOL: Opened pooled client for {key[0]} ({key[1]}, http2={HTTP2_ENABLED})")
+        return client
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Per-pool counters: connections open, reused, waiting."""
+        result = {}
+        for key, stats in self.stats.items():
+            transport = self.transports.get(key)
+            state = transport.pool_state() if transport else {"connections_open": 0, "connections_idle": 0, "waiting": 0}
+            result[f"{key[0]} ({key[1]})"] = {
+                **state,
+                "requests": stats.requests,
+                "new_connections": stats.new_connections,
+                "reused": stats.reused,
+                "in_flight": stats.in_flight,
+                "errors": stats.errors,
+            }
+        return result
+
+    async def aclose(self):
+        """Close every pooled client (called on app shutdown)."""
+        clients = list(self.clients.values())
+        self.clients.clear()
+        self.transports.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"HTTP POOL: Error closing client: {e}")
+        if clients:
+            logger.info(f"HTTP POOL: Closed {len(clients)} pooled clients")
+
+
+client_pool = ComfyClientPool()
+
+
+def get_comfy_client(url: str) -> httpx.AsyncClient:
+    """Shared pooled client for a ComfyUI URL. Do not close it; pass per-call timeouts."""
+    return client_pool.get_client(url)
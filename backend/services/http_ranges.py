@@ -0,0 +1,64 @@
+"""
+Helpers for conditional (ETag) and byte-range HTTP responses.
+"""
+import os
+from typing import Iterator, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header matches `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=start-end` range against a resource of `size` bytes.
+
+    Returns (start, end) inclusive, None if there is no usable Range header,
+    or raises ValueError if the range cannot be satisfied.
+    Multi-range requests are served as a full response (None).
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    spec = range_header[len("bytes="):].strip()
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s == "":
+            # Suffix range: last N bytes
+            length = int(end_s)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(size - length, 0), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        raise ValueError(f"Malformed range: {range_header}")
+    if start >= size or start > end:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    return start, min(end, size - 1)
+
+
+def iter_file(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield a file (or the inclusive [start, end] slice of it) in chunks.
+
+    A plain generator on purpose: StreamingResponse iterates it in the thread
+    pool, so the blocking reads stay off the event loop.
+    """
+    if end is None:
+        end = os.path.getsize(path) - 1
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,107 @@
+"""
+Process pool for CPU-bound image work (PIL decode/resize/encode).
+
+Keeps PIL off the event loop so WebSocket bridges and API handlers stay
+responsive while large upscaler outputs are processed. Submissions beyond
+the queue bound wait (backpressure) instead of piling up unbounded work.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+from loguru import logger
+
+# 0 workers = run in a thread instead of a process pool (useful for debugging)
+IMAGE_WORKERS = int(os.environ.get("COMFY_IMAGE_WORKERS", str(os.cpu_count() or 2)))
+IMAGE_QUEUE_SIZE = int(os.environ.get("COMFY_IMAGE_QUEUE_SIZE", str(max(IMAGE_WORKERS, 1) * 4)))
+LATENCY_WINDOW = 256
+
+
+class TaskStats:
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self) -> Dict:
+        ordered = sorted(self.latencies)
+        p95 = ordered[int(len(ordered) * 0.95) - 1] if ordered else 0.0
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+            "p95_ms": round(p95 * 1000, 2),
+        }
+
+
+class ImageExecutor:
+    def __init__(self, workers: int = IMAGE_WORKERS, queue_size: int = IMAGE_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = max(queue_size, 1)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waiting = 0
+        self.running = 0
+        self.tasks: Dict[str, TaskStats] = {}
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            logger.info(f"IMAGE EXECUTOR: Started process pool with {self.workers} workers (queue {self.queue_size})")
+        return self._pool
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.queue_size)
+            self._loop = loop
+        return self._slots
+
+    async def run(self, task_name: str, fn: Callable, *args) -> Any:
+        """Run `fn(*args)` in the pool. `fn` must be a picklable module-level function."""
+        slots = self._get_slots()
+        stats = self.tasks.setdefault(task_name, TaskStats())
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_pool(), fn, *args)
+            stats.completed += 1
+            return result
+        except Exception:
+            stats.failed += 1
+            raise
+        finally:
+            stats.latencies.append(time.perf_counter() - started)
+            self.running -= 1
+            slots.release()
+
+    def get_stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "tasks": {name: stats.snapshot() for name, stats in self.tasks.items()},
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info("IMAGE EXECUTOR: Process pool shut down")
+
+
+image_executor = ImageExecutor()
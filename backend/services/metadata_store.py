@@ -0,0 +1,186 @@
+"""
+Metadata of in-flight prompts (what auto-save needs to write gallery rows).
+
+Registered when a prompt is sent to ComfyUI and released once the prompt has
+finished and all of its outputs are saved. Entries that never complete (lost
+events, prompts deleted in ComfyUI) expire after COMFY_METADATA_TTL seconds;
+beyond COMFY_METADATA_MAX_ENTRIES the oldest are evicted.
+
+Once the owning manager connects, the store is restored from the
+`prompt_metadata` table and every change is written behind to it in batches,
+so prompts still running in ComfyUI are saved after a backend restart.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, select
+
+from database import AsyncSessionLocal, PromptMetadata
+
+METADATA_TTL = float(os.environ.get("COMFY_METADATA_TTL", str(24 * 3600)))
+METADATA_MAX_ENTRIES = int(os.environ.get("COMFY_METADATA_MAX_ENTRIES", "5000"))
+METADATA_FLUSH_DELAY = 0.2  # seconds to batch writes before a flush
+METADATA_RETRY_MAX_DELAY = 30.0  # cap of the backoff between failed flushes
+
+
+class PromptMetadataStore:
+    def __init__(self, scope: str, ttl: float = METADATA_TTL, max_entries: int = METADATA_MAX_ENTRIES):
+        self.scope = scope  # ComfyUI URL the prompts were sent to
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()  # prompt_id -> (metadata, registered_at)
+        self.persistent = False
+        self._dirty: Dict[str, Optional[Tuple[Dict, float]]] = {}  # prompt_id -> entry to write, None to delete
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0  # consecutive failed flushes, for the retry backoff
+        self.stats = {
+            "registered": 0, "completed": 0, "expired": 0, "evicted": 0,
+            "restored": 0, "persisted": 0, "persist_errors": 0,
+        }
+
+    def __contains__(self, prompt_id) -> bool:
+        return self.get(prompt_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, prompt_id: Optional[str]) -> Optional[Dict]:
+        entry = self.entries.get(prompt_id)
+        if entry is None:
+            return None
+        if time.time() - entry[1] > self.ttl:
+            self._remove(prompt_id, "expired")
+            return None
+        return entry[0]
+
+    def put(self, prompt_id: str, metadata: Dict):
+        entry = (metadata, time.time())
+        self.entries[prompt_id] = entry
+        self.entries.move_to_end(prompt_id)
+        self.stats["registered"] += 1
+        self._mark(prompt_id, entry)
+        self.prune()
+
+    def complete(self, prompt_id: str):
+        """The prompt finished and its outputs are saved: the metadata is no longer needed."""
+        if prompt_id in self.entries:
+            self._remove(prompt_id, "completed")
+
+    def pending_ids(self) -> List[str]:
+        return list(self.entries)
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        while self.entries:
+            prompt_id, (_, registered_at) = next(iter(self.entries.items()))
+            if registered_at >= cutoff:
+                break
+            self._remove(prompt_id, "expired")
+        while len(self.entries) > self.max_entries:
+            prompt_id = next(iter(self.entries))
+            logger.warning(f"METADATA: Store full, evicting metadata of prompt {prompt_id}")
+            self._remove(prompt_id, "evicted")
+
+    def _remove(self, prompt_id: str, reason: str):
+        del self.entries[prompt_id]
+        self.stats[reason] += 1
+        self._mark(prompt_id, None)
+
+    # --- Persistence ---
+
+    def _mark(self, prompt_id: str, entry: Optional[Tuple[Dict, float]]):
+        if not self.persistent:
+            return
+        self._dirty[prompt_id] = entry
+        self._wakeup.set()
+
+    async def open(self):
+        """Restore entries persisted for this scope, then write every change behind to the table."""
+        if self.persistent:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(PromptMetadata).where(PromptMetadata.comfy_url == self.scope).order_by(PromptMetadata.created_at)
+                )).scalars().all()
+        except Exception as e:
+            logger.warning(f"METADATA: Persistence unavailable for {self.scope}: {e}")
+            return
+        unsaved = dict(self.entries)  # registered before the table was read
+        for row in rows:
+            if row.prompt_id not in self.entries:
+                self.entries[row.prompt_id] = (row.data or {}, row.created_at.timestamp())
+                self.stats["restored"] += 1
+        if rows:
+            self.entries = OrderedDict(sorted(self.entries.items(), key=lambda item: item[1][1]))
+            logger.info(f"METADATA: Restored {len(rows)} in-flight prompts for {self.scope}")
+
+        self.persistent = True
+        self._wakeup = asyncio.Event()
+        self._dirty.update(unsaved)
+        self.prune()  # also deletes the rows that went stale while the backend was down
+        if self._dirty:
+            self._wakeup.set()
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            delay = METADATA_FLUSH_DELAY * 2 ** self._failures if self._failures else METADATA_FLUSH_DELAY
+            await asyncio.sleep(min(delay, METADATA_RETRY_MAX_DELAY))
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        removed = [prompt_id for prompt_id, entry in batch.items() if entry is None]
+        try:
+            async with AsyncSessionLocal() as db:
+                if removed:
+                    await db.execute(delete(PromptMetadata).where(PromptMetadata.prompt_id.in_(removed)))
+                for prompt_id, entry in batch.items():
+                    if entry is not None:
+                        await db.merge(PromptMetadata(
+                            prompt_id=prompt_id,
+                            comfy_url=self.scope,
+                            data=entry[0],
+                            created_at=datetime.fromtimestamp(entry[1]),
+                        ))
+                await db.commit()
+            self.stats["persisted"] += len(batch)
+            self._failures = 0
+        except Exception as e:
+            self.stats["persist_errors"] += 1
+            self._failures += 1
+            logger.error(f"METADATA: Failed to persist {len(batch)} changes: {e}")
+            # Keep newer changes made meanwhile; the flush loop retries with backoff
+            self._dirty = {**batch, **self._dirty}
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.persistent:
+            await self.flush()
+
+    def get_stats(self) -> Dict:
+        oldest = next(iter(self.entries.values()), None)
+        return {
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "oldest_age": round(time.time() - oldest[1], 1) if oldest else None,
+            "persistent": self.persistent,
+            "unflushed": len(self._dirty),
+            **self.stats,
+        }
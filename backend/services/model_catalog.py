@@ -0,0 +1,225 @@
+"""
+Per-backend catalog of installed models, LoRAs and samplers.
+
+Built from ComfyUI's `/models/{folder}` listings and `/object_info/KSampler`
+and cached per ComfyUI URL with stale-while-revalidate semantics:
+
+- younger than CATALOG_TTL: served from memory
+- older (up to CATALOG_STALE_TTL): served from memory while one background
+  refresh runs
+- missing or expired: fetched inline (concurrent callers share one fetch)
+
+A failed refresh keeps serving the last good catalog; a backend with no
+catalog at all is not retried for CATALOG_ERROR_TTL so an offline ComfyUI
+does not add a fetch timeout to every request.
+
+`validate()` lets routes reject unknown models / LoRAs / samplers before a
+prompt takes a queue slot. A name missing from a catalog older than
+CATALOG_MIN_REFRESH forces one refresh first, so freshly installed files are
+accepted without waiting for the TTL.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+CATALOG_TTL = float(os.environ.get("COMFY_CATALOG_TTL", "60"))
+CATALOG_STALE_TTL = float(os.environ.get("COMFY_CATALOG_STALE_TTL", "3600"))
+CATALOG_ERROR_TTL = float(os.environ.get("COMFY_CATALOG_ERROR_TTL", "10"))
+CATALOG_MIN_REFRESH = 5.0
+FETCH_TIMEOUT = 10.0
+
+# Catalog key -> ComfyUI model folders merged into it
+MODEL_FOLDERS = {
+    "models": ("checkpoints", "diffusion_models"),
+    "loras": ("loras",),
+}
+
+
+class CatalogValidationError(ValueError):
+    pass
+
+
+class CatalogEntry:
+    def __init__(self, data: Dict[str, List[str]]):
+        self.data = data
+        self.fetched_at = time.monotonic()
+        # Per-list ETags so /models and /loras revalidate independently
+        self.etags = {
+            key: '"' + hashlib.sha1(json.dumps(values).encode()).hexdigest()[:20] + '"'
+            for key, values in data.items()
+        }
+        self.sets = {key: frozenset(values) for key, values in data.items()}
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+def _combo_options(spec) -> List[str]:
+    """Options of a COMBO input in /object_info (old `[[...]]` and new `["COMBO", {"options": [...]}]` shapes)."""
+    if not spec:
+        return []
+    if isinstance(spec[0], list):
+        return [str(v) for v in spec[0]]
+    if len(spec) > 1 and isinstance(spec[1], dict):
+        return [str(v) for v in spec[1].get("options", [])]
+    return []
+
+
+class ModelCatalog:
+    def __init__(self, ttl: float = CATALOG_TTL, stale_ttl: float = CATALOG_STALE_TTL,
+                 error_ttl: float = CATALOG_ERROR_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.error_ttl = error_ttl
+        self.entries: Dict[str, CatalogEntry] = {}
+        # url -> (monotonic time, error) of the last failed fetch
+        self.errors: Dict[str, Tuple[float, str]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.rejections = 0
+
+    # --- Fetching ---
+
+    async def _fetch(self, url: str, client: httpx.AsyncClient) -> CatalogEntry:
+        folders = sorted({folder for group in MODEL_FOLDERS.values() for folder in group})
+        responses = await asyncio.gather(
+            *(client.get(f"{url}/models/{folder}", timeout=FETCH_TIMEOUT) for folder in folders),
+            client.get(f"{url}/object_info/KSampler", timeout=FETCH_TIMEOUT),
+            return_exceptions=True,
+        )
+        listings: Dict[str, List[str]] = {}
+        failures = []
+        for folder, resp in zip(folders, responses):
+            # Older ComfyUI builds lack some folders (404) - treat as empty, not as an outage
+            if isinstance(resp, httpx.Response) and resp.status_code == 404:
+                listings[folder] = []
+            elif isinstance(resp, httpx.Response) and resp.status_code == 200 and isinstance(resp.json(), list):
+                listings[folder] = [str(name) for name in resp.json()]
+            else:
+                failures.append(folder)
+        if len(failures) == len(folders):
+            error = responses[0]
+            raise error if isinstance(error, Exception) else RuntimeError(f"HTTP {error.status_code} from {url}/models")
+
+        data = {key: sorted({name for folder in group for name in listings.get(folder, [])})
+                for key, group in MODEL_FOLDERS.items()}
+        data["samplers"], data["schedulers"] = [], []
+        sampler_resp = responses[-1]
+        if isinstance(sampler_resp, httpx.Response) and sampler_resp.status_code == 200:
+            required = sampler_resp.json().get("KSampler", {}).get("input", {}).get("required", {})
+            data["samplers"] = _combo_options(required.get("sampler_name"))
+            data["schedulers"] = _combo_options(required.get("scheduler"))
+        return CatalogEntry(data)
+
+    async def _refresh(self, url: str, client: httpx.AsyncClient) -> Optional[CatalogEntry]:
+        try:
+            entry = await self._fetch(url, client)
+        except Exception as e:
+            self.refresh_errors += 1
+            self.errors[url] = (time.monotonic(), str(e) or type(e).__name__)
+            logger.warning(f"CATALOG: Refresh from {url} failed: {e!r} (serving {'stale' if url in self.entries else 'nothing'})")
+            return self.entries.get(url)
+        self.refreshes += 1
+        self.errors.pop(url, None)
+        self.entries[url] = entry
+        logger.debug(f"CATALOG: Refreshed {url}: " + ", ".join(f"{len(v)} {k}" for k, v in entry.data.items()))
+        return entry
+
+    def _start_refresh(self, url: str, client: httpx.AsyncClient) -> asyncio.Task:
+        """Single-flight refresh per URL (a task from a previous event loop is not reused)."""
+        task = self._inflight.get(url)
+        loop = asyncio.get_running_loop()
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self._refresh(url, client))
+            self._inflight[url] = task
+            task.add_done_callback(lambda t: self._inflight.pop(url, None) if self._inflight.get(url) is t else None)
+        return task
+
+    async def refresh(self, url: str, client: httpx.AsyncClient) -> Optional[CatalogEntry]:
+        return await asyncio.shield(self._start_refresh(url, client))
+
+    async def get(self, url: str, client: httpx.AsyncClient) -> Optional[CatalogEntry]:
+        """Catalog for `url`, or None if ComfyUI could not be reached and nothing is cached."""
+        entry = self.entries.get(url)
+        if entry is not None:
+            age = entry.age()
+            if age < self.ttl:
+                self.hits += 1
+                return entry
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                self._start_refresh(url, client)
+                return entry
+        failed = self.errors.get(url)
+        if failed and time.monotonic() - failed[0] < self.error_ttl:
+            return entry
+        self.misses += 1
+        return await self.refresh(url, client)
+
+    def invalidate(self, url: Optional[str] = None):
+        if url is None:
+            self.entries.clear()
+            self.errors.clear()
+        else:
+            self.entries.pop(url, None)
+            self.errors.pop(url, None)
+
+    # --- Validation ---
+
+    async def validate(self, url: str, client: httpx.AsyncClient, model: Optional[str] = None,
+                       lora_names: Iterable[str] = (), sampler_name: Optional[str] = None):
+        """Raise CatalogValidationError for names ComfyUI does not have. No-op without a catalog."""
+        entry = await self.get(url, client)
+        if entry is None:
+            return
+        problems = self._unknown(entry, model, lora_names, sampler_name)
+        if problems and entry.age() >= CATALOG_MIN_REFRESH:
+            entry = await self.refresh(url, client) or entry
+            problems = self._unknown(entry, model, lora_names, sampler_name)
+        if problems:
+            self.rejections += 1
+            raise CatalogValidationError("; ".join(problems))
+
+    @staticmethod
+    def _unknown(entry: CatalogEntry, model, lora_names, sampler_name) -> List[str]:
+        problems = []
+        # An empty list means the folder could not be listed, not that nothing is installed
+        if model and entry.sets["models"] and model not in entry.sets["models"]:
+            problems.append(f"Unknown model '{model}'")
+        missing = [name for name in lora_names if entry.sets["loras"] and name not in entry.sets["loras"]]
+        if missing:
+            problems.append("Unknown LoRA(s): " + ", ".join(f"'{name}'" for name in missing))
+        if sampler_name and entry.sets["samplers"] and sampler_name not in entry.sets["samplers"]:
+            problems.append(f"Unknown sampler '{sampler_name}'")
+        return problems
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "backends": {
+                url: {"age": round(entry.age(), 1), **{k: len(v) for k, v in entry.data.items()}}
+                for url, entry in self.entries.items()
+            },
+            "errors": {url: {"age": round(now - at, 1), "error": err} for url, (at, err) in self.errors.items()},
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "rejections": self.rejections,
+        }
+
+
+model_catalog = ModelCatalog()
@@ -0,0 +1,122 @@
+"""
+Bounded bcrypt worker pool for /api/auth/login and /api/auth/register.
+
+bcrypt releases the GIL, so a small dedicated thread pool hashes in parallel
+without borrowing the request threadpool or blocking the event loop. At most
+`max_pending` hash/verify calls may be queued or running; further callers
+wait (backpressure). The cost factor comes from COMFY_BCRYPT_ROUNDS; hashes
+made with another cost are reported by `needs_rehash` so login can upgrade
+(or downgrade) them transparently.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import bcrypt
+from loguru import logger
+
+BCRYPT_ROUNDS = int(os.environ.get("COMFY_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("COMFY_HASH_WORKERS", "2"))
+HASH_MAX_PENDING = int(os.environ.get("COMFY_HASH_MAX_PENDING", str(max(HASH_WORKERS, 1) * 8)))
+
+
+def hash_password_sync(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def verify_password_sync(plain: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        # Malformed stored hash: treat as a failed login instead of a 500
+        return False
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a `$2b$12$...` hash, None if unparseable."""
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.rounds = rounds
+        self.workers = max(workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waiting = 0
+        self.running = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.total_seconds = 0.0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            logger.info(f"AUTH: Started bcrypt pool with {self.workers} workers (cost {self.rounds})")
+        return self._pool
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._loop = loop
+        return self._slots
+
+    async def _run(self, fn, *args):
+        slots = self._get_slots()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self.total_seconds += time.perf_counter() - started
+            self.running -= 1
+            slots.release()
+
+    async def hash(self, password: str) -> str:
+        result = await self._run(hash_password_sync, password, self.rounds)
+        self.hashed += 1
+        return result
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        result = await self._run(verify_password_sync, plain, hashed)
+        self.verified += 1
+        return result
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_rounds(hashed) != self.rounds
+
+    def get_stats(self) -> Dict:
+        calls = self.hashed + self.verified
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "avg_ms": round(self.total_seconds / calls * 1000, 2) if calls else 0.0,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,138 @@
+"""
+Relay of ComfyUI's binary latent previews to the prompt owner's browser sessions.
+
+ComfyUI sends previews as binary WS frames: a 4-byte big-endian event type,
+then
+- PREVIEW_IMAGE (1): 4-byte image type (1 = JPEG, 2 = PNG), image bytes
+- PREVIEW_IMAGE_WITH_METADATA (4): 4-byte metadata length, JSON metadata
+  (prompt_id, node_id, image_type, ...), image bytes
+
+Frames are relayed to browsers as PREVIEW_IMAGE_WITH_METADATA, so the
+client always learns which prompt a preview belongs to. Per prompt at most one
+frame per COMFY_PREVIEW_MIN_INTERVAL seconds is relayed; with
+COMFY_PREVIEW_MAX_SIZE set, previews larger than that are downscaled and
+re-encoded as JPEG in the image executor (one in flight per prompt, frames
+arriving meanwhile are skipped).
+"""
+import io
+import json
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from PIL import Image
+
+from services.image_executor import image_executor
+from services.thumbnail_cache import render_thumbnail
+
+PREVIEW_MIN_INTERVAL = float(os.environ.get("COMFY_PREVIEW_MIN_INTERVAL", "0.25"))
+PREVIEW_MAX_SIZE = int(os.environ.get("COMFY_PREVIEW_MAX_SIZE", "0"))  # px; 0 relays frames as they come
+MAX_TRACKED_PREVIEW_PROMPTS = 1000
+
+PREVIEW_IMAGE = 1
+PREVIEW_IMAGE_WITH_METADATA = 4
+IMAGE_TYPES = {1: "image/jpeg", 2: "image/png"}
+
+
+class PreviewFrame:
+    def __init__(self, image: bytes, mime: str, metadata: Optional[Dict] = None):
+        self.image = image
+        self.mime = mime
+        self.metadata = metadata or {}
+
+    @property
+    def prompt_id(self) -> Optional[str]:
+        return self.metadata.get("prompt_id")
+
+
+def decode_frame(data: bytes) -> Optional[PreviewFrame]:
+    """Parse a ComfyUI binary frame; None for non-preview or malformed frames."""
+    if len(data) < 8:
+        return None
+    (event,) = struct.unpack(">I", data[:4])
+    if event == PREVIEW_IMAGE:
+        (image_type,) = struct.unpack(">I", data[4:8])
+        mime = IMAGE_TYPES.get(image_type)
+        return PreviewFrame(data[8:], mime) if mime and len(data) > 8 else None
+    if event == PREVIEW_IMAGE_WITH_METADATA:
+        (length,) = struct.unpack(">I", data[4:8])
+        try:
+            metadata = json.loads(data[8:8 + length])
+        except ValueError:
+            return None
+        image = data[8 + length:]
+        if not isinstance(metadata, dict) or not image:
+            return None
+        return PreviewFrame(image, metadata.get("image_type", "image/jpeg"), metadata)
+    return None
+
+
+def encode_frame(frame: PreviewFrame, prompt_id: Optional[str]) -> bytes:
+    metadata = json.dumps({**frame.metadata, "prompt_id": prompt_id, "image_type": frame.mime}).encode()
+    return struct.pack(">II", PREVIEW_IMAGE_WITH_METADATA, len(metadata)) + metadata + frame.image
+
+
+class PreviewRelay:
+    def __init__(self, min_interval: float = PREVIEW_MIN_INTERVAL, max_size: int = PREVIEW_MAX_SIZE):
+        self.min_interval = min_interval
+        self.max_size = max_size
+        self.last_sent: "OrderedDict[str, float]" = OrderedDict()
+        self.encoding = set()
+        self.stats = {"frames": 0, "relayed": 0, "throttled": 0, "reencoded": 0, "undecodable": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def admit(self, prompt_id: Optional[str]) -> bool:
+        """Per-prompt rate limit; also skips frames while the previous one is still being re-encoded."""
+        now = time.monotonic()
+        last = self.last_sent.get(prompt_id)
+        if prompt_id in self.encoding or (last is not None and now - last < self.min_interval):
+            self.stats["throttled"] += 1
+            return False
+        self.last_sent[prompt_id] = now
+        self.last_sent.move_to_end(prompt_id)
+        while len(self.last_sent) > MAX_TRACKED_PREVIEW_PROMPTS:
+            self.last_sent.popitem(last=False)
+        return True
+
+    def accept(self, data: bytes, current_prompt_id: Optional[str]):
+        """(prompt_id, frame) for a frame worth relaying, else None. Cheap: runs in the WS listener."""
+        self.stats["frames"] += 1
+        self.stats["bytes_in"] += len(data)
+        frame = decode_frame(data)
+        if frame is None:
+            self.stats["undecodable"] += 1
+            return None
+        prompt_id = frame.prompt_id or current_prompt_id
+        if not self.admit(prompt_id):
+            return None
+        return prompt_id, frame
+
+    def fits(self, frame: PreviewFrame) -> bool:
+        """Whether the frame is within max_size already (reads only the image header)."""
+        try:
+            with Image.open(io.BytesIO(frame.image)) as image:
+                return max(image.size) <= self.max_size
+        except Exception:
+            return False
+
+    async def render(self, prompt_id: Optional[str], frame: PreviewFrame) -> bytes:
+        """Downscale (if configured and the frame is larger) and encode the outgoing frame."""
+        if self.max_size and not self.fits(frame):
+            self.encoding.add(prompt_id)
+            try:
+                frame.image = await image_executor.run("preview", render_thumbnail, frame.image, self.max_size, "jpeg")
+                frame.mime = "image/jpeg"
+                self.stats["reencoded"] += 1
+            finally:
+                self.encoding.discard(prompt_id)
+        out = encode_frame(frame, prompt_id)
+        self.stats["relayed"] += 1
+        self.stats["bytes_out"] += len(out)
+        return out
+
+    def forget(self, prompt_id: Optional[str]):
+        self.last_sent.pop(prompt_id, None)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "min_interval": self.min_interval, "max_size": self.max_size}
@@ -0,0 +1,108 @@
+"""
+Authenticated-principal cache for auth.get_current_user.
+
+Maps a credential (Tailscale login or a SHA-256 fingerprint of the bearer
+token - never the raw token) to the resolved, session-detached User so
+steady-state auth is a dictionary lookup instead of a JWT decode plus a
+User query. Bounded (LRU) and time-limited; a JWT entry never outlives the
+token's own `exp`. Profile writes invalidate every entry of that user.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from loguru import logger
+
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("COMFY_AUTH_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL = float(os.environ.get("COMFY_AUTH_CACHE_TTL", "60"))
+
+
+def tailscale_key(login: str) -> str:
+    return f"tailscale:{login}"
+
+
+def token_key(token: str) -> str:
+    return f"jwt:{hashlib.sha256(token.encode('utf-8')).hexdigest()}"
+
+
+class PrincipalCache:
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (user, expires_at); ordered oldest -> most recently used
+        self.entries: "OrderedDict[str, Tuple[object, float]]" = OrderedDict()
+        self.keys_by_user: Dict[int, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()  # update_me invalidates from the threadpool
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._forget(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def put(self, key: str, user, expires_at: Optional[float] = None):
+        """Cache a principal; `expires_at` (monotonic) caps the TTL, e.g. at the token's exp."""
+        deadline = time.monotonic() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            if key in self.entries:
+                self._forget(key)
+            self.entries[key] = (user, deadline)
+            self.keys_by_user.setdefault(user.id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                oldest = next(iter(self.entries))
+                self._forget(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self.keys_by_user.get(user_id, ())):
+                self._forget(key)
+            self.invalidations += 1
+        logger.debug(f"AUTH CACHE: Invalidated principals of user {user_id}")
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+
+    def _forget(self, key: str):
+        user, _ = self.entries.pop(key)
+        keys = self.keys_by_user.get(user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_user[user.id]
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,306 @@
+"""
+In-memory per-prompt state machine driven by ComfyUI WebSocket events.
+
+Status endpoints answer from here instead of polling ComfyUI /queue + /history
+and the gallery table on every tick. Batches group several prompts queued by
+one /generate/batch call and report their aggregate progress.
+
+    pending -> processing -> saving -> completed
+                         \-> failed | interrupted
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+TERMINAL_STATUSES = {"completed", "failed", "interrupted"}
+
+MAX_TRACKED_PROMPTS = 5000
+MAX_TRACKED_BATCHES = 500
+TERMINAL_TTL = 3600  # seconds a finished prompt stays answerable
+
+
+class PromptState:
+    """Live status of a single prompt."""
+
+    def __init__(self, prompt_id: str, user_id: Optional[int] = None):
+        self.prompt_id = prompt_id
+        self.user_id = user_id
+        self.status = "pending"
+        self.node: Optional[str] = None
+        self.progress_value = 0
+        self.progress_max = 0
+        self.images: List[Dict[str, str]] = []
+        self.error: Optional[str] = None
+        self.pending_saves = 0
+        self.finished = False
+        self.version = 0
+        self.updated_at = time.time()
+        self._changed: Optional[asyncio.Event] = None
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def touch(self):
+        """Bump version and wake every waiter."""
+        self.version += 1
+        self.updated_at = time.time()
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def wait_changed(self, timeout: float):
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def snapshot(self) -> Dict:
+        """Shape compatible with ImageStatusResponse."""
+        filenames = [img["filename"] for img in self.images]
+        image_urls = []
+        for img in self.images:
+            url_img = f"/api/comfy/image?filename={img['filename']}&type=output&prompt_id={self.prompt_id}"
+            if img.get("subfolder"):
+                url_img += f"&subfolder={img['subfolder']}"
+            image_urls.append(url_img)
+        first = self.images[0] if self.images else {}
+        return {
+            "prompt_id": self.prompt_id,
+            "status": self.status,
+            "ready": self.status == "completed",
+            "filename": first.get("filename"),
+            "filenames": filenames,
+            "subfolder": first.get("subfolder", ""),
+            "image_url": image_urls[0] if image_urls else None,
+            "image_urls": image_urls,
+            "node": self.node,
+            "progress_value": self.progress_value,
+            "progress_max": self.progress_max,
+            "error": self.error,
+            "version": self.version,
+        }
+
+
+class BatchState:
+    """Prompts queued together by one batch request; items without a prompt_id failed to queue."""
+
+    def __init__(self, batch_id: str, items: List[Dict], user_id: Optional[int] = None):
+        self.batch_id = batch_id
+        self.user_id = user_id
+        self.items = items  # [{"index", "prompt_id", "error"}]
+        self.created_at = time.time()
+
+    @property
+    def prompt_ids(self) -> List[str]:
+        return [item["prompt_id"] for item in self.items if item.get("prompt_id")]
+
+
+class PromptTracker:
+    """Registry of PromptState objects, updated from `_listen` events."""
+
+    def __init__(self):
+        self.prompts: "OrderedDict[str, PromptState]" = OrderedDict()
+        self.batches: "OrderedDict[str, BatchState]" = OrderedDict()
+
+    def register(self, prompt_id: str, user_id: Optional[int] = None) -> PromptState:
+        state = self.prompts.get(prompt_id)
+        if state is None:
+            state = PromptState(prompt_id, user_id)
+            self.prompts[prompt_id] = state
+            self._prune()
+        return state
+
+    def get(self, prompt_id: str) -> Optional[PromptState]:
+        return self.prompts.get(prompt_id)
+
+    def alias(self, prompt_id: str, real_id: str):
+        """ComfyUI queued `prompt_id` under `real_id`: both ids resolve to one state from now on.
+
+        The state the client already holds (and may be long-polling) stays canonical;
+        anything recorded under `real_id` meanwhile is carried over.
+        """
+        state = self.prompts.get(prompt_id)
+        if state is None or prompt_id == real_id:
+            return
+        other = self.prompts.get(real_id)
+        if other is not None and other is not state and other.version:
+            for field in ("status", "node", "progress_value", "progress_max", "images", "error", "finished"):
+                setattr(state, field, getattr(other, field))
+        if other is not None and other is not state:
+            state.pending_saves += other.pending_saves
+            state.user_id = state.user_id if state.user_id is not None else other.user_id
+        state.prompt_id = real_id  # image URLs must carry the id the node knows
+        self.prompts[real_id] = state
+        for batch in self.batches.values():
+            for item in batch.items:
+                if item.get("prompt_id") == prompt_id:
+                    item["prompt_id"] = real_id
+        state.touch()
+
+    def handle_event(self, event_type: str, payload: Dict):
+        """Apply a ComfyUI WS event to the matching prompt, if tracked."""
+        if not isinstance(payload, dict):
+            return
+        state = self.prompts.get(payload.get("prompt_id"))
+        if state is None or state.is_terminal:
+            return
+
+        if event_type == "execution_start":
+            state.status = "processing"
+        elif event_type == "executing":
+            node = payload.get("node")
+            if node:
+                state.status = "processing"
+                state.node = node
+            else:
+                self._finish(state)
+        elif event_type == "execution_success":
+            self._finish(state)
+        elif event_type == "progress":
+            state.status = "processing"
+            state.progress_value = payload.get("value", 0)
+            state.progress_max = payload.get("max", 0)
+        elif event_type == "executed":
+            output = payload.get("output") or {}
+            for img in output.get("images", []) or []:
+                if img.get("filename") and img.get("type", "output") == "output":
+                    state.images.append({"filename": img["filename"], "subfolder": img.get("subfolder", "")})
+        elif event_type == "execution_error":
+            state.status = "failed"
+            state.error = payload.get("exception_message") or "Execution error"
+        elif event_type == "execution_interrupted":
+            state.status = "interrupted"
+        else:
+            return
+        state.touch()
+
+    def save_started(self, prompt_id: str):
+        state = self.prompts.get(prompt_id)
+        if state:
+            state.pending_saves += 1
+
+    def save_finished(self, prompt_id: str):
+        state = self.prompts.get(prompt_id)
+        if not state:
+            return
+        state.pending_saves = max(state.pending_saves - 1, 0)
+        if state.finished and state.pending_saves == 0 and not state.is_terminal:
+            state.status = "completed"
+            state.touch()
+
+    def _finish(self, state: PromptState):
+        state.finished = True
+        state.node = None
+        state.status = "saving" if state.pending_saves else "completed"
+        if state.status == "completed":
+            logger.debug(f"TRACKER: Prompt {state.prompt_id} completed with {len(state.images)} images")
+
+    async def wait_for_update(self, prompt_id: str, since: int, timeout: float) -> Optional[Dict]:
+        """Long-poll: return a snapshot once version > since, or the current one on timeout."""
+        state = self.prompts.get(prompt_id)
+        if state is None:
+            return None
+        deadline = time.monotonic() + timeout
+        while state.version <= since and not state.is_terminal:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await state.wait_changed(remaining)
+        return state.snapshot()
+
+    def register_batch(self, batch_id: str, items: List[Dict], user_id: Optional[int] = None) -> BatchState:
+        batch = BatchState(batch_id, items, user_id)
+        self.batches[batch_id] = batch
+        while len(self.batches) > MAX_TRACKED_BATCHES:
+            self.batches.popitem(last=False)
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[BatchState]:
+        return self.batches.get(batch_id)
+
+    def batch_snapshot(self, batch_id: str) -> Optional[Dict]:
+        """Aggregate status of a batch; `version` grows whenever any item changes."""
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        items = []
+        counts = {"pending": 0, "processing": 0, "completed": 0, "failed": 0}
+        progress = 0.0
+        version = 0
+        for item in batch.items:
+            state = self.prompts.get(item["prompt_id"]) if item.get("prompt_id") else None
+            if state is None:
+                # Failed to queue, or evicted from the tracker: either way it will not progress
+                status = "failed"
+                error = item.get("error") or "No longer tracked"
+                entry = {"index": item["index"], "prompt_id": item.get("prompt_id"), "status": status, "error": error}
+            else:
+                entry = {"index": item["index"], **state.snapshot()}
+                status = state.status
+                version += state.version
+                if status == "completed":
+                    progress += 1.0
+                elif state.progress_max:
+                    progress += min(state.progress_value / state.progress_max, 1.0)
+            items.append(entry)
+            if status == "completed":
+                counts["completed"] += 1
+            elif status in ("failed", "interrupted"):
+                counts["failed"] += 1
+            elif status in ("processing", "saving"):
+                counts["processing"] += 1
+            elif status == "pending":
+                counts["pending"] += 1
+
+        total = len(batch.items)
+        finished = counts["completed"] + counts["failed"]
+        if finished < total:
+            status = "processing" if counts["processing"] or finished else "pending"
+        elif counts["failed"] == 0:
+            status = "completed"
+        else:
+            status = "failed" if counts["completed"] == 0 else "partial"
+        return {
+            "batch_id": batch_id,
+            "status": status,
+            "total": total,
+            **counts,
+            "progress": round(progress / total, 4) if total else 1.0,
+            "version": version,
+            "items": items,
+        }
+
+    async def wait_for_batch_update(self, batch_id: str, since: int, timeout: float) -> Optional[Dict]:
+        """Long-poll a batch: return once any item's version moved past `since`, or on timeout."""
+        snapshot = self.batch_snapshot(batch_id)
+        deadline = time.monotonic() + timeout
+        while snapshot and snapshot["version"] <= since and snapshot["status"] in ("pending", "processing"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            states = [s for s in (self.prompts.get(pid) for pid in self.batches[batch_id].prompt_ids)
+                      if s is not None and not s.is_terminal]
+            if not states:
+                break
+            waiters = [asyncio.ensure_future(s.wait_changed(remaining)) for s in states]
+            done, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+            snapshot = self.batch_snapshot(batch_id)
+        return snapshot
+
+    def _prune(self):
+        now = time.time()
+        for pid in [pid for pid, s in self.prompts.items() if s.is_terminal and now - s.updated_at > TERMINAL_TTL]:
+            del self.prompts[pid]
+        while len(self.prompts) > MAX_TRACKED_PROMPTS:
+            self.prompts.popitem(last=False)
+
+
+prompt_tracker = PromptTracker()
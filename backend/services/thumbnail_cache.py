@@ -0,0 +1,208 @@
+"""
+Disk-backed thumbnail cache for /api/comfy/thumbnail.
+
+Thumbnails are keyed by (source, size, format), written once (eagerly at
+auto-save time for THUMBNAIL_SIZES) and served from disk with a strong ETag.
+A source names the original image: blob_source() for a saved gallery image,
+view_source() for a ComfyUI output, which includes the node's origin since
+every node writes the same file names.
+Total size is bounded; least recently used files are evicted.
+
+Methods touch the disk: async callers run them via asyncio.to_thread.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+THUMBNAIL_ROOT = os.environ.get("COMFY_THUMBNAIL_DIR", os.path.join(PROJECT_ROOT, "thumbnails"))
+THUMBNAIL_MAX_BYTES = int(os.environ.get("COMFY_THUMBNAIL_MAX_MB", "512")) * 1024 * 1024
+# Sizes the frontend requests (gallery grid 300, lightbox strip 100)
+THUMBNAIL_SIZES = [int(s) for s in os.environ.get("COMFY_THUMBNAIL_SIZES", "100,300").split(",") if s.strip()]
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85}),
+    "png": ("PNG", "image/png", {}),
+}
+
+
+def render_thumbnail(image_bytes: bytes, max_size: int, fmt: str = "webp") -> bytes:
+    """Decode, downscale (LANCZOS) and re-encode an image."""
+    from PIL import Image
+
+    pil_format, _, options = FORMATS[fmt]
+    img = Image.open(io.BytesIO(image_bytes))
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.thumbnail((max_size, max_size), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format=pil_format, **options)
+    return buf.getvalue()
+
+
+def process_saved_image(image_bytes: bytes, sizes: Iterable[int], fmt: str = "webp") -> Tuple[int, int, Dict[int, bytes]]:
+    """Decode once; return (width, height, {size: thumbnail bytes}). Runs in the image executor."""
+    from PIL import Image
+
+    pil_format, _, options = FORMATS[fmt]
+    img = Image.open(io.BytesIO(image_bytes))
+    img.load()
+    width, height = img.size
+    thumbnails = {}
+    for size in sorted(sizes, reverse=True):
+        # Downscale from the previous (larger) thumbnail instead of the full image
+        img.thumbnail((size, size), Image.LANCZOS)
+        out = img.convert("RGB") if pil_format == "JPEG" and img.mode not in ("RGB", "L") else img
+        buf = io.BytesIO()
+        out.save(buf, format=pil_format, **options)
+        thumbnails[size] = buf.getvalue()
+    return width, height, thumbnails
+
+
+def view_source(origin: str, filename: str, subfolder: str = "") -> str:
+    """Source of a ComfyUI output file, as served by /view on the node at `origin`."""
+    return f"view\0{origin}\0{filename}\0{subfolder}"
+
+
+def blob_source(digest: str) -> str:
+    """Source of a gallery image in the blob store (content-addressed)."""
+    return f"blob\0{digest}"
+
+
+class ThumbnailCache:
+    def __init__(self, root: str = THUMBNAIL_ROOT, max_bytes: int = THUMBNAIL_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        # file name -> (size_bytes, etag); ordered oldest -> most recently used
+        self.index: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loaded = False
+        self._lock = threading.RLock()  # callers run in worker threads
+
+    @staticmethod
+    def make_key(source: str, size: int, fmt: str) -> str:
+        return hashlib.sha256(f"{source}\0{size}\0{fmt}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{fmt}")
+
+    @staticmethod
+    def _etag(name: str, st: os.stat_result) -> str:
+        # Files are only ever replaced whole (a new inode), so name + size + inode identify the content;
+        # not mtime, which hits bump to keep the LRU order across restarts
+        return f'"{name[:16]}-{st.st_size:x}-{st.st_ino:x}"'
+
+    def _load_index(self):
+        """Rebuild the LRU index from disk (mtime order) on first use."""
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = []
+        if os.path.isdir(self.root):
+            for shard in os.listdir(self.root):
+                shard_path = os.path.join(self.root, shard)
+                if not os.path.isdir(shard_path):
+                    continue
+                for name in os.listdir(shard_path):
+                    if name.startswith(".tmp-"):
+                        continue
+                    st = os.stat(os.path.join(shard_path, name))
+                    entries.append((st.st_mtime, name, st))
+        for _, name, st in sorted(entries, key=lambda entry: entry[:2]):
+            self.index[name] = (st.st_size, self._etag(name, st))
+            self.total_bytes += st.st_size
+        if entries:
+            logger.info(f"THUMBNAILS: Indexed {len(entries)} cached thumbnails ({self.total_bytes // 1024} KiB)")
+
+    def get(self, source: str, size: int, fmt: str = "webp") -> Optional[Tuple[str, str]]:
+        """Return (path, etag) on a hit, None on a miss."""
+        with self._lock:
+            self._load_index()
+            key = self.make_key(source, size, fmt)
+            name = f"{key}.{fmt}"
+            entry = self.index.get(name)
+            path = self._path(key, fmt)
+            if entry is None or not os.path.isfile(path):
+                if entry is not None:
+                    self._forget(name)
+                self.misses += 1
+                return None
+            self.index.move_to_end(name)
+            self.hits += 1
+        try:
+            os.utime(path)  # persist recency across restarts
+        except OSError:
+            pass
+        return path, entry[1]
+
+    def put(self, source: str, size: int, fmt: str, data: bytes) -> Tuple[str, str]:
+        """Atomically store a rendered thumbnail, evicting LRU entries over budget."""
+        key = self.make_key(source, size, fmt)
+        name = f"{key}.{fmt}"
+        path = self._path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            etag = self._etag(name, os.stat(path))
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self._load_index()
+            if name in self.index:
+                self._forget(name)
+            self.index[name] = (len(data), etag)
+            self.total_bytes += len(data)
+            self._evict()
+        return path, etag
+
+    def put_many(self, source: str, thumbnails: Dict[int, bytes], fmt: str = "webp"):
+        """Store thumbnails already rendered by process_saved_image."""
+        for size, data in thumbnails.items():
+            self.put(source, size, fmt, data)
+
+    def _forget(self, name: str):
+        size, _ = self.index.pop(name)
+        self.total_bytes -= size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.index) > 1:
+            name, (size, _) = self.index.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(os.path.join(self.root, name[:2], name))
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.index),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+thumbnail_cache = ThumbnailCache()
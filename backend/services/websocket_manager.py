@@ -1,30 +1,47 @@
 import asyncio
 import json
 import base64
-from urllib.parse import urlparse
+import os
 from loguru import logger
 import websockets
-import httpx
-from typing import Dict, Set, Optional, Any, Callable
-from database import SessionLocal, GalleryImage
+import time
+from typing import Dict, List, Set, Optional, Any, Callable
+from sqlalchemy import select
+from database import AsyncSessionLocal, GalleryImage
+from services.http_client_pool import get_comfy_client
+from services.prompt_tracker import prompt_tracker
+from services.blob_store import blob_store
+from services.thumbnail_cache import thumbnail_cache, process_saved_image, blob_source, THUMBNAIL_SIZES
+from services.image_executor import image_executor
+from services.comfy_pool import comfy_pool
+from services.preview_relay import PreviewRelay
+from services.metadata_store import PromptMetadataStore
 
-TAILSCALE_HTTP_PROXY = "http://localhost:1056"
+AUTO_SAVE_WORKERS = 2 # prompts saved in parallel
+AUTO_SAVE_FETCH_CONCURRENCY = 4 # concurrent /view downloads per prompt
+BROADCAST_SEND_TIMEOUT = float(os.environ.get("COMFY_WS_SEND_TIMEOUT", "2")) # seconds per client send
+RECONCILE_INTERVAL = float(os.environ.get("COMFY_RECONCILE_INTERVAL", "60")) # seconds between periodic passes
+RECONCILE_HISTORY_ITEMS = int(os.environ.get("COMFY_RECONCILE_HISTORY_ITEMS", "256")) # most recent /history entries per pass
+RECONCILE_MAX_LOOKUPS = 16 # older prompts looked up one by one per pass
+RECONCILE_GRACE = 10 # seconds; prompts with live events this recent are left to the WS path
+# Events about one prompt; older ComfyUI builds omit prompt_id on some, so the running prompt is assumed
+PROMPT_EVENT_TYPES = {
+    "execution_start", "execution_cached", "executing", "progress", "progress_state", "executed",
+    "execution_success", "execution_error", "execution_interrupted", "gallery_updated",
+}
 
 
-def _is_tailscale_url(url: str) -> bool:
-    """Check if URL points to a Tailscale address (100.x.x.x)."""
-    try:
-        host = urlparse(url).hostname or ""
-        return host.startswith("100.")
-    except Exception:
-        return False
+class Subscription:
+    """Who is behind a connected client callback, for routing prompt events."""
 
+    def __init__(self, user_id: Optional[int], is_admin: bool = False, watch_all: bool = False):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.watch_all = is_admin and watch_all  # admins opt in to everyone's events
+
+    def wants(self, owner: Optional[int]) -> bool:
+        return self.watch_all or (owner is not None and owner == self.user_id)
 
-def _get_http_client(url: str, timeout: float = 20.0) -> httpx.AsyncClient:
-    """Create httpx client, using Tailscale HTTP proxy for 100.x.x.x addresses."""
-    if _is_tailscale_url(url):
-        return httpx.AsyncClient(timeout=timeout, proxy=TAILSCALE_HTTP_PROXY)
-    return httpx.AsyncClient(timeout=timeout, trust_env=False)
 
 class ComfyWebSocketManager:
     def __init__(self, comfy_url: str):
@@ -33,12 +50,30 @@ class ComfyWebSocketManager:
         self.client_id = "comfy_wrapper_service"
         self.ws_connection = None
         self.connected_clients: Set[Callable[[Dict], Any]] = set()
+        # Browser sessions; clients without a subscription are internal listeners and get everything
+        self.subscriptions: Dict[Callable[[Dict], Any], Subscription] = {}
+        self.current_prompt_id: Optional[str] = None
+        self.broadcast_stats = {"events": 0, "sends": 0, "filtered": 0, "timeouts": 0, "errors": 0}
+        self.preview_relay = PreviewRelay()
+        self._preview_tasks: Set[asyncio.Task] = set()
         self.is_running = False
         self.last_message = {}
-        self.metadata_cache: Dict[str, Dict] = {} # prompt_id -> metadata
+        self.metadata_store = PromptMetadataStore(comfy_url) # prompt_id -> metadata, until saved
         self.reconnect_delay = 5 # seconds
         self.ping_interval = 30 # seconds (User requested 30s)
         self.ping_timeout = 30
+        self.save_queue: Optional[asyncio.Queue] = None
+        self.save_workers = []
+        self._save_loop = None
+        self._save_locks: Dict[str, List] = {} # prompt_id -> [lock, holders + waiters], while saves of it run
+        self._reconcile_lock = asyncio.Lock()
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self._reconcile_pass: Optional[asyncio.Task] = None
+        self._lookup_cursor = 0 # rotates individual /history lookups across passes
+        self.reconcile_stats = {
+            "runs": 0, "checked": 0, "recovered_prompts": 0, "recovered_images": 0,
+            "failed": 0, "lost": 0, "errors": 0, "last_run": None,
+        }
 
     async def connect(self):
         """Infinite loop to maintain connection to ComfyUI WS."""
@@ -48,6 +83,12 @@ class ComfyWebSocketManager:
             
         self.is_running = True
         full_url = f"{self.comfy_ws_url}?clientId={self.client_id}"
+
+        # Prompts queued before a restart are still auto-saved when they finish
+        await self.metadata_store.open()
+        for prompt_id in self.metadata_store.pending_ids():
+            prompt_tracker.register(prompt_id, self.metadata_store.get(prompt_id).get("user_id"))
+        self._reconcile_task = asyncio.get_running_loop().create_task(self._reconcile_periodically())
         
         while self.is_running:
             logger.info(f"Connecting to ComfyUI WS: {full_url}")
@@ -58,10 +99,14 @@ class ComfyWebSocketManager:
                     ping_timeout=self.ping_timeout
                 ) as ws:
                     self.ws_connection = ws
+                    comfy_pool.mark_up(self.base_url)
                     logger.success(f"Connected to ComfyUI WebSocket (Ping: {self.ping_interval}s)")
+                    # Events sent while we were disconnected (or down) are lost: catch up from /history
+                    self._reconcile_pass = asyncio.get_running_loop().create_task(self.reconcile())
                     await self._listen()
             except Exception as e:
                 logger.error(f"ComfyUI WS connection error: {e}. Retrying in {self.reconnect_delay}s...")
+                comfy_pool.mark_down(self.base_url, str(e) or type(e).__name__)
                 await asyncio.sleep(self.reconnect_delay)
             finally:
                 self.ws_connection = None
@@ -69,8 +114,15 @@ class ComfyWebSocketManager:
     def register_metadata(self, prompt_id: str, metadata: Dict):
         """Register metadata for a prompt to be saved automatically upon completion."""
         logger.info(f"METADATA: Registering metadata for PROMPT_ID: {prompt_id}")
-        self.metadata_cache[prompt_id] = metadata
-        logger.debug(f"METADATA: Current cache size: {len(self.metadata_cache)}")
+        self.metadata_store.put(prompt_id, metadata)
+        prompt_tracker.register(prompt_id, metadata.get("user_id"))
+        logger.debug(f"METADATA: Current store size: {len(self.metadata_store)}")
+
+    def release_if_done(self, prompt_id: Optional[str]):
+        """Drop a prompt's metadata once it has finished and every output has been saved."""
+        state = prompt_tracker.get(prompt_id)
+        if state is not None and (state.finished or state.is_terminal) and state.pending_saves == 0:
+            self.metadata_store.complete(prompt_id)
 
     async def _listen(self):
         """Listen for messages from ComfyUI and stream them to logs."""
@@ -90,24 +142,22 @@ class ComfyWebSocketManager:
                             logger.debug(f"WS EVENT: {event_type} | Data: {json.dumps(data)[:500]}")
                         
                         self.last_message = data
+                        prompt_tracker.handle_event(event_type, payload)
 
                         if event_type == "status":
-                            pass
+                            comfy_pool.observe_status(self.base_url, payload)
                         elif event_type == "execution_start":
                             pid = payload.get('prompt_id')
-                            logger.info(f"ComfyUI: Starting execution for prompt {pid} (In cache: {pid in self.metadata_cache})")
+                            self.current_prompt_id = pid
+                            logger.info(f"ComfyUI: Starting execution for prompt {pid} (In store: {pid in self.metadata_store})")
                         elif event_type == "executing":
                             node = payload.get("node")
                             prompt_id = payload.get("prompt_id")
                             if node:
                                 logger.debug(f"ComfyUI: Executing node {node} for prompt {prompt_id}")
-                            elif prompt_id and prompt_id in self.metadata_cache:
+                            elif prompt_id and prompt_id in self.metadata_store:
                                 logger.success(f"ComfyUI: Execution finished for prompt {prompt_id}")
-                                # Cleanup cache ONLY when the entire prompt is done
-                                # But wait! We should probably keep it until 'executed' for all nodes?
-                                # For now, let's delay cleanup or check if it's really the right time.
-                                # del self.metadata_cache[prompt_id] 
-                                pass
+                                self.release_if_done(prompt_id)
                         elif event_type == "executed":
                             # This is the gold mine for auto-save
                             prompt_id = payload.get("prompt_id")
@@ -115,12 +165,18 @@ class ComfyWebSocketManager:
                             output = payload.get("output", {})
                             logger.success(f"ComfyUI: Node {node_id} EXECUTED for prompt {prompt_id}")
                             
-                            if prompt_id in self.metadata_cache:
-                                await self._auto_save_images(prompt_id, output)
+                            if prompt_id in self.metadata_store:
+                                self.enqueue_auto_save(prompt_id, output)
                             else:
                                 logger.warning(f"ComfyUI: Executed event for prompt {prompt_id} but no metadata in cache!")
                         
+                        if event_type in ("execution_success", "execution_error", "execution_interrupted"):
+                            self.preview_relay.forget(payload.get("prompt_id"))
+                            self.release_if_done(payload.get("prompt_id"))
+
                         await self._broadcast(data)
+                    elif isinstance(message, (bytes, bytearray)):
+                        self._handle_preview(message)
                 except json.JSONDecodeError:
                     pass
                 except Exception as e:
@@ -131,126 +187,437 @@ class ComfyWebSocketManager:
         except Exception as e:
             logger.error(f"Error in WS listener loop: {e}")
 
-    async def _auto_save_images(self, prompt_id: str, output: Dict):
-        """Automatically save generated images to DB."""
-        metadata = self.metadata_cache.get(prompt_id)
-        if not metadata:
+    def enqueue_auto_save(self, prompt_id: str, output: Dict):
+        """Hand an `executed` output to the background save workers (never blocks `_listen`)."""
+        self._ensure_save_workers()
+        prompt_tracker.save_started(prompt_id)
+        self.save_queue.put_nowait((prompt_id, output))
+
+    def _ensure_save_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._save_loop is loop and self.save_workers:
             return
+        self._save_loop = loop
+        self.save_queue = asyncio.Queue()
+        self.save_workers = [
+            loop.create_task(self._save_worker(i)) for i in range(AUTO_SAVE_WORKERS)
+        ]
 
-        # 1. Collect image lists from output FIRST
-        image_lists = []
-        if "images" in output and isinstance(output["images"], list):
-            image_lists.append(output["images"])
-        else:
-            for node_id, node_output in output.items():
-                if isinstance(node_output, dict) and "images" in node_output:
-                    image_lists.append(node_output["images"])
+    async def _save_worker(self, worker_id: int):
+        while True:
+            prompt_id, output = await self.save_queue.get()
+            batch = [output]
+            # Coalesce other queued outputs of the same prompt into one bulk insert
+            others = []
+            while not self.save_queue.empty():
+                other_id, other_output = self.save_queue.get_nowait()
+                if other_id == prompt_id:
+                    batch.append(other_output)
+                else:
+                    others.append((other_id, other_output))
+            for item in others:
+                self.save_queue.put_nowait(item)
+                self.save_queue.task_done()
+
+            saved = False
+            try:
+                merged = {"images": [img for out in batch for img in self._collect_images(out)]}
+                saved = await self._auto_save_images(prompt_id, merged)
+            except Exception as e:
+                logger.error(f"AUTO-SAVE: Worker {worker_id} failed for prompt {prompt_id}: {e}")
+            finally:
+                for _ in batch:
+                    prompt_tracker.save_finished(prompt_id)
+                    self.save_queue.task_done()
+            # Failed saves keep their metadata so they can be retried
+            if saved:
+                self.release_if_done(prompt_id)
 
-        if not image_lists:
+    async def drain_auto_saves(self, timeout: float = 30.0):
+        """Wait for queued saves to finish (used on shutdown)."""
+        if self.save_queue is None:
             return
+        try:
+            await asyncio.wait_for(self.save_queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"AUTO-SAVE: {self.save_queue.qsize()} saves still pending at shutdown")
+        for task in self.save_workers:
+            task.cancel()
+        self.save_workers = []
 
-        db = None
-        saved_count = 0
+    @staticmethod
+    def _collect_images(output: Dict):
+        """Flat {"images": [...]} (real ComfyUI format) or nested {node_id: {"images": [...]}}."""
+        if "images" in output and isinstance(output["images"], list):
+            return list(output["images"])
+        images = []
+        for node_output in output.values():
+            if isinstance(node_output, dict) and isinstance(node_output.get("images"), list):
+                images.extend(node_output["images"])
+        return images
+
+    async def _fetch_gallery_row(self, prompt_id: str, metadata: Dict, img: Dict, limit: asyncio.Semaphore, blobs: List[bytes]) -> Optional[Dict]:
+        """Download one output image, store its blob + thumbnails, return the gallery row fields."""
+        filename = img.get("filename")
+        subfolder = img.get("subfolder", "")
+        if not filename:
+            return None
+
+        # Fall back to requested dimensions if the image cannot be read
+        actual_width = metadata.get("width", 1024)
+        actual_height = metadata.get("height", 1024)
+        image_hash = None
+        image_size = None
+        image_mime = None
         try:
-            db = SessionLocal()
-            for images in image_lists:
-                for img in images:
-                    filename = img.get("filename")
-                    subfolder = img.get("subfolder", "")
-
-                    if filename:
-                        # Read actual image dimensions from ComfyUI
-                        actual_width = metadata.get("width", 1024)
-                        actual_height = metadata.get("height", 1024)
-                        # Fetch image data for persistence and dimensions
-                        image_data_b64 = None
-                        try:
-                            import httpx
-                            import base64
-                            from PIL import Image
-                            import io
-                            view_url = f"{self.base_url}/view?filename={filename}&subfolder={subfolder}&type=output"
-                            async with _get_http_client(view_url) as http_client:
-                                resp = await http_client.get(view_url)
-                                if resp.status_code == 200:
-                                    # Base64 for persistence
-                                    image_data_b64 = f"data:{resp.headers.get('content-type', 'image/png')};base64,{base64.b64encode(resp.content).decode('utf-8')}"
-                                    
-                                    # Actual dimensions
-                                    pil_img = Image.open(io.BytesIO(resp.content))
-                                    actual_width = pil_img.size[0]
-                                    actual_height = pil_img.size[1]
-                                    
-                                    logger.debug(f"AUTO-SAVE: Captured {filename} ({actual_width}x{actual_height}, {len(image_data_b64)} chars)")
-                        except Exception as save_err:
-                            logger.warning(f"AUTO-SAVE: Could not process {filename}: {save_err}")
-
-                        db_image = GalleryImage(
-                            prompt_id=prompt_id,
-                            filename=filename,
-                            subfolder=subfolder,
-                            workflow_id=metadata.get("workflow_id", "default"),
-                            prompt_positive=metadata.get("prompt_positive", ""),
-                            prompt_negative=metadata.get("prompt_negative", ""),
-                            model=metadata.get("model", ""),
-                            width=actual_width,
-                            height=actual_height,
-                            steps=metadata.get("steps", 20),
-                            cfg=metadata.get("cfg", 1.0),
-                            user_id=metadata.get("user_id"),
-                            image_data=image_data_b64
-                        )
-                        db.add(db_image)
-                        saved_count += 1
-
-            if saved_count > 0:
-                db.commit()
-                logger.success(f"AUTO-SAVE: Successfully saved {saved_count} images for prompt {prompt_id} to DB")
-                # Broadcast gallery update event
-                update_msg = {
-                    "type": "gallery_updated", 
-                    "data": {
-                        "prompt_id": prompt_id, 
-                        "count": saved_count,
-                        "workflow_id": metadata.get("workflow_id", "default")
-                    }
-                }
-                logger.debug(f"BROADCAST: Sending gallery_updated signal: {update_msg}")
-                await self._broadcast(update_msg)
-            else:
-                logger.warning(f"AUTO-SAVE: No images found in output for prompt {prompt_id}. Output keys: {list(output.keys())}")
+            async with limit:
+                view_url = f"{self.base_url}/view?filename={filename}&subfolder={subfolder}&type=output"
+                http_client = get_comfy_client(self.base_url)
+                resp = await http_client.get(view_url, timeout=20.0)
+            if resp.status_code == 200:
+                # Content-addressed blob for persistence (hash + disk write off the loop)
+                image_hash, image_size = await asyncio.to_thread(blob_store.put, resp.content)
+                image_mime = resp.headers.get("content-type", "image/png")
+                blobs.append(resp.content)
 
+                # Actual dimensions + eager thumbnails, decoded once in the image process pool
+                actual_width, actual_height, thumbnails = await image_executor.run(
+                    "auto_save", process_saved_image, resp.content, THUMBNAIL_SIZES
+                )
+                try:
+                    await asyncio.to_thread(thumbnail_cache.put_many, blob_source(image_hash), thumbnails)
+                except Exception as thumb_err:
+                    logger.warning(f"AUTO-SAVE: Thumbnail caching failed for {filename}: {thumb_err}")
 
+                logger.debug(f"AUTO-SAVE: Captured {filename} ({actual_width}x{actual_height}, {image_size} bytes, blob {image_hash[:12]})")
+        except Exception as save_err:
+            logger.warning(f"AUTO-SAVE: Could not process {filename}: {save_err}")
+
+        return {
+            "prompt_id": prompt_id,
+            "filename": filename,
+            "subfolder": subfolder,
+            "workflow_id": metadata.get("workflow_id", "default"),
+            "prompt_positive": metadata.get("prompt_positive", ""),
+            "prompt_negative": metadata.get("prompt_negative", ""),
+            "model": metadata.get("model", ""),
+            "width": actual_width,
+            "height": actual_height,
+            "steps": metadata.get("steps", 20),
+            "cfg": metadata.get("cfg", 1.0),
+            "user_id": metadata.get("user_id"),
+            "image_hash": image_hash,
+            "image_size": image_size,
+            "image_mime": image_mime,
+        }
+
+    async def _auto_save_images(self, prompt_id: str, output: Dict) -> bool:
+        """Fetch every output image concurrently, then save them to DB in one bulk insert.
+
+        Returns False only if the rows could not be written.
+        """
+        metadata = self.metadata_store.get(prompt_id)
+        if not metadata:
+            return True
+
+        images = self._collect_images(output)
+        if not images:
+            return True
+
+        # One save per prompt at a time, so the existence check below cannot race another worker
+        entry = self._save_locks.setdefault(prompt_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._save_new_images(prompt_id, metadata, output, images)
+        finally:
+            # Counted, not lock.locked(): a woken waiter has not taken the lock yet when release() returns
+            entry[1] -= 1
+            if not entry[1]:
+                del self._save_locks[prompt_id]
+
+    async def _save_new_images(self, prompt_id: str, metadata: Dict, output: Dict, images: List[Dict]) -> bool:
+        # The WS path and reconciliation may both hand over the same output: skip rows already written
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(GalleryImage.filename, GalleryImage.subfolder).where(GalleryImage.prompt_id == prompt_id)
+            )
+            existing = {(row.filename, row.subfolder or "") for row in rows}
+        images = [img for img in images if (img.get("filename"), img.get("subfolder", "")) not in existing]
+        if not images:
+            logger.debug(f"AUTO-SAVE: Images of prompt {prompt_id} are already in the gallery")
+            return True
+
+        limit = asyncio.Semaphore(AUTO_SAVE_FETCH_CONCURRENCY)
+        blobs: List[bytes] = []
+        rows = await asyncio.gather(*[self._fetch_gallery_row(prompt_id, metadata, img, limit, blobs) for img in images])
+        rows = [row for row in rows if row]
+
+        if not rows:
+            logger.warning(f"AUTO-SAVE: No images found in output for prompt {prompt_id}. Output keys: {list(output.keys())}")
+            return True
+
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all([GalleryImage(**row) for row in rows])
+                await db.commit()
+            # A gallery delete may have dropped a deduplicated blob before these rows existed
+            await asyncio.to_thread(blob_store.keep, *blobs)
+            saved_count = len(rows)
+            logger.success(f"AUTO-SAVE: Successfully saved {saved_count} images for prompt {prompt_id} to DB")
         except Exception as e:
             logger.error(f"Failed to auto-save images for prompt {prompt_id}: {e}")
-        finally:
-            if db:
-                db.close()
+            return False
+
+        # Broadcast gallery update event
+        update_msg = {
+            "type": "gallery_updated", 
+            "data": {
+                "prompt_id": prompt_id, 
+                "count": saved_count,
+                "workflow_id": metadata.get("workflow_id", "default")
+            }
+        }
+        logger.debug(f"BROADCAST: Sending gallery_updated signal: {update_msg}")
+        await self._broadcast(update_msg)
+        return True
+
+    # --- Reconciliation ---
+
+    async def _reconcile_periodically(self):
+        while self.is_running:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            if self.ws_connection is not None:
+                await self.reconcile()
+
+    async def reconcile(self):
+        """Finish prompts whose WS events were missed: save outputs missing from the gallery.
+
+        Pending prompts (metadata still stored, no save in progress) are looked up
+        in one /queue and one /history call; only prompts that fell out of the
+        /history window are fetched individually.
+        """
+        if self._reconcile_lock.locked():
+            return
+        async with self._reconcile_lock:
+            self.reconcile_stats["runs"] += 1
+            self.reconcile_stats["last_run"] = time.time()
+            try:
+                await self._reconcile()
+            except Exception as e:
+                self.reconcile_stats["errors"] += 1
+                logger.warning(f"RECONCILE: Pass against {self.base_url} failed: {e}")
+
+    def _reconcile_candidates(self) -> List[str]:
+        recent = time.time() - RECONCILE_GRACE
+        candidates = []
+        for prompt_id in self.metadata_store.pending_ids():
+            state = prompt_tracker.get(prompt_id)
+            if state is not None and state.pending_saves:
+                continue  # being saved right now
+            if state is not None and self.ws_connection is not None and state.updated_at > recent:
+                continue  # events are flowing for it
+            candidates.append(prompt_id)
+        return candidates
+
+    async def _reconcile(self):
+        pending = self._reconcile_candidates()
+        if not pending:
+            return
+        client = get_comfy_client(self.base_url)
+        queue_resp, history_resp = await asyncio.gather(
+            client.get(f"{self.base_url}/queue", timeout=10.0),
+            client.get(f"{self.base_url}/history", params={"max_items": RECONCILE_HISTORY_ITEMS}, timeout=30.0),
+        )
+        queue_resp.raise_for_status()
+        history_resp.raise_for_status()
+        queue = queue_resp.json()
+        history = history_resp.json()
+        # Queue entries are [number, prompt_id, prompt, extra_data, outputs_to_execute]
+        queued = {item[1] for key in ("queue_running", "queue_pending") for item in queue.get(key, []) if len(item) > 1}
+
+        missing = [pid for pid in pending if pid not in history and pid not in queued]
+        # Rotate through the prompts outside the /history window so none waits behind the same few
+        start = self._lookup_cursor % len(missing) if missing else 0
+        lookups = (missing[start:] + missing[:start])[:RECONCILE_MAX_LOOKUPS]
+        self._lookup_cursor = start + len(lookups)
+        answered = []
+        for prompt_id in lookups:
+            resp = await client.get(f"{self.base_url}/history/{prompt_id}", timeout=10.0)
+            if resp.status_code == 200:
+                history.update(resp.json())
+                answered.append(prompt_id)
+        self.reconcile_stats["checked"] += len(pending)
+        for prompt_id in answered:
+            if prompt_id not in history:
+                self._settle_lost(prompt_id)
+
+        finished = {pid: history[pid] for pid in pending if pid in history and pid not in queued}
+        if not finished:
+            return
+        outputs = {
+            pid: [img for img in self._collect_images(entry.get("outputs") or {}) if img.get("filename") and img.get("type", "output") == "output"]
+            for pid, entry in finished.items()
+        }
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(GalleryImage.prompt_id, GalleryImage.filename, GalleryImage.subfolder).where(GalleryImage.prompt_id.in_(list(finished)))
+            )
+            saved = {(row.prompt_id, row.filename, row.subfolder or "") for row in rows}
+
+        for prompt_id, entry in finished.items():
+            self._reconcile_prompt(prompt_id, entry.get("status") or {}, outputs[prompt_id], saved)
+
+    def _settle_lost(self, prompt_id: str):
+        """Neither queued nor in history (e.g. ComfyUI restarted): it will never finish."""
+        logger.warning(f"RECONCILE: Prompt {prompt_id} is unknown to ComfyUI at {self.base_url}, marking it failed")
+        self.reconcile_stats["lost"] += 1
+        prompt_tracker.handle_event("execution_error", {
+            "prompt_id": prompt_id, "exception_message": "Lost by ComfyUI (not in its queue or history)",
+        })
+        if prompt_tracker.get(prompt_id) is None:
+            self.metadata_store.complete(prompt_id)
+        self.release_if_done(prompt_id)
+
+    def _reconcile_prompt(self, prompt_id: str, status: Dict, images: List[Dict], saved: Set):
+        if status.get("status_str") == "error":
+            event, payload = "execution_error", {"prompt_id": prompt_id, "exception_message": "Execution error"}
+            for message in status.get("messages") or []:
+                if isinstance(message, list) and len(message) == 2 and message[0] in ("execution_error", "execution_interrupted"):
+                    event = message[0]
+                    payload = {**(message[1] or {}), "prompt_id": prompt_id}
+            prompt_tracker.handle_event(event, payload)
+            self.reconcile_stats["failed"] += 1
+            logger.warning(f"RECONCILE: Prompt {prompt_id} ended with {event} while events were missed")
+            self.release_if_done(prompt_id)
+            return
+
+        state = prompt_tracker.get(prompt_id)
+        # Events may have resumed, or a save started, since the candidates were picked
+        if state is not None and (state.pending_saves or (
+            self.ws_connection is not None and state.updated_at > time.time() - RECONCILE_GRACE
+        )):
+            return
+        known = {(img["filename"], img.get("subfolder", "")) for img in state.images} if state else set()
+        new_images = [img for img in images if (img["filename"], img.get("subfolder", "")) not in known]
+        if new_images:
+            prompt_tracker.handle_event("executed", {"prompt_id": prompt_id, "output": {"images": new_images}})
+        unsaved = [img for img in images if (prompt_id, img["filename"], img.get("subfolder", "")) not in saved]
+        if unsaved:
+            logger.info(f"RECONCILE: Saving {len(unsaved)} missed images of prompt {prompt_id}")
+            self.reconcile_stats["recovered_prompts"] += 1
+            self.reconcile_stats["recovered_images"] += len(unsaved)
+            self.enqueue_auto_save(prompt_id, {"images": unsaved})
+        prompt_tracker.handle_event("execution_success", {"prompt_id": prompt_id})
+        self.release_if_done(prompt_id)
 
     async def disconnect(self):
         """Stop reconnect loop and close connection."""
         self.is_running = False
+        # Stop passes first so nothing new is queued, then let queued saves finish
+        for task in (self._reconcile_task, self._reconcile_pass, *self._preview_tasks):
+            if task is not None:
+                task.cancel()
+        self._reconcile_task = self._reconcile_pass = None
         if self.ws_connection:
             await self.ws_connection.close()
+        await self.drain_auto_saves()
+        await self.metadata_store.close()
 
-    async def add_client(self, client_callback: Callable[[Dict], Any]):
-        """Add a client callback to receive updates."""
+    async def add_client(self, client_callback: Callable[[Dict], Any], subscription: Optional[Subscription] = None):
+        """Add a client callback to receive updates (routed by `subscription` when given)."""
         self.connected_clients.add(client_callback)
+        if subscription is not None:
+            self.subscriptions[client_callback] = subscription
 
     async def remove_client(self, client_callback: Callable[[Dict], Any]):
         """Remove a client callback."""
         self.connected_clients.discard(client_callback)
+        self.subscriptions.pop(client_callback, None)
+
+    def prompt_owner(self, prompt_id: Optional[str]) -> Optional[int]:
+        """User who queued `prompt_id` (from registered metadata, else the tracker)."""
+        metadata = self.metadata_store.get(prompt_id)
+        if metadata is not None:
+            return metadata.get("user_id")
+        state = prompt_tracker.get(prompt_id)
+        return state.user_id if state else None
+
+    def _recipients(self, message: Dict):
+        data = message.get("data")
+        prompt_id = data.get("prompt_id") if isinstance(data, dict) else None
+        if prompt_id is None and message.get("type") in PROMPT_EVENT_TYPES:
+            prompt_id = self.current_prompt_id
+        if prompt_id is None:
+            # Queue status, system monitor, ...: not about anyone's prompt
+            return list(self.connected_clients)
+        owner = self.prompt_owner(prompt_id)
+        return [
+            client for client in self.connected_clients
+            if client not in self.subscriptions or self.subscriptions[client].wants(owner)
+        ]
+
+    async def _send(self, client: Callable[[Dict], Any], message: Dict):
+        try:
+            if asyncio.iscoroutinefunction(client):
+                await asyncio.wait_for(client(message), BROADCAST_SEND_TIMEOUT)
+            else:
+                client(message)
+            self.broadcast_stats["sends"] += 1
+        except asyncio.TimeoutError:
+            self.broadcast_stats["timeouts"] += 1
+            logger.warning(f"BROADCAST: Client send timed out after {BROADCAST_SEND_TIMEOUT}s ({message.get('type') if isinstance(message, dict) else 'preview'})")
+        except Exception as e:
+            self.broadcast_stats["errors"] += 1
+            logger.error(f"Error broadcasting to client: {e}")
 
     async def _broadcast(self, message: Dict):
-        """Broadcast message to all connected internal clients."""
-        for client in self.connected_clients:
-            try:
-                if asyncio.iscoroutinefunction(client):
-                    await client(message)
-                else:
-                    client(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
+        """Send a message to the clients it concerns, concurrently, each send bounded by a timeout."""
+        recipients = self._recipients(message)
+        self.broadcast_stats["events"] += 1
+        self.broadcast_stats["filtered"] += len(self.connected_clients) - len(recipients)
+        if len(recipients) == 1:
+            await self._send(recipients[0], message)
+        elif recipients:
+            await asyncio.gather(*(self._send(client, message) for client in recipients))
+
+    def _handle_preview(self, message: bytes):
+        accepted = self.preview_relay.accept(message, self.current_prompt_id)
+        if accepted is None or not self._preview_recipients(accepted[0]):
+            return
+        # Re-encoding happens off the listener so JSON events are never held up by it
+        task = asyncio.get_running_loop().create_task(self._relay_preview(*accepted))
+        self._preview_tasks.add(task)
+        task.add_done_callback(self._preview_tasks.discard)
+
+    def _preview_recipients(self, prompt_id: Optional[str]):
+        """Previews are heavy: only the owner's own sessions get them (no watch_all, no internal listeners)."""
+        owner = self.prompt_owner(prompt_id)
+        if owner is None:
+            return []
+        return [client for client, sub in self.subscriptions.items() if sub.user_id == owner]
+
+    async def _relay_preview(self, prompt_id: Optional[str], frame):
+        try:
+            data = await self.preview_relay.render(prompt_id, frame)
+        except Exception as e:
+            logger.warning(f"PREVIEW: Could not re-encode preview for prompt {prompt_id}: {e}")
+            return
+        recipients = self._preview_recipients(prompt_id)
+        if recipients:
+            await asyncio.gather(*(self._send(client, data) for client in recipients))
+
+    def get_stats(self) -> Dict:
+        return {
+            "connected": self.ws_connection is not None,
+            "clients": len(self.connected_clients),
+            "sessions": len(self.subscriptions),
+            "watch_all": sum(1 for sub in self.subscriptions.values() if sub.watch_all),
+            "metadata": self.metadata_store.get_stats(),
+            "broadcast": dict(self.broadcast_stats),
+            "previews": self.preview_relay.get_stats(),
+            "reconcile": dict(self.reconcile_stats),
+        }
 
 # Global manager dictionary: url -> manager
 managers: Dict[str, ComfyWebSocketManager] = {}
@@ -0,0 +1,207 @@
+"""
+Workflow template registry loaded from disk.
+
+Templates are API-format ComfyUI workflow JSON files in WORKFLOW_DIR, listed
+in `manifest.json`:
+
+    {
+      "default": "turbo_aio",
+      "templates": {
+        "upscale": {"file": "upscale.json", "workflow_ids": ["upscale"],
+                    "exclude": ["batch_size"], "loras": false},
+        "flux": {"file": "flux.json", "models": ["flux"]}
+      }
+    }
+
+Selection: exact `workflow_ids` match -> template named like the workflow_id
+-> first template (manifest order) whose `models` substring occurs in the
+requested model name -> `default`. Every file is validated and compiled once
+at load; a background task polls the directory and swaps in a new index when
+anything changes. A broken file or manifest is logged and the last good
+version keeps serving.
+"""
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from services.workflow_templates import CompiledWorkflow, compile_workflow
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKFLOW_DIR = os.environ.get("COMFY_WORKFLOW_DIR", os.path.join(PROJECT_ROOT, "workflow"))
+MANIFEST_NAME = "manifest.json"
+RELOAD_INTERVAL = float(os.environ.get("COMFY_WORKFLOW_RELOAD_INTERVAL", "2"))
+
+
+class WorkflowValidationError(ValueError):
+    pass
+
+
+def validate_graph(graph) -> None:
+    """Structural checks for an API-format graph (raises WorkflowValidationError)."""
+    if not isinstance(graph, dict) or not graph:
+        raise WorkflowValidationError("workflow must be a non-empty JSON object of nodes")
+    if "nodes" in graph and "links" in graph:
+        raise WorkflowValidationError("UI-format workflow; export it with 'Save (API Format)'")
+    for node_id, node in graph.items():
+        if not isinstance(node, dict) or not isinstance(node.get("class_type"), str):
+            raise WorkflowValidationError(f"node {node_id}: missing class_type")
+        inputs = node.get("inputs", {})
+        if not isinstance(inputs, dict):
+            raise WorkflowValidationError(f"node {node_id}: inputs must be an object")
+        for name, value in inputs.items():
+            if isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and isinstance(value[1], int):
+                if value[0] not in graph:
+                    raise WorkflowValidationError(f"node {node_id}.{name}: link to missing node {value[0]}")
+
+
+class TemplateEntry:
+    def __init__(self, name: str, template: CompiledWorkflow, path: str,
+                 workflow_ids: List[str], models: List[str]):
+        self.name = name
+        self.template = template
+        self.path = path
+        self.workflow_ids = workflow_ids
+        self.models = [m.lower() for m in models]
+
+
+class WorkflowRegistry:
+    def __init__(self, directory: str = WORKFLOW_DIR):
+        self.directory = directory
+        self.entries: Dict[str, TemplateEntry] = {}
+        self.by_workflow_id: Dict[str, TemplateEntry] = {}
+        self.default: Optional[TemplateEntry] = None
+        self.errors: Dict[str, str] = {}
+        self.reloads = 0
+        self._signature: Optional[Tuple] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Loading ---
+
+    def _dir_signature(self) -> Tuple:
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith(".json"))
+        except FileNotFoundError:
+            return ()
+        signature = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+                signature.append((name, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                continue
+        return tuple(signature)
+
+    def load(self) -> bool:
+        """(Re)build the index from disk. Returns False if the manifest was unusable."""
+        signature = self._dir_signature()
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            specs = manifest["templates"]
+            if not isinstance(specs, dict) or not specs:
+                raise WorkflowValidationError("manifest has no templates")
+        except Exception as e:
+            self._signature = signature
+            self.errors = {MANIFEST_NAME: str(e)}
+            logger.error(f"WORKFLOWS: Cannot load {manifest_path}: {e} (keeping {len(self.entries)} templates)")
+            return False
+
+        entries: Dict[str, TemplateEntry] = {}
+        errors: Dict[str, str] = {}
+        for name, spec in specs.items():
+            path = os.path.join(self.directory, spec.get("file", f"{name}.json"))
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    graph = json.load(f)
+                validate_graph(graph)
+                template = compile_workflow(name, graph, exclude=spec.get("exclude", ()), loras=spec.get("loras", True))
+                if template.sampler_node is None:
+                    raise WorkflowValidationError("no sampler node")
+                entries[name] = TemplateEntry(name, template, path, spec.get("workflow_ids", []), spec.get("models", []))
+            except Exception as e:
+                errors[name] = str(e)
+                previous = self.entries.get(name)
+                if previous is not None:
+                    entries[name] = previous
+                logger.error(f"WORKFLOWS: Template '{name}' ({path}) rejected: {e}"
+                             + (" - keeping previous version" if previous else ""))
+
+        if not entries:
+            self._signature = signature
+            self.errors = errors
+            logger.error("WORKFLOWS: No valid templates on disk, keeping the current index")
+            return False
+
+        default = entries.get(manifest.get("default")) or next(iter(entries.values()))
+        by_workflow_id = {wid: entry for entry in entries.values() for wid in entry.workflow_ids}
+        # Swap in one step so concurrent requests never see a half-built index
+        self.entries, self.by_workflow_id, self.default = entries, by_workflow_id, default
+        self.errors = errors
+        self._signature = signature
+        self.reloads += 1
+        logger.info(f"WORKFLOWS: Loaded {len(entries)} templates from {self.directory} (default '{default.name}')")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        if self._dir_signature() == self._signature:
+            return False
+        return self.load()
+
+    def ensure_loaded(self):
+        if self.default is None:
+            self.load()
+
+    async def watch(self, interval: float = RELOAD_INTERVAL):
+        """Poll the directory and hot-reload on change (stat calls only; runs until cancelled)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                logger.error(f"WORKFLOWS: Reload failed: {e}")
+
+    def start_watching(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.watch())
+
+    async def stop_watching(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # --- Lookup ---
+
+    def get(self, name: str) -> Optional[CompiledWorkflow]:
+        self.ensure_loaded()
+        entry = self.entries.get(name)
+        return entry.template if entry else None
+
+    def select(self, workflow_id: Optional[str], model: Optional[str]) -> CompiledWorkflow:
+        self.ensure_loaded()
+        if self.default is None:
+            raise RuntimeError(f"No workflow templates available in {self.directory}")
+        entry = self.by_workflow_id.get(workflow_id) or self.entries.get(workflow_id)
+        if entry is None and model:
+            model_name = model.lower()
+            entry = next((e for e in self.entries.values() if any(m in model_name for m in e.models)), None)
+        return (entry or self.default).template
+
+    def get_stats(self) -> Dict:
+        return {
+            "directory": self.directory,
+            "templates": {
+                name: {"file": os.path.basename(e.path), "workflow_ids": e.workflow_ids,
+                       "models": e.models, "params": sorted(e.template.params)}
+                for name, e in self.entries.items()
+            },
+            "default": self.default.name if self.default else None,
+            "errors": self.errors,
+            "reloads": self.reloads,
+        }
+
+
+workflow_registry = WorkflowRegistry()
@@ -0,0 +1,157 @@
+"""
+Compiled ComfyUI workflow templates.
+
+A template is compiled once: the graph is frozen (link lists become tuples,
+UI-only `_meta` is dropped) and the request parameters are resolved to a
+precomputed list of (node_id, input_name) slots by following the graph from
+its sampler (positive/negative prompt, latent, checkpoint, ...) instead of
+hard-coded node ids. `build()` is then a shallow per-node copy plus slot
+assignment - no JSON round trip, no graph walk.
+"""
+import json
+import os
+import random
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+SAMPLER_CLASSES = {"KSampler", "KSamplerAdvanced"}
+CHECKPOINT_CLASSES = {"CheckpointLoaderSimple"}
+TEXT_ENCODE_CLASSES = {"CLIPTextEncode"}
+RANDOM_SEED_CLASSES = {"SeedVR2VideoUpscaler"}  # extra seeds re-rolled per build
+LORA_CLASS = "LoraLoaderModelOnly"
+LORA_NODE_BASE = 100
+
+SEED_MAX = 2**32 - 1
+
+
+class Slot(NamedTuple):
+    node_id: str
+    input_name: str
+    param: str
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _freeze(v) for k, v in value.items()}
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    return value
+
+
+def _is_link(value) -> bool:
+    return isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], str) and isinstance(value[1], int)
+
+
+class CompiledWorkflow:
+    """Frozen API-format graph plus its parameter slots."""
+
+    def __init__(self, name: str, graph: Dict[str, Dict], exclude: Iterable[str] = (), loras: bool = True):
+        self.name = name
+        # node_id -> (class_type, frozen inputs, link input names, needs deep copy)
+        self.nodes: Dict[str, Tuple[str, Dict[str, Any], Tuple[str, ...], bool]] = {}
+        for node_id, node in graph.items():
+            inputs = {k: _freeze(v) for k, v in node.get("inputs", {}).items()}
+            links = tuple(k for k, v in inputs.items() if _is_link(v))
+            deep = any(not _is_link(v) and isinstance(v, (tuple, dict)) for v in inputs.values())
+            self.nodes[node_id] = (node["class_type"], inputs, links, deep)
+
+        self.sampler_node = self._find_sampler()
+        self.checkpoint_node = self._upstream(self.sampler_node, "model", CHECKPOINT_CLASSES)
+        self.supports_loras = loras and self.checkpoint_node is not None
+        self.slots: Tuple[Slot, ...] = tuple(s for s in self._discover_slots() if s.param not in set(exclude))
+        self.params = frozenset(s.param for s in self.slots)
+
+    def _find_sampler(self) -> Optional[str]:
+        for node_id, (class_type, _, _, _) in self.nodes.items():
+            if class_type in SAMPLER_CLASSES:
+                return node_id
+        return None
+
+    def _upstream(self, node_id: Optional[str], input_name: str, classes=None) -> Optional[str]:
+        if node_id is None:
+            return None
+        link = self.nodes[node_id][1].get(input_name)
+        if not _is_link(link) or link[0] not in self.nodes:
+            return None
+        if classes is not None and self.nodes[link[0]][0] not in classes:
+            return None
+        return link[0]
+
+    def _discover_slots(self) -> List[Slot]:
+        slots = []
+        if self.checkpoint_node:
+            slots.append(Slot(self.checkpoint_node, "ckpt_name", "model"))
+        positive = self._upstream(self.sampler_node, "positive", TEXT_ENCODE_CLASSES)
+        if positive:
+            slots.append(Slot(positive, "text", "positive_prompt"))
+        negative = self._upstream(self.sampler_node, "negative", TEXT_ENCODE_CLASSES)
+        if negative and negative != positive:
+            slots.append(Slot(negative, "text", "negative_prompt"))
+        latent = self._upstream(self.sampler_node, "latent_image")
+        if latent:
+            for name in ("width", "height", "batch_size"):
+                if name in self.nodes[latent][1]:
+                    slots.append(Slot(latent, name, name))
+        if self.sampler_node:
+            sampler_inputs = self.nodes[self.sampler_node][1]
+            for name in ("seed", "steps", "cfg", "sampler_name"):
+                if name in sampler_inputs:
+                    slots.append(Slot(self.sampler_node, name, name))
+        for node_id, (class_type, inputs, _, _) in self.nodes.items():
+            if class_type in RANDOM_SEED_CLASSES and "seed" in inputs:
+                slots.append(Slot(node_id, "seed", "extra_seed"))
+        return slots
+
+    def build(self, values: Dict[str, Any], lora_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Fresh API-format workflow with `values` written into the matching slots.
+
+        Params missing from `values` (or None) keep the template default;
+        `seed` / `extra_seed` are re-rolled unless given.
+        """
+        workflow = {}
+        for node_id, (class_type, inputs, links, deep) in self.nodes.items():
+            if deep:
+                node_inputs = _thaw(inputs)
+            else:
+                node_inputs = dict(inputs)
+                for name in links:
+                    node_inputs[name] = list(inputs[name])
+            workflow[node_id] = {"inputs": node_inputs, "class_type": class_type}
+
+        for node_id, input_name, param in self.slots:
+            if param in ("seed", "extra_seed") and values.get(param) is None:
+                workflow[node_id]["inputs"][input_name] = random.randint(0, SEED_MAX)
+                continue
+            value = values.get(param)
+            if value is not None:
+                workflow[node_id]["inputs"][input_name] = value
+
+        if lora_names and self.supports_loras:
+            last_node_id = self.checkpoint_node
+            for i, lora_name in enumerate(lora_names):
+                node_id = str(LORA_NODE_BASE + i)
+                workflow[node_id] = {
+                    "inputs": {"lora_name": lora_name, "strength_model": 1.0, "model": [last_node_id, 0]},
+                    "class_type": LORA_CLASS,
+                }
+                last_node_id = node_id
+            workflow[self.sampler_node]["inputs"]["model"] = [last_node_id, 0]
+        return workflow
+
+
+def compile_workflow(name: str, graph: Dict[str, Dict], **kwargs) -> CompiledWorkflow:
+    return CompiledWorkflow(name, graph, **kwargs)
+
+
+def compile_workflow_file(path: str, name: Optional[str] = None, **kwargs) -> CompiledWorkflow:
+    """Compile an API-format workflow exported from the ComfyUI UI ("Save (API)")."""
+    with open(path, "r", encoding="utf-8") as f:
+        graph = json.load(f)
+    return CompiledWorkflow(name or os.path.splitext(os.path.basename(path))[0], graph, **kwargs)
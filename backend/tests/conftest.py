@@ -0,0 +1,63 @@
+"""
+Shared fixtures for tests of the /api/comfy routes.
+"""
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import routes.comfy as comfy_routes
+import services.generation_scheduler as scheduler_module
+from auth import get_current_user
+from database import User
+from main import app
+from services.comfy_pool import ComfyPool
+from services.generation_scheduler import GenerationScheduler
+from services.model_catalog import ModelCatalog
+from services.prompt_tracker import PromptTracker
+from services.websocket_manager import ComfyWebSocketManager
+
+COMFY_URL = "http://comfy.test"
+
+
+@pytest.fixture
+def comfy_app(monkeypatch):
+    """Factory serving the app against a fake ComfyUI.
+
+    `handler` answers every ComfyUI request (an httpx MockTransport handler).
+    The prompt tracker, model catalog, node pool and scheduler are fresh per
+    test, so nothing leaks into the module singletons.
+    """
+    def make(handler, url=COMFY_URL, user_id=1, pool=None, scheduler=None):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        async def comfy_url(db, user=None):
+            return url
+
+        env = SimpleNamespace(
+            tracker=PromptTracker(),
+            catalog=ModelCatalog(),
+            pool=pool or ComfyPool([]),
+            scheduler=scheduler or GenerationScheduler(),
+            managers={},
+        )
+        monkeypatch.setattr(comfy_routes, "get_comfy_url", comfy_url)
+        monkeypatch.setattr(comfy_routes, "get_comfy_client", lambda url: client)
+        monkeypatch.setattr(comfy_routes, "get_manager", lambda url: env.managers.setdefault(url, ComfyWebSocketManager(url)))
+        monkeypatch.setattr(comfy_routes, "prompt_tracker", env.tracker)
+        monkeypatch.setattr("services.websocket_manager.prompt_tracker", env.tracker)
+        monkeypatch.setattr(comfy_routes, "model_catalog", env.catalog)
+        monkeypatch.setattr(comfy_routes, "comfy_pool", env.pool)
+        monkeypatch.setattr(comfy_routes, "generation_scheduler", env.scheduler)
+        monkeypatch.setattr(scheduler_module, "comfy_pool", env.pool)
+        monkeypatch.setattr(scheduler_module, "prompt_tracker", env.tracker)
+        env.user = User(id=user_id, username=f"user{user_id}", is_admin=False)
+        app.dependency_overrides[get_current_user] = lambda: env.user
+        env.client = TestClient(app)
+        return env
+
+    try:
+        yield make
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
@@ -12,6 +12,7 @@ from unittest.mock import patch
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from main import app
 from database import Base, get_db, GalleryImage
@@ -22,6 +23,8 @@ from database import Base, get_db, GalleryImage
 TEST_DATABASE_URL = "sqlite:///./test_e2e.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(TEST_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 
 def override_get_db():
@@ -40,8 +43,8 @@ client = TestClient(app)
 def setup_teardown_db():
     """Create tables before each test, drop after."""
     Base.metadata.create_all(bind=engine)
-    # Patch SessionLocal in websocket_manager so _auto_save_images uses test DB
-    with patch("services.websocket_manager.SessionLocal", TestingSessionLocal):
+    # Patch AsyncSessionLocal in websocket_manager so _auto_save_images uses test DB
+    with patch("services.websocket_manager.AsyncSessionLocal", TestingAsyncSessionLocal):
         yield
     Base.metadata.drop_all(bind=engine)
 
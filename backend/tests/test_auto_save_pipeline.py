@@ -0,0 +1,116 @@
+"""
+Tests for the pipelined auto-save (queue + workers + bulk insert).
+"""
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+import services.websocket_manager as ws_module
+from services.image_executor import ImageExecutor
+from services.prompt_tracker import prompt_tracker
+from services.websocket_manager import ComfyWebSocketManager
+
+
+def _png(width, height) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (1, 2, 3)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _FakeSession:
+    """Records add_all/commit calls instead of touching the database."""
+    commits = 0
+    rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt):
+        return list(_FakeSession.rows)  # rows already in the gallery
+
+    def add_all(self, rows):
+        _FakeSession.rows.extend(rows)
+
+    async def commit(self):
+        _FakeSession.commits += 1
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    _FakeSession.commits = 0
+    _FakeSession.rows = []
+    state = {"active": 0, "peak": 0}
+    image = _png(640, 360)
+
+    async def handler(request: httpx.Request):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.05)
+        state["active"] -= 1
+        return httpx.Response(200, content=image, headers={"content-type": "image/png"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ws_module, "get_comfy_client", lambda url: client)
+    monkeypatch.setattr(ws_module, "AsyncSessionLocal", _FakeSession)
+    monkeypatch.setattr(ws_module, "image_executor", ImageExecutor(workers=0, queue_size=4))
+    monkeypatch.setattr(ws_module.blob_store, "root", str(tmp_path / "blobs"))
+    monkeypatch.setattr(ws_module.thumbnail_cache, "root", str(tmp_path / "thumbs"))
+
+    manager = ComfyWebSocketManager("http://comfy.test")
+    broadcasts = []
+
+    async def on_message(msg):
+        broadcasts.append(msg)
+
+    manager.connected_clients.add(on_message)
+    return manager, state, broadcasts
+
+
+def _output(prefix, count):
+    return {"images": [{"filename": f"{prefix}_{i}.png", "subfolder": "", "type": "output"} for i in range(count)]}
+
+
+@pytest.mark.asyncio
+async def test_images_fetched_concurrently_and_inserted_in_one_commit(pipeline):
+    manager, state, broadcasts = pipeline
+    manager.register_metadata("p1", {"width": 1024, "height": 1024, "user_id": 1})
+
+    await manager._auto_save_images("p1", _output("p1", 6))
+
+    assert 1 < state["peak"] <= ws_module.AUTO_SAVE_FETCH_CONCURRENCY
+    assert _FakeSession.commits == 1
+    assert len(_FakeSession.rows) == 6
+    assert {(r.width, r.height) for r in _FakeSession.rows} == {(640, 360)}
+    assert all(r.image_hash for r in _FakeSession.rows)
+    assert broadcasts[-1]["type"] == "gallery_updated"
+    assert broadcasts[-1]["data"]["count"] == 6
+
+
+@pytest.mark.asyncio
+async def test_enqueue_returns_immediately_and_workers_save_in_background(pipeline):
+    manager, _, broadcasts = pipeline
+    manager.register_metadata("p2", {"user_id": 1})
+    manager.register_metadata("p3", {"user_id": 1})
+
+    manager.enqueue_auto_save("p2", _output("p2", 2))
+    manager.enqueue_auto_save("p2", _output("p2b", 1))
+    manager.enqueue_auto_save("p3", _output("p3", 1))
+    # Nothing has been fetched yet: the listen loop was not blocked on the save
+    assert _FakeSession.rows == []
+    assert prompt_tracker.get("p2").pending_saves == 2
+
+    await manager.drain_auto_saves(timeout=5)
+
+    saved = sorted(r.filename for r in _FakeSession.rows)
+    assert saved == ["p2_0.png", "p2_1.png", "p2b_0.png", "p3_0.png"]
+    # Outputs of p2 queued together are merged into a single bulk insert
+    assert _FakeSession.commits == 2
+    assert sorted(m["data"]["prompt_id"] for m in broadcasts if m["type"] == "gallery_updated") == ["p2", "p3"]
+    assert manager.save_workers == []
+    assert prompt_tracker.get("p2").pending_saves == 0
@@ -0,0 +1,85 @@
+"""
+Tests for POST /api/comfy/generate/batch and aggregate batch progress.
+"""
+import json
+
+import httpx
+import pytest
+
+from auth import get_current_user
+from database import User
+from main import app
+from services.generation_scheduler import GenerationScheduler
+from services.websocket_manager import ComfyWebSocketManager
+
+
+@pytest.fixture
+def batch_client(comfy_app):
+    posted = []
+    fail_on = set()
+
+    def handler(request: httpx.Request):
+        if request.url.path != "/prompt":
+            return httpx.Response(404)  # no model catalog: requests are not validated
+        body = json.loads(request.content)
+        posted.append(body["prompt"])
+        if len(posted) in fail_on:
+            return httpx.Response(500, text="queue full")
+        return httpx.Response(200, json={"prompt_id": f"batch-p{len(posted)}", "number": len(posted)})
+
+    # Room for a whole batch in flight: every item goes straight to ComfyUI
+    env = comfy_app(handler, user_id=5, scheduler=GenerationScheduler(inflight_per_node=8))
+    manager = env.managers["http://comfy.test"] = ComfyWebSocketManager("http://comfy.test")
+    return env.client, posted, fail_on, env.tracker, manager
+
+
+def test_batch_queues_all_items_with_fresh_seeds(batch_client):
+    client, posted, _, tracker, manager = batch_client
+    resp = client.post("/api/comfy/generate/batch", json={"positive_prompt": "a fox", "count": 4})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "queued"
+    assert body["prompt_ids"] == ["batch-p1", "batch-p2", "batch-p3", "batch-p4"]
+    assert len({wf["5"]["inputs"]["seed"] for wf in posted}) == 4
+    assert all(pid in manager.metadata_store for pid in body["prompt_ids"])
+
+    batch_id = body["batch_id"]
+    tracker.handle_event("execution_start", {"prompt_id": "batch-p1"})
+    tracker.handle_event("progress", {"prompt_id": "batch-p1", "value": 4, "max": 8})
+    tracker.handle_event("execution_success", {"prompt_id": "batch-p2"})
+
+    status = client.get(f"/api/comfy/batch/{batch_id}").json()
+    assert status["status"] == "processing"
+    assert (status["completed"], status["processing"], status["pending"]) == (1, 1, 2)
+    assert status["progress"] == pytest.approx((0.5 + 1.0) / 4)
+
+    for pid in ("batch-p1", "batch-p3", "batch-p4"):
+        tracker.handle_event("execution_success", {"prompt_id": pid})
+    with client.stream("GET", f"/api/comfy/batch/{batch_id}/events") as stream:
+        events = [line for line in stream.iter_lines() if line.startswith("data: ")]
+    final = json.loads(events[-1][len("data: "):])
+    assert final["status"] == "completed" and final["progress"] == 1.0
+
+
+def test_partial_failure_and_ownership(batch_client):
+    client, _, fail_on, tracker, _ = batch_client
+    fail_on.add(2)
+    body = client.post("/api/comfy/generate/batch", json={"positive_prompt": "x", "count": 3}).json()
+    assert body["status"] == "partial"
+    assert [item["status"] for item in body["items"]] == ["queued", "failed", "queued"]
+    assert body["prompt_ids"] == ["batch-p1", "batch-p3"]
+
+    snapshot = tracker.batch_snapshot(body["batch_id"])
+    assert snapshot["failed"] == 1 and snapshot["pending"] == 2
+    # The prompt ComfyUI refused leaves no pending state behind for long-polls to wait on
+    assert {state.prompt_id for state in tracker.prompts.values()} == {"batch-p1", "batch-p3"}
+
+    app.dependency_overrides[get_current_user] = lambda: User(id=6, username="other", is_admin=False)
+    assert client.get(f"/api/comfy/batch/{body['batch_id']}").status_code == 404
+
+
+def test_batch_count_is_bounded(batch_client):
+    client, posted, _, _, _ = batch_client
+    assert client.post("/api/comfy/generate/batch", json={"positive_prompt": "x", "count": 0}).status_code == 422
+    assert client.post("/api/comfy/generate/batch", json={"positive_prompt": "x", "count": 999}).status_code == 422
+    assert posted == []
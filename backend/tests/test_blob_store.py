@@ -0,0 +1,195 @@
+"""
+Tests for the content-addressed gallery blob store and its streaming endpoint.
+"""
+import base64
+import hashlib
+import os
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from database import Base, get_db, GalleryImage
+from services.blob_store import BlobStore, blob_store, decode_data_url
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def test_put_is_content_addressed_and_deduplicated(tmp_path):
+    store = BlobStore(str(tmp_path))
+    digest, size = store.put(PNG_BYTES)
+    assert digest == hashlib.sha256(PNG_BYTES).hexdigest()
+    assert size == len(PNG_BYTES)
+
+    path = store.path_for(digest)
+    assert path == os.path.join(str(tmp_path), digest[:2], digest[2:4], digest)
+    assert store.get(digest) == PNG_BYTES
+
+    mtime = os.path.getmtime(path)
+    assert store.put(PNG_BYTES) == (digest, size)
+    assert os.path.getmtime(path) == mtime
+    # No temp files left behind in the shard
+    assert os.listdir(os.path.dirname(path)) == [digest]
+
+
+def test_invalid_hashes_are_rejected(tmp_path):
+    store = BlobStore(str(tmp_path))
+    assert not store.exists("../../etc/passwd")
+    with pytest.raises(ValueError):
+        store.path_for("not-a-hash")
+
+
+def test_decode_data_url():
+    data_url = f"data:image/png;base64,{base64.b64encode(PNG_BYTES).decode()}"
+    assert decode_data_url(data_url) == ("image/png", PNG_BYTES)
+    assert decode_data_url("/api/comfy/image?filename=x.png") is None
+
+
+@pytest.fixture
+def blob_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "root", str(tmp_path / "blobs"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield TestClient(app), Session
+    finally:
+        if previous:
+            app.dependency_overrides[get_db] = previous
+        else:
+            app.dependency_overrides.pop(get_db, None)
+
+
+def test_blob_endpoint_streams_with_etag_and_range(blob_client):
+    client, Session = blob_client
+    digest, size = blob_store.put(PNG_BYTES)
+    db = Session()
+    db.add(GalleryImage(filename="a.png", image_hash=digest, image_size=size, image_mime="image/png"))
+    db.commit()
+    db.close()
+
+    resp = client.get(f"/api/gallery/blobs/{digest}")
+    assert resp.status_code == 200
+    assert resp.content == PNG_BYTES
+    assert resp.headers["content-type"] == "image/png"
+    assert resp.headers["etag"] == f'"{digest}"'
+    assert "immutable" in resp.headers["cache-control"]
+
+    resp = client.get(f"/api/gallery/blobs/{digest}", headers={"If-None-Match": f'"{digest}"'})
+    assert resp.status_code == 304
+
+    resp = client.get(f"/api/gallery/blobs/{digest}", headers={"Range": "bytes=0-7"})
+    assert resp.status_code == 206
+    assert resp.content == PNG_BYTES[:8]
+    assert resp.headers["content-range"] == f"bytes 0-7/{size}"
+
+    resp = client.get(f"/api/gallery/blobs/{digest}", headers={"Range": "bytes=-4"})
+    assert resp.content == PNG_BYTES[-4:]
+
+    resp = client.get(f"/api/gallery/blobs/{digest}", headers={"Range": f"bytes={size}-"})
+    assert resp.status_code == 416
+
+    assert client.get(f"/api/gallery/blobs/{'0' * 64}").status_code == 404
+
+
+def test_migration_moves_image_data_rows(tmp_path, monkeypatch):
+    import migrate_image_data_to_blobs as migration
+
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE gallery (id INTEGER PRIMARY KEY, filename TEXT, image_data TEXT)")
+    data_url = f"data:image/png;base64,{base64.b64encode(PNG_BYTES).decode()}"
+    conn.executemany("INSERT INTO gallery (filename, image_data) VALUES (?, ?)",
+                     [("a.png", data_url), ("b.png", data_url), ("c.png", "not a data url")])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(migration, "get_db_path", lambda: str(db_path))
+    monkeypatch.setattr(migration, "blob_store", BlobStore(str(tmp_path / "blobs")))
+
+    assert migration.migrate_rows(batch_size=1) == 2
+    assert migration.migrate_rows() == 0  # idempotent
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT filename, image_hash, image_size, image_mime, image_data FROM gallery ORDER BY id").fetchall()
+    conn.close()
+    digest = hashlib.sha256(PNG_BYTES).hexdigest()
+    assert rows[0] == ("a.png", digest, len(PNG_BYTES), "image/png", None)
+    assert rows[1][1] == digest
+    assert rows[2] == ("c.png", None, None, None, "not a data url")
+
+
+def test_blob_deleted_while_a_new_row_was_saved_is_restored(blob_client, monkeypatch):
+    import routes.gallery as gallery_routes
+    from auth import get_current_user
+    from database import User
+
+    client, Session = blob_client
+    digest, size = blob_store.put(PNG_BYTES)
+    db = Session()
+    old = GalleryImage(filename="old.png", image_hash=digest, image_size=size, user_id=1)
+    db.add(old)
+    db.commit()
+    real_put = blob_store.put
+
+    def racing_put(data):
+        monkeypatch.setattr(blob_store, "put", real_put)
+        result = real_put(data)  # the blob exists already: nothing written
+        # Meanwhile the old row is deleted; the new one is not committed yet, so the blob goes too
+        db.delete(old)
+        db.commit()
+        gallery_routes._delete_unreferenced_blobs(db, [digest])
+        assert not blob_store.exists(digest)
+        return result
+
+    monkeypatch.setattr(blob_store, "put", racing_put)
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, username="racer", is_admin=False)
+    try:
+        data_url = f"data:image/png;base64,{base64.b64encode(PNG_BYTES).decode()}"
+        resp = client.post("/api/gallery", json={
+            "filename": "new.png", "prompt_positive": "x", "model": "m", "width": 1, "height": 1,
+            "steps": 1, "cfg": 1.0, "image_data": data_url,
+        })
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        db.close()
+    assert resp.status_code == 200 and resp.json()["image_hash"] == digest
+    assert client.get(resp.json()["image_url"]).content == PNG_BYTES
+
+
+def test_blob_thumbnails_use_the_pregenerated_ones(blob_client, tmp_path, monkeypatch):
+    import io
+
+    from PIL import Image
+
+    import routes.gallery as gallery_routes
+    from services.thumbnail_cache import ThumbnailCache, blob_source, process_saved_image
+
+    client, _ = blob_client
+    cache = ThumbnailCache(str(tmp_path / "thumbs"))
+    monkeypatch.setattr(gallery_routes, "thumbnail_cache", cache)
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (9, 9, 9)).save(buf, format="PNG")
+    digest, _ = blob_store.put(buf.getvalue())
+    cache.put_many(blob_source(digest), process_saved_image(buf.getvalue(), [300])[2])  # as auto-save does
+
+    resp = client.get(f"/api/gallery/blobs/{digest}/thumbnail?max_size=300")
+    assert resp.status_code == 200 and resp.headers["content-type"] == "image/webp"
+    assert "immutable" in resp.headers["cache-control"]
+    assert cache.get_stats()["misses"] == 0
+    small = client.get(f"/api/gallery/blobs/{digest}/thumbnail?max_size=64")  # not pregenerated: rendered once
+    assert Image.open(io.BytesIO(small.content)).size == (64, 48)
+    assert client.get(f"/api/gallery/blobs/{'0' * 64}/thumbnail").status_code == 404
@@ -0,0 +1,96 @@
+"""
+Tests for the bounded per-client outbox behind /api/comfy/ws.
+"""
+import asyncio
+import time
+
+import pytest
+
+import services.websocket_manager as ws_module
+from services.client_outbox import ClientOutbox, OutboxRegistry
+from services.prompt_tracker import PromptTracker
+from services.websocket_manager import ComfyWebSocketManager, Subscription
+
+
+def progress(prompt_id, value):
+    return {"type": "progress", "data": {"prompt_id": prompt_id, "value": value, "max": 20}}
+
+
+def label(item):
+    if isinstance(item, bytes):
+        return item.decode()
+    data = item.get("data", {})
+    return f"{item['type']}:{data.get('prompt_id', '')}:{data.get('value', '')}".rstrip(":")
+
+
+@pytest.mark.asyncio
+async def test_stalled_client_coalesces_progress_and_keeps_terminal_events(monkeypatch):
+    monkeypatch.setattr(ws_module, "prompt_tracker", PromptTracker())
+    manager = ComfyWebSocketManager("http://comfy.test")
+    manager.register_metadata("p1", {"user_id": 1})
+    manager.register_metadata("p2", {"user_id": 1})
+
+    release = asyncio.Event()
+    sent = []
+
+    async def send(item):
+        await release.wait()
+        sent.append(label(item))
+
+    registry = OutboxRegistry()
+    outbox = ClientOutbox(send, maxsize=4, registry=registry).start()
+    await manager.add_client(outbox.put, Subscription(1))
+    await asyncio.sleep(0)
+
+    started = time.monotonic()
+    await manager._broadcast(progress("p1", 1))  # taken by the writer, blocked in send
+    await asyncio.sleep(0)
+    outbox.put(b"preview-1")
+    await manager._broadcast({"type": "crystools.monitor", "data": {"gpus": []}})
+    await manager._broadcast(progress("p1", 2))
+    await manager._broadcast(progress("p1", 3))  # queue is now full
+    await manager._broadcast(progress("p1", 4))  # replaces p1's queued progress
+    await manager._broadcast(progress("p2", 1))
+    outbox.put(b"preview-2")  # pushes out the stale preview-1
+    await manager._broadcast({"type": "executed", "data": {"prompt_id": "p1", "output": {}}})  # pushes out preview-2
+    await manager._broadcast({"type": "gallery_updated", "data": {"prompt_id": "p1", "count": 1}})  # never dropped
+    await manager._broadcast({"type": "crystools.monitor", "data": {"gpus": [1]}})
+    assert time.monotonic() - started < 0.5  # the listener never waited on the client
+
+    release.set()
+    for _ in range(50):
+        if not outbox.items:
+            break
+        await asyncio.sleep(0.01)
+    await outbox.close()
+
+    assert sent == [
+        "progress:p1:1",
+        "progress:p1:4",
+        "progress:p2:1",
+        "executed:p1",
+        "gallery_updated:p1",
+        "crystools.monitor",
+    ]
+    assert outbox.stats["coalesced"] == 3 and outbox.stats["dropped"] == 2
+    assert registry.get_stats()["sent"] == 6
+
+
+@pytest.mark.asyncio
+async def test_client_too_far_behind_is_disconnected():
+    closed = asyncio.Event()
+
+    async def stuck(item):
+        await asyncio.sleep(10)
+
+    async def on_close():
+        closed.set()
+
+    registry = OutboxRegistry()
+    outbox = ClientOutbox(stuck, on_close, maxsize=2, overflow_limit=3, registry=registry)
+    registry.active.add(outbox.start())
+    for i in range(5):
+        outbox.put({"type": "executed", "data": {"prompt_id": f"p{i}"}})
+    await asyncio.wait_for(closed.wait(), 1)
+    assert outbox.closed and registry.overflows == 1 and not registry.active
+    await outbox.close()
@@ -0,0 +1,72 @@
+"""
+Tests for multi-node ComfyUI dispatch and failover.
+"""
+import httpx
+import pytest
+
+from services.comfy_pool import ComfyPool
+
+NODE_A, NODE_B = "http://gpu-a.test", "http://gpu-b.test"
+
+
+def test_rank_prefers_short_queues_model_affinity_and_healthy_nodes():
+    pool = ComfyPool([NODE_A, NODE_B], affinity_weight=2)
+    pool.observe_status(NODE_A, {"status": {"exec_info": {"queue_remaining": 1}}})
+    assert pool.rank(NODE_A) == [NODE_B, NODE_A]
+
+    pool.record_dispatch("p1", NODE_A, "flux1-dev.safetensors")
+    pool.record_dispatch("p2", NODE_B, "sdxl.safetensors")
+    # A has 2 queued vs B's 1, but already has flux loaded: worth a 2-slot swap
+    assert pool.rank(NODE_B, affinity="flux1-dev.safetensors") == [NODE_A, NODE_B]
+    assert pool.rank(NODE_B, affinity="sdxl.safetensors") == [NODE_B, NODE_A]
+    assert pool.node_for("p1") == NODE_A
+
+    pool.mark_down(NODE_B, "refused")
+    assert pool.rank(NODE_A, affinity="sdxl.safetensors") == [NODE_A, NODE_B]
+    # A URL outside the pool (a user's own box) is never spread across it
+    assert pool.rank("http://mine.test") == ["http://mine.test"]
+
+
+@pytest.fixture
+def pool_client(comfy_app):
+    down = {NODE_A}
+    requests = []
+
+    def handler(request: httpx.Request):
+        node = f"{request.url.scheme}://{request.url.host}"
+        requests.append((node, request.url.path))
+        if node in down:
+            raise httpx.ConnectError("connection refused")
+        if request.url.path == "/prompt":
+            return httpx.Response(200, json={"prompt_id": f"pool-p{len(requests)}", "number": 1})
+        if request.url.path == "/view":
+            return httpx.Response(200, stream=httpx.ByteStream(node.encode()), headers={"content-type": "image/png"})
+        return httpx.Response(404)
+
+    env = comfy_app(handler, url=NODE_A, user_id=9, pool=ComfyPool([NODE_A, NODE_B]))
+    return env.client, env.pool, down, requests, env.managers
+
+
+def test_generate_fails_over_and_routes_images_to_the_node(pool_client):
+    client, pool, down, requests, managers = pool_client
+    resp = client.post("/api/comfy/generate", json={"positive_prompt": "x"})
+    assert resp.status_code == 200
+    prompt_id = resp.json()["prompt_id"]
+    assert pool.node_for(prompt_id) == NODE_B
+    assert prompt_id in managers[NODE_B].metadata_store
+    assert not pool.nodes[NODE_A].healthy and pool.failovers == 1
+
+    image = client.get(f"/api/comfy/image?filename=out.png&prompt_id={prompt_id}")
+    assert image.content == NODE_B.encode()
+
+    # Every node down: the last transport error surfaces as 503
+    down.add(NODE_B)
+    assert client.post("/api/comfy/generate", json={"positive_prompt": "x"}).status_code == 503
+
+
+def test_metrics_are_admin_only(comfy_app):
+    env = comfy_app(lambda request: httpx.Response(404), pool=ComfyPool([NODE_A, NODE_B]))
+    assert env.client.get("/api/comfy/metrics").status_code == 403  # would expose every user's nodes
+    env.user.is_admin = True
+    resp = env.client.get("/api/comfy/metrics")
+    assert resp.status_code == 200 and set(resp.json()["comfy_pool"]["nodes"]) == {NODE_A, NODE_B}
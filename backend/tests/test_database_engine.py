@@ -0,0 +1,89 @@
+"""
+Tests for the tuned SQLite engine factory.
+"""
+import threading
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from database import Base, GalleryImage, User, create_async_db_engine, create_db_engine, sqlite_pragmas
+from auth import create_access_token, get_current_user_ws
+
+
+def test_file_engine_applies_pragmas_on_every_connection(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'wal.db'}", pragmas=sqlite_pragmas(busy_timeout_ms=1234))
+    assert isinstance(engine.pool, QueuePool)
+
+    seen = []
+
+    def check():
+        with engine.connect() as conn:
+            seen.append((
+                conn.execute(text("PRAGMA journal_mode")).scalar(),
+                conn.execute(text("PRAGMA synchronous")).scalar(),
+                conn.execute(text("PRAGMA busy_timeout")).scalar(),
+                conn.execute(text("PRAGMA cache_size")).scalar(),
+            ))
+
+    threads = [threading.Thread(target=check) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # journal_mode=wal, synchronous=NORMAL (1), KiB-based cache size
+    assert set(seen) == {("wal", 1, 1234, sqlite_pragmas()["cache_size"])}
+    engine.dispose()
+
+
+def test_reads_proceed_while_a_write_transaction_is_open(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'concurrent.db'}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    writer = Session()
+    writer.add(GalleryImage(prompt_id="w", filename="w.png"))
+    writer.flush()  # holds the write lock until commit
+
+    with Session() as reader:
+        assert reader.query(GalleryImage).count() == 0  # WAL: no "database is locked"
+
+    writer.commit()
+    writer.close()
+    with Session() as reader:
+        assert reader.query(GalleryImage).count() == 1
+    engine.dispose()
+
+
+def test_in_memory_engine_shares_one_connection():
+    engine = create_db_engine("sqlite://")
+    assert isinstance(engine.pool, StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(GalleryImage).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_async_engine_shares_pragmas_and_schema(tmp_path):
+    sync_engine = create_db_engine(f"sqlite:///{tmp_path / 'async.db'}")
+    Base.metadata.create_all(bind=sync_engine)
+    with sessionmaker(bind=sync_engine)() as db:
+        db.add(User(id=7, username="async-user"))
+        db.commit()
+
+    engine = create_async_db_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with Session() as db:
+        assert (await db.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        db.add(GalleryImage(prompt_id="a", filename="a.png", user_id=7))
+        await db.commit()
+        assert await db.scalar(select(GalleryImage.filename)) == "a.png"
+
+        user = await get_current_user_ws(create_access_token(7, "async-user"), db)
+        assert user.username == "async-user"
+        assert await get_current_user_ws("not-a-token", db) is None
+    await engine.dispose()
+    sync_engine.dispose()
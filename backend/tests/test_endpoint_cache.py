@@ -0,0 +1,101 @@
+"""
+Tests for the resolved ComfyUI endpoint cache behind get_comfy_url.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import routes.comfy as comfy_routes
+from auth import get_current_user
+from database import AppConfig, Base, User, create_async_db_engine, create_db_engine, get_db
+from main import app
+from services.endpoint_cache import EndpointCache
+
+
+def test_ttl_expiry_and_stale_generation(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.endpoint_cache.time.monotonic", lambda: now[0])
+    cache = EndpointCache(ttl=10)
+
+    cache.set(1, "http://a", cache.generation)
+    assert cache.get(1) == "http://a"
+    now[0] += 11
+    assert cache.get(1) is None
+
+    # A lookup that started before an invalidation must not repopulate the cache
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.set(1, "http://stale", generation)
+    assert cache.get(1) is None
+    assert cache.get_stats()["hits"] == 1
+
+
+@pytest.fixture
+def endpoint_env(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'endpoints.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    Session = sessionmaker(bind=sync_engine)
+    with Session() as db:
+        db.add_all([User(id=1, username="one"), User(id=2, username="two")])
+        db.add(AppConfig(key="comfyui_url", value="http://one:8188", user_id=1))
+        db.commit()
+
+    async_engine = create_async_db_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    queries = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: queries.append(statement))
+    cache = EndpointCache(ttl=60)
+    monkeypatch.setattr(comfy_routes, "endpoint_cache", cache)
+    monkeypatch.setattr("routes.persistence.endpoint_cache", cache)
+    yield Session, async_sessionmaker(bind=async_engine, expire_on_commit=False), queries, cache
+    sync_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_hot_path_skips_database_after_first_lookup(endpoint_env):
+    _, AsyncSession, queries, cache = endpoint_env
+    one, two = User(id=1, username="one"), User(id=2, username="two")
+    async with AsyncSession() as db:
+        assert await comfy_routes.get_comfy_url(db, one) == "http://one:8188"
+        assert await comfy_routes.get_comfy_url(db, two) == "http://one:8188"  # global fallback
+        issued = len(queries)
+        for _ in range(5):
+            assert await comfy_routes.get_comfy_url(db, one) == "http://one:8188"
+            assert await comfy_routes.get_comfy_url(db, two) == "http://one:8188"
+        assert len(queries) == issued
+    assert cache.get_stats()["hits"] == 10
+    await AsyncSession.kw["bind"].dispose()
+
+
+@pytest.mark.asyncio
+async def test_set_config_invalidates_resolved_endpoints(endpoint_env):
+    Session, AsyncSession, _, cache = endpoint_env
+    one, two = User(id=1, username="one"), User(id=2, username="two")
+    async with AsyncSession() as db:
+        assert await comfy_routes.get_comfy_url(db, two) == "http://one:8188"
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: one
+    try:
+        resp = TestClient(app).post("/api/store/config", json={"key": "comfyui_url", "value": "http://new:8188"})
+        assert resp.status_code == 200
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        if previous:
+            app.dependency_overrides[get_db] = previous
+        else:
+            app.dependency_overrides.pop(get_db, None)
+
+    assert cache.get_stats()["invalidations"] == 1
+    async with AsyncSession() as db:
+        # user two only reads the global fallback, yet sees the new value immediately
+        assert await comfy_routes.get_comfy_url(db, two) == "http://new:8188"
+    await AsyncSession.kw["bind"].dispose()
@@ -0,0 +1,105 @@
+"""
+Tests for keyset-paginated gallery listing (GET /api/gallery/page).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from auth import get_current_user
+from database import Base, get_db, GalleryImage, User
+
+
+@pytest.fixture
+def page_client(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'page.db'}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    user = User(id=1, username="pager", is_admin=False)
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    db = Session()
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    for i in range(7):
+        # Pairs share a timestamp so the id tie-breaker is exercised
+        db.add(GalleryImage(
+            user_id=1, workflow_id="turbo" if i % 2 else "flux", filename=f"img_{i}.png",
+            prompt_positive="p", model="m", width=1, height=1, steps=1, cfg=1.0,
+            image_data="data:image/png;base64,AAAA", image_hash="a" * 64,
+            created_at=base + timedelta(minutes=i // 2),
+        ))
+    db.add(GalleryImage(user_id=2, workflow_id="turbo", filename="other_user.png", created_at=base))
+    db.commit()
+    db.close()
+
+    try:
+        yield TestClient(app), engine
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        if previous:
+            app.dependency_overrides[get_db] = previous
+        else:
+            app.dependency_overrides.pop(get_db, None)
+
+
+def test_pages_cover_everything_once_newest_first(page_client):
+    client, _ = page_client
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/api/gallery/page", params=params)
+        assert resp.status_code == 200
+        body = resp.json()
+        assert len(body["items"]) <= 3
+        seen.extend(item["filename"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [f"img_{i}.png" for i in range(6, -1, -1)]
+
+
+def test_default_projection_skips_image_data(page_client):
+    client, _ = page_client
+    item = client.get("/api/gallery/page", params={"limit": 1}).json()["items"][0]
+    assert "image_data" not in item
+    assert item["image_url"] == f"/api/gallery/blobs/{'a' * 64}"
+
+    item = client.get("/api/gallery/page", params={"limit": 1, "fields": "id,filename"}).json()["items"][0]
+    assert set(item) == {"id", "filename"}
+
+    assert client.get("/api/gallery/page", params={"fields": "password_hash"}).status_code == 400
+    assert client.get("/api/gallery/page", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_workflow_filter(page_client):
+    client, _ = page_client
+    items = client.get("/api/gallery/page", params={"workflow_id": "turbo"}).json()["items"]
+    assert [i["filename"] for i in items] == ["img_5.png", "img_3.png", "img_1.png"]
+
+
+def test_keyset_query_uses_composite_index(page_client):
+    _, engine = page_client
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM gallery WHERE user_id = 1 AND workflow_id = 'turbo' "
+            "AND created_at <= '2026-01-01 12:02:00' ORDER BY created_at DESC, id DESC LIMIT 4"
+        )).fetchall()
+    detail = " ".join(str(row[-1]) for row in plan)
+    assert "ix_gallery_user_workflow_created_id" in detail
+    assert "TEMP B-TREE" not in detail
@@ -0,0 +1,184 @@
+"""
+Tests for the model-affinity generation scheduler.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+import services.generation_scheduler as scheduler_module
+from services.comfy_pool import ComfyPool
+from services.generation_scheduler import GenerationScheduler, Job, QueueFullError, model_key
+from services.prompt_tracker import PromptTracker
+from services.workflow_registry import workflow_registry
+
+URL = "http://gpu.test"
+FLUX, TURBO = "flux1-dev.safetensors", "z-image-turbo-bf16-aio.safetensors"
+
+
+@pytest.fixture
+def env(monkeypatch):
+    tracker = PromptTracker()
+    monkeypatch.setattr(scheduler_module, "prompt_tracker", tracker)
+    monkeypatch.setattr(scheduler_module, "comfy_pool", ComfyPool([]))
+    submitted = []
+
+    def job(prompt_id, model, user_id=1):
+        async def submit(node_url, pid):
+            submitted.append(pid)
+            tracker.register(pid, user_id)
+            return pid
+        return Job(prompt_id, URL, model, user_id, submit)
+
+    return tracker, submitted, job
+
+
+def test_model_key_covers_checkpoints_and_upscaler():
+    upscale = workflow_registry.get("upscale").build({})
+    assert "seedvr2_ema_7b_sharp_fp16.safetensors" in model_key(upscale)
+    assert model_key(workflow_registry.get("flux").build({})) == FLUX
+    assert model_key(workflow_registry.get("turbo_aio").build({"model": "x.safetensors"})) == "x.safetensors"
+
+
+@pytest.mark.asyncio
+async def test_held_jobs_are_grouped_by_loaded_model(env):
+    tracker, submitted, job = env
+    scheduler = GenerationScheduler(inflight_per_node=1, max_skips=4, swap_seconds=30)
+
+    assert await scheduler.submit(job("f1", FLUX)) == "f1"  # idle: straight to ComfyUI
+    for prompt_id, model in (("t1", TURBO), ("f2", FLUX), ("t2", TURBO), ("f3", FLUX)):
+        assert await scheduler.submit(job(prompt_id, model)) == prompt_id
+    assert submitted == ["f1"]
+    assert tracker.get("t1").status == "pending"  # held jobs are tracked from the start
+
+    for done in ("f1", "f2", "f3", "t1"):
+        tracker.handle_event("execution_success", {"prompt_id": done})
+        for _ in range(50):
+            if len(submitted) > ["f1", "f2", "f3", "t1"].index(done) + 1:
+                break
+            await asyncio.sleep(0.02)
+    await scheduler.stop()
+
+    assert submitted == ["f1", "f2", "f3", "t1", "t2"]  # one swap instead of four
+    stats = scheduler.get_stats()
+    assert stats["swaps"] == 1 and stats["swaps_avoided"] == 2
+    assert stats["swap_seconds_saved"] == 60 and stats["waiting"] == 0
+
+
+def _run_picks(scheduler, queue, loaded, n):
+    picked = []
+    for _ in range(n):
+        job = scheduler._pick(queue, loaded)
+        scheduler._charge(job)  # what _dispatch does once ComfyUI accepts it
+        picked.append(job.prompt_id)
+    return picked
+
+
+def test_fair_queuing_bounds_affinity_across_users(env):
+    _, _, job = env
+    scheduler = GenerationScheduler()
+    queue = [job("t1", TURBO, user_id=2), job("f1", FLUX), job("f2", FLUX), job("f3", FLUX)]
+    # User 1 may run ahead by one job to keep flux loaded, then user 2 is served despite the swap
+    assert _run_picks(scheduler, queue, FLUX, 3) == ["f1", "f2", "t1"]
+    assert scheduler.fairness_overrides == 1 and scheduler.swaps_avoided == 2
+
+
+def test_weights_and_skip_bound_within_a_user(env):
+    _, _, job = env
+    scheduler = GenerationScheduler(max_skips=1)
+    queue = [job(f"a{i}", FLUX, user_id=1) for i in range(6)] + [job(f"b{i}", FLUX, user_id=2) for i in range(3)]
+    for j in queue[:6]:
+        j.weight = 2.0
+    assert _run_picks(scheduler, queue, FLUX, 6) == ["a0", "a1", "a2", "b0", "a3", "a4"]
+
+    own = [job("t1", TURBO), job("f1", FLUX), job("f2", FLUX)]
+    assert _run_picks(scheduler, own, FLUX, 2) == ["f1", "t1"]  # t1 overtaken once, then due
+
+
+@pytest.mark.asyncio
+async def test_held_job_fails_after_retries(env, monkeypatch):
+    tracker, _, job = env
+    monkeypatch.setattr(scheduler_module, "RECHECK_INTERVAL", 0.01)
+    scheduler = GenerationScheduler(inflight_per_node=1)
+    await scheduler.submit(job("busy", FLUX))
+
+    async def refused(node_url, pid):
+        raise httpx.ConnectError("refused")
+
+    held = job("h1", TURBO)
+    held.submit = refused
+    await scheduler.submit(held)
+    tracker.handle_event("execution_success", {"prompt_id": "busy"})
+    for _ in range(100):
+        if tracker.get("h1").status == "failed":
+            break
+        await asyncio.sleep(0.01)
+    await scheduler.stop()
+    assert tracker.get("h1").status == "failed" and "refused" in tracker.get("h1").error
+    assert scheduler.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_held_job_follows_the_id_comfyui_assigned(env):
+    tracker, _, job = env
+    scheduler = GenerationScheduler(inflight_per_node=1)
+    await scheduler.submit(job("a", FLUX))
+
+    async def ignores_our_id(node_url, pid):
+        tracker.register("comfy-2", 1)  # what register_metadata does with the returned id
+        return "comfy-2"
+
+    held = job("b", FLUX)
+    held.submit = ignores_our_id
+    assert await scheduler.submit(held) == "b"  # the client only ever learns "b"
+    tracker.register_batch("batch", [{"index": 0, "prompt_id": "b", "error": None}], 1)
+    tracker.handle_event("execution_success", {"prompt_id": "a"})
+    for _ in range(50):
+        if tracker.get("comfy-2") is tracker.get("b"):
+            break
+        await asyncio.sleep(0.02)
+    await scheduler.stop()
+
+    tracker.handle_event("execution_start", {"prompt_id": "comfy-2"})
+    tracker.handle_event("execution_success", {"prompt_id": "comfy-2"})
+    assert tracker.get("b").status == "completed"
+    assert tracker.batch_snapshot("batch")["items"][0]["prompt_id"] == "comfy-2"
+    assert "comfy-2" in scheduler.inflight[URL]
+
+
+@pytest.mark.asyncio
+async def test_admission_bounds_and_positions(env):
+    _, _, job = env
+    scheduler = GenerationScheduler(inflight_per_node=1, max_queue=4, max_queue_per_user=2)
+    await scheduler.submit(job("run", FLUX, user_id=1))
+    await scheduler.submit(job("a1", FLUX, user_id=1))
+    await scheduler.submit(job("a2", FLUX, user_id=1))
+    with pytest.raises(QueueFullError) as full:
+        await scheduler.submit(job("a3", FLUX, user_id=1))
+    assert full.value.retry_after >= 1
+    await scheduler.submit(job("b1", TURBO, user_id=2))
+    await scheduler.submit(job("b2", TURBO, user_id=2))
+    with pytest.raises(QueueFullError):
+        await scheduler.submit(job("c1", TURBO, user_id=3))  # global bound
+    await scheduler.stop()
+
+    status = scheduler.queue_status(URL, 2)
+    assert status["waiting"] == 4 and status["inflight"] == {URL: 1}
+    # b1 goes right after a1 under fair sharing, not behind all of user 1's jobs
+    assert [(j["prompt_id"], j["position"]) for j in status["jobs"]] == [("b1", 2), ("b2", 4)]
+    assert status["jobs"][0]["eta_seconds"] < status["jobs"][1]["eta_seconds"]
+    assert scheduler.get_stats()["rejected"] == 2
+
+
+def test_queue_full_maps_to_429(comfy_app):
+    requests = []
+
+    def handler(request: httpx.Request):
+        requests.append(request.url.path)
+        return httpx.Response(404)  # no catalog to validate against
+
+    env = comfy_app(handler, url=URL, user_id=4, scheduler=GenerationScheduler(max_queue_per_user=0))
+    resp = env.client.post("/api/comfy/generate/batch", json={"positive_prompt": "x", "count": 3})
+    assert resp.status_code == 429
+    assert int(resp.headers["retry-after"]) >= 1
+    assert "/prompt" not in requests  # rejected before anything reached ComfyUI
@@ -0,0 +1,69 @@
+"""
+Tests for the pooled ComfyUI httpx client registry.
+"""
+import asyncio
+import pytest
+
+from services.http_client_pool import ComfyClientPool, _pool_key
+
+
+async def _start_keepalive_server():
+    """Minimal HTTP/1.1 server that keeps connections alive."""
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Type: application/json\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+def test_pool_key_groups_by_origin_and_proxy_mode():
+    assert _pool_key("http://192.168.0.14:8188/queue") == _pool_key("http://192.168.0.14:8188/history/x")
+    assert _pool_key("http://100.64.0.1:8188")[1] == "tailscale"
+    assert _pool_key("http://192.168.0.14:8188")[1] == "direct"
+    assert _pool_key("http://192.168.0.14:8188") != _pool_key("http://192.168.0.15:8188")
+
+
+@pytest.mark.asyncio
+async def test_same_backend_shares_one_client():
+    pool = ComfyClientPool()
+    a = pool.get_client("http://192.168.0.14:8188")
+    b = pool.get_client("http://192.168.0.14:8188/view")
+    c = pool.get_client("http://100.64.0.1:8188")
+    assert a is b
+    assert a is not c
+    await pool.aclose()
+    assert a.is_closed and c.is_closed
+    assert pool.clients == {}
+
+
+@pytest.mark.asyncio
+async def test_connections_are_reused_and_counted():
+    server, url = await _start_keepalive_server()
+    pool = ComfyClientPool()
+    try:
+        client = pool.get_client(url)
+        for _ in range(5):
+            resp = await client.get(f"{url}/queue", timeout=5.0)
+            assert resp.status_code == 200
+
+        stats = next(iter(pool.get_stats().values()))
+        assert stats["requests"] == 5
+        assert stats["new_connections"] == 1
+        assert stats["reused"] == 4
+        assert stats["connections_open"] == 1
+        assert stats["waiting"] == 0
+    finally:
+        await pool.aclose()
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,65 @@
+"""
+Tests for the CPU-bound image executor.
+"""
+import asyncio
+import io
+import time
+
+import pytest
+from PIL import Image
+
+from services.image_executor import ImageExecutor
+from services.thumbnail_cache import process_saved_image
+
+
+def _png(width, height) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (10, 20, 30)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _slow_square(x):
+    time.sleep(0.1)
+    return x * x
+
+
+@pytest.mark.asyncio
+async def test_process_pool_runs_image_work_and_records_latency():
+    executor = ImageExecutor(workers=2, queue_size=4)
+    try:
+        width, height, thumbs = await executor.run("auto_save", process_saved_image, _png(800, 600), [100, 300])
+        assert (width, height) == (800, 600)
+        assert Image.open(io.BytesIO(thumbs[300])).size == (300, 225)
+        assert Image.open(io.BytesIO(thumbs[100])).size == (100, 75)
+
+        stats = executor.get_stats()
+        assert stats["tasks"]["auto_save"]["completed"] == 1
+        assert stats["tasks"]["auto_save"]["avg_ms"] > 0
+        assert stats["queue_depth"] == 0 and stats["running"] == 0
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_bounded_queue_applies_backpressure():
+    executor = ImageExecutor(workers=0, queue_size=1)
+    first = asyncio.create_task(executor.run("slow", _slow_square, 3))
+    second = asyncio.create_task(executor.run("slow", _slow_square, 4))
+    await asyncio.sleep(0.03)
+
+    stats = executor.get_stats()
+    assert stats["running"] == 1
+    assert stats["queue_depth"] == 1
+
+    assert await first == 9
+    assert await second == 16
+    assert executor.get_stats()["tasks"]["slow"]["completed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_are_counted_and_release_the_slot():
+    executor = ImageExecutor(workers=0, queue_size=1)
+    with pytest.raises(Exception):
+        await executor.run("bad", process_saved_image, b"not an image", [100])
+    assert executor.get_stats()["tasks"]["bad"]["failed"] == 1
+    assert await executor.run("slow", _slow_square, 2) == 4
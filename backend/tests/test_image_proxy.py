@@ -0,0 +1,63 @@
+"""
+Tests for the streaming /api/comfy/image proxy.
+"""
+import httpx
+import pytest
+
+IMAGE = bytes(range(256)) * 64
+ETAG = '"abc123"'
+
+
+def _comfy_view(request: httpx.Request) -> httpx.Response:
+    """Fake ComfyUI /view with ETag + Range support."""
+    if request.url.params.get("filename") == "missing.png":
+        return httpx.Response(404, text="not found")
+    common = {"ETag": ETAG, "Last-Modified": "Wed, 01 Jan 2026 00:00:00 GMT", "Accept-Ranges": "bytes", "Content-Type": "image/png"}
+    if request.headers.get("if-none-match") == ETAG:
+        return httpx.Response(304, headers=common)
+    rng = request.headers.get("range")
+    if rng:
+        start, end = (int(x) for x in rng.removeprefix("bytes=").split("-"))
+        return httpx.Response(206, stream=httpx.ByteStream(IMAGE[start:end + 1]),
+                              headers={**common, "Content-Range": f"bytes {start}-{end}/{len(IMAGE)}"})
+    return httpx.Response(200, stream=httpx.ByteStream(IMAGE), headers={**common, "Content-Length": str(len(IMAGE))})
+
+
+@pytest.fixture
+def proxy_client(comfy_app):
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return _comfy_view(request)
+
+    return comfy_app(handler).client, seen
+
+
+def test_full_image_streams_with_validators(proxy_client):
+    client, seen = proxy_client
+    resp = client.get("/api/comfy/image", params={"filename": "a b.png", "subfolder": "z-image"})
+    assert resp.status_code == 200
+    assert resp.content == IMAGE
+    assert resp.headers["content-length"] == str(len(IMAGE))
+    assert resp.headers["etag"] == ETAG
+    assert resp.headers["last-modified"] == "Wed, 01 Jan 2026 00:00:00 GMT"
+    assert seen[0].url.params["filename"] == "a b.png"
+    assert seen[0].url.params["subfolder"] == "z-image"
+
+
+def test_range_and_conditional_requests_are_forwarded(proxy_client):
+    client, _ = proxy_client
+    resp = client.get("/api/comfy/image", params={"filename": "a.png"}, headers={"Range": "bytes=10-19"})
+    assert resp.status_code == 206
+    assert resp.content == IMAGE[10:20]
+    assert resp.headers["content-range"] == f"bytes 10-19/{len(IMAGE)}"
+
+    resp = client.get("/api/comfy/image", params={"filename": "a.png"}, headers={"If-None-Match": ETAG})
+    assert resp.status_code == 304
+    assert resp.content == b""
+
+
+def test_upstream_errors_pass_through(proxy_client):
+    client, _ = proxy_client
+    assert client.get("/api/comfy/image", params={"filename": "missing.png"}).status_code == 404
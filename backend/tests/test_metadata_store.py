@@ -0,0 +1,110 @@
+"""
+Tests for the bounded, persisted prompt metadata store.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import services.metadata_store as store_module
+import services.websocket_manager as ws_module
+from database import Base, create_async_db_engine, create_db_engine
+from services.metadata_store import PromptMetadataStore
+from services.prompt_tracker import PromptTracker
+from services.websocket_manager import ComfyWebSocketManager
+
+URL = "http://comfy.test"
+
+
+def test_ttl_and_size_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(store_module.time, "time", lambda: now[0])
+    store = PromptMetadataStore(URL, ttl=60, max_entries=2)
+
+    store.put("a", {"user_id": 1})
+    now[0] += 30
+    store.put("b", {"user_id": 1})
+    store.put("c", {"user_id": 2})  # over max_entries: oldest goes
+    assert "a" not in store and store.get("c") == {"user_id": 2}
+    now[0] += 61
+    assert "b" not in store and "c" not in store
+    stats = store.get_stats()
+    assert stats["size"] == 0 and stats["evicted"] == 1 and stats["expired"] == 2
+
+
+def test_metadata_released_once_finished_and_saved(monkeypatch):
+    tracker = PromptTracker()
+    monkeypatch.setattr(ws_module, "prompt_tracker", tracker)
+    manager = ComfyWebSocketManager(URL)
+    manager.register_metadata("p1", {"user_id": 1})
+
+    tracker.save_started("p1")  # an `executed` output is being saved
+    tracker.handle_event("execution_success", {"prompt_id": "p1"})
+    manager.release_if_done("p1")
+    assert "p1" in manager.metadata_store  # still needed by the pending save
+
+    tracker.save_finished("p1")
+    manager.release_if_done("p1")
+    assert "p1" not in manager.metadata_store
+    assert manager.get_stats()["metadata"]["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_in_flight_prompts_survive_a_restart(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'metadata.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    async_engine = create_async_db_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    monkeypatch.setattr(store_module, "AsyncSessionLocal", async_sessionmaker(bind=async_engine, expire_on_commit=False))
+
+    before = PromptMetadataStore(URL)
+    before.put("early", {"user_id": 1})  # registered before the table was read
+    await before.open()
+    before.put("running", {"user_id": 1, "workflow_id": "flux"})
+    before.put("done", {"user_id": 2})
+    before.complete("done")
+    await before.close()
+    assert before.get_stats()["unflushed"] == 0
+
+    after = PromptMetadataStore(URL)
+    other_node = PromptMetadataStore("http://other.test")
+    await after.open()
+    await other_node.open()
+    assert after.pending_ids() == ["early", "running"]
+    assert after.get("running") == {"user_id": 1, "workflow_id": "flux"}
+    assert after.get_stats()["restored"] == 2 and len(other_node) == 0
+    await after.close()
+    await other_node.close()
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried_without_new_changes(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'metadata.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    async_engine = create_async_db_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    Session = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    calls = []
+
+    def flaky_session():
+        calls.append(1)
+        if len(calls) == 2:  # the first flush after open() hits a locked database
+            raise RuntimeError("database is locked")
+        return Session()
+
+    monkeypatch.setattr(store_module, "AsyncSessionLocal", flaky_session)
+    monkeypatch.setattr(store_module, "METADATA_FLUSH_DELAY", 0.01)
+    store = PromptMetadataStore(URL)
+    await store.open()
+    store.put("p1", {"user_id": 1})
+    for _ in range(100):
+        if store.get_stats()["persisted"]:
+            break
+        await asyncio.sleep(0.01)
+    stats = store.get_stats()
+    assert stats["persist_errors"] == 1 and stats["persisted"] == 1 and stats["unflushed"] == 0
+    await store.close()
+    await async_engine.dispose()
+    sync_engine.dispose()
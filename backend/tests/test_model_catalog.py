@@ -0,0 +1,100 @@
+"""
+Tests for the cached ComfyUI model catalog and request validation.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from services.model_catalog import CatalogValidationError, ModelCatalog
+
+OBJECT_INFO = {"KSampler": {"input": {"required": {
+    "sampler_name": [["euler", "res_multistep"]],
+    "scheduler": ["COMBO", {"options": ["normal", "simple"]}],
+}}}}
+
+
+def _comfy(installed, calls, prompts):
+    def handler(request: httpx.Request):
+        path = request.url.path
+        calls.append(path)
+        if path == "/prompt":
+            prompts.append(request)
+            return httpx.Response(200, json={"prompt_id": f"cat-p{len(prompts)}", "number": len(prompts)})
+        if path == "/object_info/KSampler":
+            return httpx.Response(200, json=OBJECT_INFO)
+        folder = path.removeprefix("/models/")
+        if folder in installed:
+            return httpx.Response(200, json=installed[folder])
+        return httpx.Response(404)
+    return handler
+
+
+@pytest.fixture
+def catalog_client(comfy_app):
+    installed = {"checkpoints": ["sdxl.safetensors"], "diffusion_models": ["flux1-dev.safetensors"],
+                 "loras": ["detail.safetensors"]}
+    calls, prompts = [], []
+    env = comfy_app(_comfy(installed, calls, prompts), user_id=3)
+    return env.client, installed, calls, prompts, env.catalog
+
+
+def test_models_and_loras_are_cached_with_etags(catalog_client):
+    client, _, calls, _, _ = catalog_client
+    resp = client.get("/api/comfy/models")
+    assert resp.status_code == 200
+    assert resp.json() == {"models": ["flux1-dev.safetensors", "sdxl.safetensors"]}
+    fetches = len(calls)
+
+    again = client.get("/api/comfy/models", headers={"If-None-Match": resp.headers["etag"]})
+    assert again.status_code == 304
+    loras = client.get("/api/comfy/loras")
+    assert loras.json() == {"loras": ["detail.safetensors"]}
+    assert loras.headers["etag"] != resp.headers["etag"]
+    assert client.get("/api/comfy/samplers").json() == {"samplers": ["euler", "res_multistep"]}
+    assert len(calls) == fetches  # everything after the first request came from memory
+
+
+def test_generate_rejects_unknown_names_before_queuing(catalog_client):
+    client, installed, _, prompts, catalog = catalog_client
+    resp = client.post("/api/comfy/generate", json={"positive_prompt": "x", "model": "missing.safetensors"})
+    assert resp.status_code == 400 and "missing.safetensors" in resp.json()["detail"]
+    resp = client.post("/api/comfy/generate/batch", json={"positive_prompt": "x", "count": 3,
+                                                          "lora_names": ["detail.safetensors", "nope"]})
+    assert resp.status_code == 400 and "'nope'" in resp.json()["detail"]
+    assert prompts == [] and catalog.rejections == 2
+
+    # A model installed after the catalog was built is found by the forced refresh
+    installed["checkpoints"].append("new.safetensors")
+    catalog.entries["http://comfy.test"].fetched_at -= 10
+    resp = client.post("/api/comfy/generate", json={"positive_prompt": "x", "model": "new.safetensors",
+                                                    "lora_names": ["detail.safetensors"]})
+    assert resp.status_code == 200
+    assert len(prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate_and_offline_backend():
+    installed = {"checkpoints": ["a.safetensors"], "loras": []}
+    calls = []
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_comfy(installed, calls, [])))
+    catalog = ModelCatalog(ttl=60, stale_ttl=3600)
+
+    first = await catalog.get("http://comfy.test", client)
+    installed["checkpoints"].append("b.safetensors")
+    first.fetched_at -= 120
+    stale = await catalog.get("http://comfy.test", client)
+    assert stale is first and catalog.stale_hits == 1  # served immediately...
+    await asyncio.sleep(0.05)
+    fresh = await catalog.get("http://comfy.test", client)
+    assert fresh.data["models"] == ["a.safetensors", "b.safetensors"]  # ...refreshed behind the scenes
+
+    def offline(request):
+        raise httpx.ConnectError("refused")
+
+    down = httpx.AsyncClient(transport=httpx.MockTransport(offline))
+    assert await catalog.get("http://down.test", down) is None
+    await catalog.validate("http://down.test", down, model="anything")  # no catalog: not blocking
+    assert catalog.refresh_errors == 1 and "http://down.test" in catalog.get_stats()["errors"]
+    with pytest.raises(CatalogValidationError):
+        await catalog.validate("http://comfy.test", client, sampler_name="bogus")
@@ -0,0 +1,90 @@
+"""
+Tests for the bounded bcrypt pool and transparent rehash on login.
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import routes.auth as auth_routes
+from database import Base, User, create_async_db_engine, create_db_engine, get_async_db
+from main import app
+from services.password_hasher import PasswordHasher, hash_password_sync, hash_rounds
+
+
+@pytest.mark.asyncio
+async def test_pool_caps_concurrency_and_verifies():
+    hasher = PasswordHasher(rounds=4, workers=2, max_pending=2)
+    try:
+        hashes = await asyncio.gather(*[hasher.hash(f"pw{i}") for i in range(6)])
+        assert all(hash_rounds(h) == 4 for h in hashes)
+        assert await hasher.verify("pw3", hashes[3])
+        assert not await hasher.verify("wrong", hashes[3])
+        assert not await hasher.verify("pw", "not-a-bcrypt-hash")
+
+        stats = hasher.get_stats()
+        assert (stats["hashed"], stats["verified"], stats["running"], stats["queue_depth"]) == (6, 3, 0, 0)
+    finally:
+        hasher.shutdown()
+
+
+def test_needs_rehash_follows_policy():
+    hasher = PasswordHasher(rounds=5)
+    assert hasher.needs_rehash(hash_password_sync("x", rounds=4))
+    assert not hasher.needs_rehash(hash_password_sync("x", rounds=5))
+
+
+@pytest.fixture
+def login_env(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'login.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    Session = sessionmaker(bind=sync_engine)
+    with Session() as db:
+        db.add(User(id=1, username="bob", password_hash=hash_password_sync("hunter2", rounds=4)))
+        db.commit()
+
+    AsyncSession = async_sessionmaker(
+        bind=create_async_db_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1)), expire_on_commit=False
+    )
+
+    async def override_get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    hasher = PasswordHasher(rounds=5, workers=1)
+    monkeypatch.setattr(auth_routes, "password_hasher", hasher)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    try:
+        yield TestClient(app), Session, hasher
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+        hasher.shutdown()
+        sync_engine.dispose()
+
+
+def test_login_rehashes_when_cost_policy_changes(login_env):
+    client, Session, hasher = login_env
+    assert client.post("/api/auth/login", json={"username": "bob", "password": "nope"}).status_code == 401
+
+    resp = client.post("/api/auth/login", json={"username": "bob", "password": "hunter2"})
+    assert resp.status_code == 200 and resp.json()["token"]
+    with Session() as db:
+        assert hash_rounds(db.get(User, 1).password_hash) == 5
+    assert hasher.rehashed == 1
+
+    # Already at the policy cost: no second rehash
+    assert client.post("/api/auth/login", json={"username": "bob", "password": "hunter2"}).status_code == 200
+    assert hasher.rehashed == 1
+
+
+def test_register_hashes_with_policy_cost(login_env):
+    client, Session, _ = login_env
+    resp = client.post("/api/auth/register", json={"username": "carol", "password": "pw"})
+    assert resp.status_code == 200
+    assert client.post("/api/auth/register", json={"username": "carol", "password": "pw"}).status_code == 400
+    with Session() as db:
+        carol = db.query(User).filter(User.username == "carol").one()
+        assert hash_rounds(carol.password_hash) == 5 and not carol.is_admin
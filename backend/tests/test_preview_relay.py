@@ -0,0 +1,82 @@
+"""
+Tests for relaying ComfyUI binary preview frames to the prompt owner.
+"""
+import asyncio
+import io
+import json
+import struct
+
+import pytest
+from PIL import Image
+
+import services.websocket_manager as ws_module
+from services.preview_relay import PreviewRelay, decode_frame
+from services.prompt_tracker import PromptTracker
+from services.websocket_manager import ComfyWebSocketManager, Subscription
+
+
+def jpeg(size=64):
+    buf = io.BytesIO()
+    Image.new("RGB", (size, size), "red").save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def preview_frame(image, prompt_id=None):
+    if prompt_id is None:
+        return struct.pack(">II", 1, 1) + image  # PREVIEW_IMAGE, JPEG
+    metadata = json.dumps({"prompt_id": prompt_id, "node_id": "9", "image_type": "image/jpeg"}).encode()
+    return struct.pack(">II", 4, len(metadata)) + metadata + image
+
+
+def test_decode_frame_types():
+    image = jpeg()
+    plain = decode_frame(preview_frame(image))
+    assert plain.mime == "image/jpeg" and plain.image == image and plain.prompt_id is None
+    tagged = decode_frame(preview_frame(image, "p1"))
+    assert tagged.prompt_id == "p1" and tagged.metadata["node_id"] == "9" and tagged.image == image
+    assert decode_frame(struct.pack(">II", 3, 0) + b"text") is None  # not a preview
+    assert decode_frame(b"\x00\x00") is None
+
+
+async def _wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_previews_reach_only_the_owner_rate_limited_and_downscaled(monkeypatch):
+    monkeypatch.setattr(ws_module, "prompt_tracker", PromptTracker())
+    manager = ComfyWebSocketManager("http://comfy.test")
+    manager.preview_relay = PreviewRelay(min_interval=60, max_size=16)
+    manager.register_metadata("p1", {"user_id": 1})
+    inboxes = {}
+    for name, subscription in (
+        ("owner", Subscription(1)),
+        ("other", Subscription(2)),
+        ("watcher", Subscription(3, is_admin=True, watch_all=True)),
+        ("internal", None),
+    ):
+        inbox = inboxes[name] = []
+        await manager.add_client(inbox.append, subscription)
+
+    manager.current_prompt_id = "p1"
+    manager._handle_preview(preview_frame(jpeg()))  # attributed to the running prompt
+    manager._handle_preview(preview_frame(jpeg(), "p1"))  # within the interval: skipped
+    await _wait_for(lambda: inboxes["owner"])
+
+    assert [len(inbox) for inbox in inboxes.values()] == [1, 0, 0, 0]
+    frame = decode_frame(inboxes["owner"][0])
+    assert frame.prompt_id == "p1"
+    assert Image.open(io.BytesIO(frame.image)).size == (16, 16)
+    stats = manager.get_stats()["previews"]
+    assert stats["relayed"] == 1 and stats["throttled"] == 1 and stats["reencoded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_previews_within_max_size_are_not_reencoded():
+    relay = PreviewRelay(min_interval=0, max_size=64)
+    image = jpeg(32)
+    out = decode_frame(await relay.render("p1", decode_frame(preview_frame(image, "p1"))))
+    assert out.image == image and relay.get_stats()["reencoded"] == 0
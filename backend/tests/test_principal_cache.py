@@ -0,0 +1,115 @@
+"""
+Tests for the authenticated-principal cache used by get_current_user.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import auth
+from database import Base, User, create_async_db_engine, create_db_engine, get_async_db, get_db
+from main import app
+from services.principal_cache import PrincipalCache, token_key
+
+
+class _Principal:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+def test_lru_ttl_and_per_user_invalidation(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("services.principal_cache.time.monotonic", lambda: now[0])
+    cache = PrincipalCache(max_size=2, ttl=30)
+
+    cache.put("tailscale:a", _Principal(1))
+    cache.put("jwt:b", _Principal(1), expires_at=5)  # token expires before the TTL
+    assert cache.get("tailscale:a").id == 1  # a is now most recently used
+    cache.put("jwt:c", _Principal(2))
+    assert cache.get("jwt:b") is None  # evicted as least recently used
+    assert cache.evictions == 1
+
+    now[0] = 10
+    cache.put("jwt:b", _Principal(1), expires_at=12)
+    now[0] = 13
+    assert cache.get("jwt:b") is None  # capped at the token's exp
+
+    cache.put("jwt:b", _Principal(1))
+    cache.invalidate_user(1)
+    assert cache.get("tailscale:a") is None and cache.get("jwt:b") is None
+    assert cache.get("jwt:c").id == 2
+    assert cache.get_stats()["hit_rate"] > 0
+
+
+def test_token_key_is_a_fingerprint():
+    key = token_key("secret.jwt.value")
+    assert "secret" not in key and key.startswith("jwt:")
+
+
+@pytest.fixture
+def auth_env(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'auth.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    Session = sessionmaker(bind=sync_engine)
+    with Session() as db:
+        db.add(User(id=1, username="alice", display_name="Alice", tailscale_login="alice@example.com"))
+        db.commit()
+
+    async_engine = create_async_db_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    user_queries = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: user_queries.append(statement) if "FROM users" in statement else None)
+
+    async def override_get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    cache = PrincipalCache()
+    monkeypatch.setattr(auth, "principal_cache", cache)
+    monkeypatch.setattr("routes.auth.principal_cache", cache)
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield TestClient(app), user_queries, cache
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+        if previous:
+            app.dependency_overrides[get_db] = previous
+        else:
+            app.dependency_overrides.pop(get_db, None)
+        sync_engine.dispose()
+
+
+def test_repeated_requests_skip_user_lookups(auth_env):
+    client, user_queries, cache = auth_env
+    headers = {"Authorization": f"Bearer {auth.create_access_token(1, 'alice')}"}
+    for _ in range(5):
+        assert client.get("/api/auth/me", headers=headers).json()["username"] == "alice"
+    ts = {"Tailscale-User-Login": "alice@example.com"}
+    for _ in range(5):
+        assert client.get("/api/auth/me", headers=ts).status_code == 200
+
+    assert len(user_queries) == 2  # one per credential, then served from memory
+    assert cache.get_stats()["hits"] == 8
+    assert client.get("/api/auth/me", headers={"Authorization": "Bearer bogus"}).status_code == 401
+
+
+def test_profile_update_invalidates_cached_principal(auth_env):
+    client, user_queries, cache = auth_env
+    headers = {"Authorization": f"Bearer {auth.create_access_token(1, 'alice')}"}
+    assert client.get("/api/auth/me", headers=headers).json()["display_name"] == "Alice"
+
+    resp = client.patch("/api/auth/me", json={"display_name": "Alice B."}, headers=headers)
+    assert resp.status_code == 200
+    assert cache.get_stats()["invalidations"] == 1
+
+    assert client.get("/api/auth/me", headers=headers).json()["display_name"] == "Alice B."
+    assert len(user_queries) == 2  # re-resolved after the profile change
@@ -0,0 +1,102 @@
+"""
+Tests for the WS-driven prompt status tracker and its long-poll endpoint.
+"""
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from auth import get_current_user
+from database import User
+from services.prompt_tracker import PromptTracker, prompt_tracker
+
+
+def test_state_machine_happy_path():
+    tracker = PromptTracker()
+    tracker.register("p1", user_id=1)
+    assert tracker.get("p1").status == "pending"
+
+    tracker.handle_event("execution_start", {"prompt_id": "p1"})
+    tracker.handle_event("progress", {"prompt_id": "p1", "value": 3, "max": 8})
+    state = tracker.get("p1")
+    assert state.status == "processing"
+    assert (state.progress_value, state.progress_max) == (3, 8)
+
+    tracker.handle_event("executed", {"prompt_id": "p1", "node": "7", "output": {
+        "images": [{"filename": "a.png", "subfolder": "", "type": "output"},
+                   {"filename": "preview.png", "subfolder": "", "type": "temp"}]
+    }})
+    tracker.save_started("p1")
+    tracker.handle_event("executing", {"prompt_id": "p1", "node": None})
+    assert state.status == "saving"
+
+    tracker.save_finished("p1")
+    snapshot = state.snapshot()
+    assert snapshot["status"] == "completed"
+    assert snapshot["ready"] is True
+    assert snapshot["filenames"] == ["a.png"]
+    assert snapshot["image_url"] == "/api/comfy/image?filename=a.png&type=output&prompt_id=p1"
+
+
+def test_error_and_interrupt_are_terminal():
+    tracker = PromptTracker()
+    tracker.register("bad")
+    tracker.register("stop")
+    tracker.handle_event("execution_error", {"prompt_id": "bad", "exception_message": "OOM"})
+    tracker.handle_event("execution_interrupted", {"prompt_id": "stop"})
+    assert tracker.get("bad").status == "failed"
+    assert tracker.get("bad").error == "OOM"
+    assert tracker.get("stop").status == "interrupted"
+
+    # Late events do not resurrect a finished prompt
+    tracker.handle_event("execution_start", {"prompt_id": "bad"})
+    assert tracker.get("bad").status == "failed"
+
+
+def test_untracked_prompts_are_ignored():
+    tracker = PromptTracker()
+    tracker.handle_event("execution_start", {"prompt_id": "someone-elses"})
+    assert tracker.get("someone-elses") is None
+
+
+@pytest.mark.asyncio
+async def test_long_poll_wakes_on_change():
+    tracker = PromptTracker()
+    tracker.register("p2")
+
+    async def advance():
+        await asyncio.sleep(0.05)
+        tracker.handle_event("execution_start", {"prompt_id": "p2"})
+
+    asyncio.create_task(advance())
+    snapshot = await tracker.wait_for_update("p2", since=0, timeout=5)
+    assert snapshot["status"] == "processing"
+    assert snapshot["version"] == 1
+
+    # Nothing new: returns current snapshot after the timeout
+    snapshot = await tracker.wait_for_update("p2", since=1, timeout=0.05)
+    assert snapshot["version"] == 1
+
+
+def test_wait_endpoint_answers_from_memory():
+    user = User(id=42, username="tracker-user", is_admin=False)
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        client = TestClient(app)
+        prompt_tracker.register("endpoint-1", user_id=42)
+        prompt_tracker.handle_event("execution_error", {"prompt_id": "endpoint-1", "exception_message": "boom"})
+
+        resp = client.get("/api/comfy/status/endpoint-1/wait?since=0&timeout=1")
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "failed"
+        assert resp.json()["error"] == "boom"
+
+        resp = client.get("/api/comfy/status/endpoint-1")
+        assert resp.json()["status"] == "failed"
+
+        assert client.get("/api/comfy/status/unknown/wait").status_code == 404
+
+        prompt_tracker.register("endpoint-other", user_id=7)
+        assert client.get("/api/comfy/status/endpoint-other/wait?timeout=0").status_code == 404
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
@@ -0,0 +1,180 @@
+"""
+Tests for reconciling prompts whose ComfyUI events were missed.
+"""
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import services.websocket_manager as ws_module
+from database import Base, GalleryImage, create_async_db_engine, create_db_engine
+from services.image_executor import ImageExecutor
+from services.prompt_tracker import PromptTracker
+from services.websocket_manager import ComfyWebSocketManager
+
+URL = "http://comfy.test"
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 24), (1, 2, 3)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _done(*filenames, status="success", messages=()):
+    return {
+        "outputs": {"9": {"images": [{"filename": f, "subfolder": "", "type": "output"} for f in filenames]}},
+        "status": {"status_str": status, "completed": status == "success", "messages": list(messages)},
+    }
+
+
+@pytest.fixture
+def reconcile_env(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'gallery.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    async_engine = create_async_db_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    Session = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    history = {
+        "pA": _done("a_0.png", "a_1.png"),
+        "pC": _done(status="error", messages=[["execution_error", {"prompt_id": "pC", "exception_message": "OOM"}]]),
+    }
+    older = {"pD": _done("d_0.png")}  # fell out of the /history window
+    requests = []
+
+    def handler(request: httpx.Request):
+        requests.append(request.url.path)
+        if request.url.path == "/queue":
+            return httpx.Response(200, json={"queue_running": [[1, "pB", {}, {}, []]], "queue_pending": []})
+        if request.url.path == "/history":
+            return httpx.Response(200, json=history)
+        if request.url.path.startswith("/history/"):
+            prompt_id = request.url.path.rsplit("/", 1)[1]
+            return httpx.Response(200, json={prompt_id: older[prompt_id]} if prompt_id in older else {})
+        if request.url.path == "/view":
+            return httpx.Response(200, content=_png(), headers={"content-type": "image/png"})
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    tracker = PromptTracker()
+    monkeypatch.setattr(ws_module, "get_comfy_client", lambda url: client)
+    monkeypatch.setattr(ws_module, "AsyncSessionLocal", Session)
+    monkeypatch.setattr(ws_module, "prompt_tracker", tracker)
+    monkeypatch.setattr(ws_module, "image_executor", ImageExecutor(workers=0, queue_size=4))
+    monkeypatch.setattr(ws_module.blob_store, "root", str(tmp_path / "blobs"))
+    monkeypatch.setattr(ws_module.thumbnail_cache, "root", str(tmp_path / "thumbs"))
+
+    manager = ComfyWebSocketManager(URL)
+    yield manager, tracker, Session, requests
+    sync_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_saves_missed_outputs_and_settles_prompts(reconcile_env):
+    manager, tracker, Session, requests = reconcile_env
+    for prompt_id in ("pA", "pB", "pC", "pD", "pE"):
+        manager.register_metadata(prompt_id, {"user_id": 1, "workflow_id": "flux"})
+    async with Session() as db:  # one of pA's images was saved before the socket dropped
+        db.add(GalleryImage(prompt_id="pA", filename="a_0.png", subfolder="", user_id=1))
+        await db.commit()
+
+    await manager.reconcile()
+    await manager.drain_auto_saves(timeout=5)
+
+    async with Session() as db:
+        rows = (await db.execute(select(GalleryImage.prompt_id, GalleryImage.filename))).all()
+    assert sorted(rows) == [("pA", "a_0.png"), ("pA", "a_1.png"), ("pD", "d_0.png")]
+    assert tracker.get("pA").status == "completed" and len(tracker.get("pA").images) == 2
+    assert tracker.get("pD").status == "completed"
+    assert tracker.get("pC").status == "failed" and tracker.get("pC").error == "OOM"
+    assert tracker.get("pB").status == "pending"  # still running in ComfyUI
+    # Neither queued nor in history: ComfyUI lost it, so it fails instead of waiting forever
+    assert tracker.get("pE").status == "failed" and "Lost by ComfyUI" in tracker.get("pE").error
+    # Settled prompts release their metadata; only the running one stays pending
+    assert manager.metadata_store.pending_ids() == ["pB"]
+
+    stats = manager.get_stats()["reconcile"]
+    assert stats["recovered_prompts"] == 2 and stats["recovered_images"] == 2
+    assert stats["failed"] == 1 and stats["lost"] == 1
+    # One /queue and one /history call; only prompts outside the window are looked up one by one
+    assert sorted(path for path in requests if path != "/view") == ["/history", "/history/pD", "/history/pE", "/queue"]
+    await Session.kw["bind"].dispose()
+
+
+@pytest.mark.asyncio
+async def test_individual_lookups_rotate_between_passes(reconcile_env, monkeypatch):
+    manager, tracker, Session, requests = reconcile_env
+    monkeypatch.setattr(ws_module, "RECONCILE_MAX_LOOKUPS", 2)
+    flaky = [f"old{i}" for i in range(4)]  # outside the /history window; their lookups keep failing
+    for prompt_id in flaky + ["pD"]:
+        manager.register_metadata(prompt_id, {"user_id": 1})
+        tracker.get(prompt_id).updated_at -= 60  # no recent live events
+    real_get = ws_module.get_comfy_client(URL).get
+
+    async def get(url, **kwargs):
+        if any(url.endswith(f"/history/{prompt_id}") for prompt_id in flaky):
+            requests.append(url.split(URL, 1)[1])
+            return httpx.Response(500)
+        return await real_get(url, **kwargs)
+
+    monkeypatch.setattr(ws_module.get_comfy_client(URL), "get", get)
+    looked_up = []
+    for _ in range(3):
+        requests.clear()
+        await manager.reconcile()
+        looked_up += [path.rsplit("/", 1)[1] for path in requests if path.startswith("/history/")]
+    await manager.drain_auto_saves(timeout=5)
+    await Session.kw["bind"].dispose()
+
+    # Two lookups per pass, continuing where the last pass stopped (then wrapping around)
+    assert looked_up == flaky + ["pD", "old0"]
+    assert tracker.get("pD").status == "completed"
+    # A failed lookup is not proof the prompt is gone: those stay pending
+    assert manager.metadata_store.pending_ids() == flaky
+    assert all(tracker.get(prompt_id).status == "pending" for prompt_id in flaky)
+
+
+@pytest.mark.asyncio
+async def test_an_output_handed_over_twice_is_saved_once(reconcile_env):
+    manager, tracker, Session, requests = reconcile_env
+    manager.register_metadata("pA", {"user_id": 1})
+    output = {"images": [{"filename": "a_0.png", "subfolder": "", "type": "output"}]}
+    manager.enqueue_auto_save("pA", output)  # from the live `executed` event ...
+    await manager.drain_auto_saves(timeout=5)
+    manager.enqueue_auto_save("pA", output)  # ... and again, e.g. by a reconcile pass that raced it
+    await manager.drain_auto_saves(timeout=5)
+
+    async with Session() as db:
+        rows = (await db.execute(select(GalleryImage.prompt_id, GalleryImage.filename))).all()
+    assert rows == [("pA", "a_0.png")]
+    assert requests.count("/view") == 1  # the duplicate is skipped before downloading
+    await Session.kw["bind"].dispose()
+
+
+@pytest.mark.asyncio
+async def test_saves_of_one_prompt_never_overlap(reconcile_env, monkeypatch):
+    manager, tracker, Session, requests = reconcile_env
+    manager.register_metadata("pA", {"user_id": 1})
+    output = {"images": [{"filename": "a_0.png", "subfolder": "", "type": "output"}]}
+    active, peak, late = [0], [0], []
+
+    async def save(prompt_id, metadata, output, images):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        if not late:  # another save arrives just as this one hands the lock to the waiting one
+            asyncio.get_running_loop().call_soon(lambda: late.append(asyncio.ensure_future(manager._auto_save_images("pA", output))))
+        return True
+
+    monkeypatch.setattr(manager, "_save_new_images", save)
+    await asyncio.gather(manager._auto_save_images("pA", output), manager._auto_save_images("pA", output))
+    await asyncio.gather(*late)
+    assert peak[0] == 1
+    assert manager._save_locks == {}
+    await Session.kw["bind"].dispose()
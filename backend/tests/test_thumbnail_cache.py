@@ -0,0 +1,108 @@
+"""
+Tests for the disk-backed thumbnail cache and the /api/comfy/thumbnail route.
+"""
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+import routes.comfy as comfy_routes
+from services.comfy_pool import ComfyPool
+from services.thumbnail_cache import ThumbnailCache, process_saved_image, render_thumbnail, view_source
+
+NODE_A, NODE_B = "http://gpu-a.test", "http://gpu-b.test"
+
+
+def _png(width=640, height=480, color=(200, 30, 30)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_render_thumbnail_fits_bounding_box():
+    thumb = Image.open(io.BytesIO(render_thumbnail(_png(640, 480), 100)))
+    assert thumb.format == "WEBP"
+    assert thumb.size == (100, 75)
+
+
+def test_hit_miss_counters_and_put_many(tmp_path):
+    cache = ThumbnailCache(str(tmp_path))
+    source = view_source(NODE_A, "a.png")
+    assert cache.get(source, 300) is None
+    cache.put_many(source, process_saved_image(_png(), [100, 300])[2])
+
+    hit = cache.get(source, 300)
+    assert hit is not None
+    path, etag = hit
+    assert Image.open(path).size == (300, 225)
+    assert etag.startswith('"')
+    assert cache.get(source, 100) is not None
+    assert cache.get(view_source(NODE_B, "a.png"), 100) is None  # same name on another node
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+
+
+def test_lru_eviction_respects_budget_and_recency(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=250)
+    cache.put("a", 100, "webp", b"a" * 100)
+    cache.put("b", 100, "webp", b"b" * 100)
+    cache.get("a", 100, "webp")  # a is now most recently used
+    _, etag = cache.put("c", 100, "webp", b"c" * 100)
+
+    assert cache.get("b", 100, "webp") is None
+    assert cache.get("a", 100, "webp") is not None
+    assert cache.get("c", 100, "webp") is not None
+    assert cache.total_bytes == 200
+    assert cache.evictions == 1
+
+    # A fresh instance rebuilds the index from disk
+    reloaded = ThumbnailCache(str(tmp_path), max_bytes=250)
+    assert reloaded.get("c", 100, "webp")[1] == etag  # kept in the index, the file is not re-read
+    assert reloaded.total_bytes == 200
+
+
+@pytest.fixture
+def thumb_client(tmp_path, monkeypatch, comfy_app):
+    calls = []
+    images = {"gpu-a.test": _png(color=(200, 30, 30)), "gpu-b.test": _png(color=(30, 30, 200))}
+
+    def handler(request: httpx.Request):
+        calls.append(str(request.url))
+        return httpx.Response(200, content=images[request.url.host], headers={"content-type": "image/png"})
+
+    monkeypatch.setattr(comfy_routes, "thumbnail_cache", ThumbnailCache(str(tmp_path)))
+    env = comfy_app(handler, url=NODE_A, pool=ComfyPool([NODE_A, NODE_B]))
+    return env.client, calls, env.pool
+
+
+def test_thumbnail_route_caches_and_revalidates(thumb_client):
+    client, calls, _ = thumb_client
+    first = client.get("/api/comfy/thumbnail?filename=a.png&max_size=120")
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/webp"
+    assert first.headers["cache-control"] == "no-cache"  # the name may point at another image later
+    etag = first.headers["etag"]
+
+    second = client.get("/api/comfy/thumbnail?filename=a.png&max_size=120")
+    assert second.content == first.content
+    assert len(calls) == 1  # served from disk, no second ComfyUI download
+
+    not_modified = client.get("/api/comfy/thumbnail?filename=a.png&max_size=120", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert client.get("/api/comfy/thumbnail?filename=a.png&format=gif").status_code == 400
+
+
+def test_nodes_sharing_a_filename_get_their_own_thumbnails(thumb_client):
+    client, calls, pool = thumb_client
+    pool.record_dispatch("p1", NODE_A, "flux1-dev.safetensors")
+    pool.record_dispatch("p2", NODE_B, "flux1-dev.safetensors")
+    url = "/api/comfy/thumbnail?filename=ComfyUI_00001_.png&max_size=64&format=png"
+
+    a = client.get(url + "&prompt_id=p1")
+    b = client.get(url + "&prompt_id=p2")
+    assert Image.open(io.BytesIO(a.content)).getpixel((0, 0)) == (200, 30, 30)
+    assert Image.open(io.BytesIO(b.content)).getpixel((0, 0)) == (30, 30, 200)
+    assert a.headers["etag"] != b.headers["etag"]
+    assert [call.split("/view")[0] for call in calls] == [NODE_A, NODE_B]
@@ -0,0 +1,75 @@
+"""
+Tests for the on-disk workflow template registry.
+"""
+import json
+import os
+import shutil
+
+import pytest
+
+from services.workflow_registry import WORKFLOW_DIR, WorkflowRegistry
+
+
+def _write(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    # Bump mtime explicitly: coarse filesystem clocks may not change between writes
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def workflow_dir(tmp_path):
+    for name in ("manifest.json", "turbo_aio.json", "flux.json", "upscale.json", "basic.json"):
+        shutil.copy(os.path.join(WORKFLOW_DIR, name), tmp_path / name)
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    manifest["templates"].pop("z_image_turbo_aio")
+    _write(tmp_path / "manifest.json", manifest)
+    return tmp_path
+
+
+def test_selection_follows_manifest_rules(workflow_dir):
+    registry = WorkflowRegistry(str(workflow_dir))
+    assert registry.load()
+    assert registry.select("upscale", None).name == "upscale"
+    assert registry.select("turbo-gen", "flux1-dev.safetensors").name == "flux"
+    assert registry.select(None, "v1-5-pruned.ckpt").name == "basic"
+    assert registry.select("turbo-gen", None).name == "turbo_aio"
+    assert "batch_size" not in registry.get("upscale").params
+    assert registry.get_stats()["errors"] == {}
+
+
+def test_invalid_template_is_rejected_and_previous_version_kept(workflow_dir):
+    registry = WorkflowRegistry(str(workflow_dir))
+    registry.load()
+    flux = registry.get("flux")
+
+    graph = json.loads((workflow_dir / "flux.json").read_text())
+    graph["5"]["inputs"]["model"] = ["999", 0]
+    _write(workflow_dir / "flux.json", graph)
+    assert registry.reload_if_changed()
+    assert registry.get("flux") is flux
+    assert "999" in registry.get_stats()["errors"]["flux"]
+
+    (workflow_dir / "manifest.json").write_text("{not json")
+    assert not registry.load()
+    assert registry.get("flux") is flux and registry.default.name == "turbo_aio"
+
+
+def test_hot_reload_picks_up_new_template_and_rules(workflow_dir):
+    registry = WorkflowRegistry(str(workflow_dir))
+    registry.load()
+    assert not registry.reload_if_changed()
+
+    graph = json.loads((workflow_dir / "basic.json").read_text())
+    graph["5"]["inputs"]["steps"] = 42
+    _write(workflow_dir / "sdxl.json", graph)
+    manifest = json.loads((workflow_dir / "manifest.json").read_text())
+    manifest["templates"] = {"sdxl": {"file": "sdxl.json", "models": ["sdxl"]}, **manifest["templates"]}
+    _write(workflow_dir / "manifest.json", manifest)
+
+    assert registry.reload_if_changed()
+    template = registry.select(None, "sd_xl_base_sdxl.safetensors")
+    assert template.name == "sdxl"
+    assert template.build({})["5"]["inputs"]["steps"] == 42
+    assert registry.reloads == 2
@@ -0,0 +1,58 @@
+"""
+Tests for compiled workflow templates.
+"""
+import json
+import os
+
+from schemas.comfy_schemas import ImageGenerateRequest
+from services.workflow_registry import WORKFLOW_DIR, workflow_registry
+from services.workflow_service import build_comfy_workflow, select_template
+from services.workflow_templates import compile_workflow_file
+
+
+def test_ui_exported_workflow_compiles_to_slots():
+    template = compile_workflow_file(os.path.join(WORKFLOW_DIR, "Projekt_generowanie_zdjec_z_image_turbo_AIO.json"))
+    slots = {(s.node_id, s.input_name): s.param for s in template.slots}
+    assert template.sampler_node == "52" and template.checkpoint_node == "48"
+    assert slots[("54", "text")] == "positive_prompt"
+    assert slots[("55", "width")] == "width" and slots[("55", "height")] == "height"
+    assert slots[("52", "seed")] == "seed"
+
+    workflow = template.build({"positive_prompt": "a red door", "width": 640, "height": 832, "seed": 7})
+    assert workflow["54"]["inputs"]["text"] == "a red door"
+    assert (workflow["55"]["inputs"]["width"], workflow["55"]["inputs"]["height"]) == (640, 832)
+    assert workflow["52"]["inputs"]["seed"] == 7
+    assert "_meta" not in workflow["52"]
+    json.dumps(workflow)
+
+
+def test_builds_are_independent_of_the_frozen_template():
+    request = ImageGenerateRequest(positive_prompt="first", lora_names=["a.safetensors"])
+    first = build_comfy_workflow(request)
+    first["2"]["inputs"]["clip"][0] = "corrupted"
+    first["2"]["inputs"]["text"] = "mutated"
+
+    second = build_comfy_workflow(ImageGenerateRequest(positive_prompt="second"))
+    assert second["2"]["inputs"]["text"] == "second"
+    assert second["2"]["inputs"]["clip"] == ["1", 1]
+    assert second["5"]["inputs"]["model"] == ["1", 0]
+    assert "100" not in second
+    seeds = {build_comfy_workflow(request)["5"]["inputs"]["seed"] for _ in range(5)}
+    assert len(seeds) > 1  # re-rolled per build
+
+
+def test_lora_chain_and_template_selection():
+    workflow = build_comfy_workflow(ImageGenerateRequest(
+        positive_prompt="x", model="flux1-dev.safetensors", lora_names=["one", "two"], negative_prompt=""))
+    assert select_template(ImageGenerateRequest(positive_prompt="x", model="flux1-dev.safetensors")) is workflow_registry.get("flux")
+    assert workflow["100"]["inputs"]["model"] == ["1", 0]
+    assert workflow["101"]["inputs"]["model"] == ["100", 0]
+    assert workflow["5"]["inputs"]["model"] == ["101", 0]
+    assert workflow["3"]["inputs"]["text"] == "low quality, blurry"
+
+    upscale = build_comfy_workflow(ImageGenerateRequest(positive_prompt="x", workflow_id="upscale",
+                                                        lora_names=["ignored"], batch_size=4))
+    assert "100" not in upscale  # SeedVR2 graph takes no LoRA chain
+    assert upscale["55"]["inputs"].get("batch_size", 1) == 1
+    # Turbo AIO uses ConditioningZeroOut for the negative: no text slot is invented
+    assert "text" not in build_comfy_workflow(ImageGenerateRequest(positive_prompt="x"))["3"]["inputs"]
@@ -0,0 +1,100 @@
+"""
+Tests for per-user routing of ComfyUI events in ComfyWebSocketManager._broadcast.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+import services.websocket_manager as ws_module
+from services.prompt_tracker import PromptTracker
+from services.websocket_manager import ComfyWebSocketManager, Subscription
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(ws_module, "prompt_tracker", PromptTracker())
+    return ComfyWebSocketManager("http://comfy.test")
+
+
+async def _connect(manager, subscription=None):
+    received = []
+
+    async def client(msg):
+        received.append(msg["type"])
+
+    await manager.add_client(client, subscription)
+    return received
+
+
+@pytest.mark.asyncio
+async def test_prompt_events_reach_only_owner_and_watching_admins(manager):
+    owner = await _connect(manager, Subscription(1))
+    other = await _connect(manager, Subscription(2))
+    watcher = await _connect(manager, Subscription(3, is_admin=True, watch_all=True))
+    admin = await _connect(manager, Subscription(4, is_admin=True))
+    fake_admin = await _connect(manager, Subscription(5, watch_all=True))  # opt-in ignored for non-admins
+    internal = await _connect(manager)
+    manager.register_metadata("p1", {"user_id": 1})
+
+    await manager._broadcast({"type": "progress", "data": {"prompt_id": "p1", "value": 1, "max": 8}})
+    await manager._broadcast({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": 1}}}})
+    # No prompt_id (older ComfyUI): attributed to the prompt that is executing
+    manager.current_prompt_id = "p1"
+    await manager._broadcast({"type": "progress", "data": {"value": 2, "max": 8}})
+    # Prompt queued outside the wrapper: nobody owns it
+    await manager._broadcast({"type": "executing", "data": {"prompt_id": "foreign", "node": "3"}})
+
+    assert owner == ["progress", "status", "progress"]
+    assert other == admin == fake_admin == ["status"]
+    assert watcher == internal == ["progress", "status", "progress", "executing"]
+    assert manager.get_stats()["broadcast"]["filtered"] == 3 + 0 + 3 + 4
+
+
+@pytest.mark.asyncio
+async def test_sends_are_concurrent_and_bounded(manager, monkeypatch):
+    monkeypatch.setattr(ws_module, "BROADCAST_SEND_TIMEOUT", 0.05)
+    received = []
+
+    async def stuck(msg):
+        await asyncio.sleep(10)
+
+    async def fast(msg):
+        received.append(msg)
+
+    await manager.add_client(stuck, Subscription(1))
+    await manager.add_client(fast, Subscription(1))
+    manager.register_metadata("p1", {"user_id": 1})
+
+    started = time.monotonic()
+    await manager._broadcast({"type": "executed", "data": {"prompt_id": "p1"}})
+    assert time.monotonic() - started < 1
+    assert len(received) == 1
+    assert manager.broadcast_stats["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_events_before_prompt_returns_reach_the_owner(manager, monkeypatch):
+    import httpx
+
+    import routes.comfy as comfy_routes
+    from database import User
+    from schemas.comfy_schemas import ImageGenerateRequest
+
+    async def handler(request: httpx.Request):
+        # ComfyUI starts the prompt and emits events before answering /prompt
+        prompt_id = json.loads(request.content)["prompt_id"]
+        await manager._broadcast({"type": "execution_start", "data": {"prompt_id": prompt_id}})
+        return httpx.Response(200, json={"prompt_id": prompt_id, "number": 1})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(comfy_routes, "get_manager", lambda url: manager)
+    monkeypatch.setattr(comfy_routes, "get_comfy_client", lambda url: client)
+    monkeypatch.setattr(comfy_routes, "prompt_tracker", ws_module.prompt_tracker)
+    owner = await _connect(manager, Subscription(7))
+    other = await _connect(manager, Subscription(8))
+
+    request = ImageGenerateRequest(positive_prompt="x")
+    await comfy_routes._queue_prompt("http://comfy.test", {}, request, User(id=7, username="u"), "minted-1")
+    assert owner == ["execution_start"] and other == []
@@ -33,6 +33,16 @@ export default function Gallery({ id = "main-gallery", refreshTrigger, onSelect
                 onDelete={g.handleDelete}
             />
 
+            {g.nextCursor && !g.loading && (
+                <button
+                    onClick={g.loadMore}
+                    disabled={g.loadingMore}
+                    className="w-full mt-4 py-2 bg-white/5 hover:bg-emerald-500/10 text-white/60 hover:text-emerald-400 border border-white/10 hover:border-emerald-500/50 rounded text-[10px] uppercase font-bold transition-all"
+                >
+                    {g.loadingMore ? "Loading..." : "Load more"}
+                </button>
+            )}
+
             {g.selectedImage && (
                 <GalleryLightbox
                     item={g.selectedImage}
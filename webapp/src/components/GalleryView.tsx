@@ -1,5 +1,5 @@
 import React, { useEffect, useState, useRef } from 'react';
-import { GalleryItem, fetchGallery, deleteFromGallery, clearGallery, getImageUrl } from '@/lib/api';
+import { GalleryItem, fetchGalleryPage, deleteFromGallery, clearGallery, getImageUrl, getThumbnailUrl } from '@/lib/api';
 import ComparisonSlider from './ComparisonSlider';
 
 interface GalleryViewProps {
@@ -12,6 +12,7 @@ interface GalleryViewProps {
     handleGenerate: () => void;
     isGenerating: boolean;
     progress?: { value: number; max: number };
+    livePreview?: string | null;
     workflowId?: string;
 }
 
@@ -25,11 +26,15 @@ export default function GalleryView({
     handleGenerate,
     isGenerating,
     progress = { value: 0, max: 1 },
+    livePreview = null,
     workflowId = "turbo-gen"
 }: GalleryViewProps) {
     const [images, setImages] = useState<GalleryItem[]>([]);
     const [loading, setLoading] = useState(false);
     const [searchTerm, setSearchTerm] = useState("");
+    // Cursor of the next (older) page; null once everything is loaded
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const [selectedImage, setSelectedImage] = useState<GalleryItem | null>(null);
     const [comparisonPair, setComparisonPair] = useState<{
@@ -63,9 +68,10 @@ export default function GalleryView({
     const loadGallery = async () => {
         setLoading(true);
         try {
-            const data = await fetchGallery(workflowId);
-            const sorted = data.sort((a: GalleryItem, b: GalleryItem) => b.id - a.id);
+            const page = await fetchGalleryPage(workflowId);
+            const sorted = page.items.sort((a: GalleryItem, b: GalleryItem) => b.id - a.id);
             setImages(sorted);
+            setNextCursor(page.next_cursor);
             return sorted;
         } catch (e) {
             console.error(e);
@@ -75,6 +81,20 @@ export default function GalleryView({
         }
     };
 
+    const loadMore = async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchGalleryPage(workflowId, nextCursor);
+            setImages(prev => [...prev, ...page.items.filter(item => !prev.some(p => p.id === item.id))]);
+            setNextCursor(page.next_cursor);
+        } catch (e) {
+            console.error(e);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleDelete = async (id: number, e: React.MouseEvent) => {
         e.stopPropagation();
         if (confirm("Delete this image from history? (File remains on disk)")) {
@@ -228,7 +248,15 @@ Generated via Cinematic Matrix`.trim();
                     <div className="text-sm text-white/50 animate-pulse">Loading gallery...</div>
                 ) : (
                     <div className="grid grid-cols-2 sm:grid-cols-3 md:grid-cols-4 lg:grid-cols-5 gap-3 max-h-[800px] overflow-y-auto pr-2 custom-scrollbar">
-                        {filteredImages.length === 0 && (
+                        {isGenerating && livePreview && (
+                            <div className="relative rounded-lg overflow-hidden bg-black/20 border border-emerald-500/50 shadow-[0_0_15px_rgba(16,185,129,0.3)]">
+                                <img src={livePreview} alt="Live preview" className="w-full h-full object-cover" />
+                                <span className="absolute bottom-1 left-1 px-1.5 py-0.5 bg-black/60 rounded text-[9px] text-emerald-400 font-mono uppercase animate-pulse">
+                                    Live {((progress.value / (progress.max || 1)) * 100).toFixed(0)}%
+                                </span>
+                            </div>
+                        )}
+                        {filteredImages.length === 0 && !(isGenerating && livePreview) && (
                             <div className="col-span-full text-center text-xs text-white/30 py-8">
                                 {images.length === 0 ? "No images yet. Start creating!" : "No matching images found."}
                             </div>
@@ -242,7 +270,7 @@ Generated via Cinematic Matrix`.trim();
                                 onClick={() => handleImageClick(img)}
                             >
                                 <img
-                                    src={getImageUrl(img.filename, img.subfolder, "output", img.image_data)}
+                                    src={getThumbnailUrl(img.filename, img.subfolder, 300, img.image_url || img.image_data)}
                                     alt={img.prompt_positive}
                                     className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-500"
                                     loading="lazy"
@@ -268,6 +296,16 @@ Generated via Cinematic Matrix`.trim();
                         ))}
                     </div>
                 )}
+
+                {nextCursor && !loading && (
+                    <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="w-full mt-4 py-2 bg-white/5 hover:bg-emerald-500/10 text-white/60 hover:text-emerald-400 border border-white/10 hover:border-emerald-500/50 rounded text-[10px] uppercase font-bold transition-all"
+                    >
+                        {loadingMore ? "Loading..." : "Load more"}
+                    </button>
+                )}
             </div>
 
             {/* FULLSCREEN MODAL - UNIFIED */}
@@ -345,7 +383,7 @@ Generated via Cinematic Matrix`.trim();
 
                                     <img
                                         key={selectedImage.id}
-                                        src={getImageUrl(selectedImage.filename, selectedImage.subfolder, "output", selectedImage.image_data)}
+                                        src={getImageUrl(selectedImage.filename, selectedImage.subfolder, "output", selectedImage.image_url || selectedImage.image_data)}
                                         alt={selectedImage.prompt_positive}
                                         className={`max-w-full max-h-[85vh] object-contain shadow-[0_30px_100px_rgba(0,0,0,0.5)] transition-all duration-1000 ${isGenerating ? 'opacity-40 blur-[4px] grayscale-[0.5]' : 'opacity-100 blur-0 grayscale-0 animate-matrix-decode'}`}
                                         onClick={(e) => e.stopPropagation()}
@@ -353,6 +391,9 @@ Generated via Cinematic Matrix`.trim();
 
                                     {isGenerating && (
                                         <div className="absolute inset-0 flex flex-col items-center justify-center bg-black/60 backdrop-blur-sm z-30">
+                                            {livePreview && (
+                                                <img src={livePreview} alt="Live preview" className="absolute inset-0 w-full h-full object-contain opacity-80 -z-10" />
+                                            )}
                                             <div className="w-64 h-1 bg-white/10 rounded-full overflow-hidden mb-4 relative">
                                                 <div
                                                     className="h-full bg-emerald-500 shadow-[0_0_15px_#10b981] transition-all duration-300 ease-out relative z-10"
@@ -388,7 +429,7 @@ Generated via Cinematic Matrix`.trim();
                                             : 'border-white/10 opacity-50 hover:opacity-100 hover:border-white/30'
                                             }`}
                                     >
-                                        <img src={getImageUrl(img.filename, img.subfolder, "output", img.image_data)} className="w-full h-full object-cover" loading="lazy" />
+                                        <img src={getThumbnailUrl(img.filename, img.subfolder, 100, img.image_url || img.image_data)} className="w-full h-full object-cover" loading="lazy" />
                                     </div>
                                 ))}
                             </div>
@@ -75,6 +75,7 @@ export default function WorkflowPage({
                         handleGenerate={logic.handleGenerate}
                         isGenerating={logic.isGenerating}
                         progress={logic.progress}
+                        livePreview={logic.livePreview}
                         workflowId={workflowId}
                     />
                 </div>
@@ -2,7 +2,7 @@
 "use client";
 
 import { useState, useEffect } from 'react';
-import { GalleryItem, fetchGallery, deleteFromGallery, clearGallery } from '@/lib/api';
+import { GalleryItem, fetchGalleryPage, deleteFromGallery, clearGallery } from '@/lib/api';
 
 export function useGalleryLogic(refreshTrigger: number) {
     const [images, setImages] = useState<GalleryItem[]>([]);
@@ -10,6 +10,9 @@ export function useGalleryLogic(refreshTrigger: number) {
     const [searchTerm, setSearchTerm] = useState("");
     const [selectedImage, setSelectedImage] = useState<GalleryItem | null>(null);
     const [copied, setCopied] = useState(false);
+    // Cursor of the next (older) page; null once everything is loaded
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     useEffect(() => {
         loadGallery();
@@ -18,8 +21,9 @@ export function useGalleryLogic(refreshTrigger: number) {
     const loadGallery = async () => {
         setLoading(true);
         try {
-            const data = await fetchGallery();
-            setImages(data);
+            const page = await fetchGalleryPage();
+            setImages(page.items);
+            setNextCursor(page.next_cursor);
         } catch (e) {
             console.error("Gallery: Load failed", e);
         } finally {
@@ -27,6 +31,20 @@ export function useGalleryLogic(refreshTrigger: number) {
         }
     };
 
+    const loadMore = async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchGalleryPage(undefined, nextCursor);
+            setImages(prev => [...prev, ...page.items.filter(item => !prev.some(p => p.id === item.id))]);
+            setNextCursor(page.next_cursor);
+        } catch (e) {
+            console.error("Gallery: Load more failed", e);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const handleDelete = async (id: number, e?: React.MouseEvent) => {
         e?.stopPropagation();
         if (confirm("Delete this image from history? (File remains on disk)")) {
@@ -89,6 +107,9 @@ export function useGalleryLogic(refreshTrigger: number) {
         handleNext,
         handlePrev,
         copyPrompt,
-        copied
+        copied,
+        nextCursor,
+        loadMore,
+        loadingMore
     };
 }
@@ -3,14 +3,15 @@
 
 import { useState, useEffect } from 'react';
 import {
-    generateImage,
+    generateBatch,
     GenerationRequest,
     fetchPresets,
     savePreset,
     deletePreset,
     GenerationPreset,
     useComfyWebSocket,
-    fetchPromptStatus
+    fetchPromptStatus,
+    waitPromptStatus
 } from "@/lib/api";
 
 export function useGenerationLogic(workflowId: string = "default") {
@@ -32,6 +33,7 @@ export function useGenerationLogic(workflowId: string = "default") {
     const [batchCount, setBatchCount] = useState(1);
     const [currentBatchIndex, setCurrentBatchIndex] = useState(0);
     const [progress, setProgress] = useState({ value: 0, max: 0 });
+    const [currentPromptId, setCurrentPromptId] = useState<string | null>(null);
     const [startTime, setStartTime] = useState<number | null>(null);
     const [elapsedTime, setElapsedTime] = useState<number>(0);
 
@@ -66,7 +68,10 @@ export function useGenerationLogic(workflowId: string = "default") {
     }, [isGenerating, startTime]);
 
     // WebSocket Logic for Status & Auto-Save
-    const { lastMessage } = useComfyWebSocket();
+    const { lastMessage, lastPreview } = useComfyWebSocket();
+
+    // Live latent preview of the prompt this lab is waiting on (frames of other prompts are ignored)
+    const livePreview = currentPromptId && lastPreview?.promptId === currentPromptId ? lastPreview.url : null;
 
     // Watch for progress and execution events
     useEffect(() => {
@@ -118,6 +123,29 @@ export function useGenerationLogic(workflowId: string = "default") {
     }, []);
 
     const waitForCompletion = async (promptId: string): Promise<any> => {
+        let since = 0;
+        while (true) {
+            try {
+                const statusData = await waitPromptStatus(promptId, since);
+                if (!statusData) {
+                    return await pollForCompletion(promptId);
+                }
+                since = statusData.version ?? since;
+
+                if (statusData.status === 'completed' && (statusData.filename || statusData.filenames)) {
+                    return { status: 'success', data: statusData };
+                } else if (statusData.status === 'failed' || statusData.status === 'interrupted') {
+                    return { status: 'failed', error: statusData.error || 'Generation failed' };
+                }
+            } catch (e) {
+                console.error("Status wait error", e);
+                await new Promise(r => setTimeout(r, 1000));
+            }
+        }
+    };
+
+    // Fallback for prompts the backend is not tracking in memory
+    const pollForCompletion = async (promptId: string): Promise<any> => {
         return new Promise((resolve) => {
             const pollInterval = setInterval(async () => {
                 try {
@@ -149,48 +177,48 @@ export function useGenerationLogic(workflowId: string = "default") {
 
         try {
             fetch(`/api/comfy/debug/batch_count_${batchCount}`);
-            for (let i = 0; i < batchCount; i++) {
+            setGenerationStatus(`Queuing ${batchCount} batch${batchCount > 1 ? 'es' : ''}...`);
+
+            const request: GenerationRequest = {
+                positive_prompt: positivePrompt,
+                negative_prompt: negativePrompt,
+                width,
+                height,
+                model: selectedModel,
+                lora_names: selectedLoras,
+                steps,
+                cfg,
+                sampler_name: sampler,
+                batch_size: batchSize,
+                workflow_id: workflowId,
+            };
+
+            // Force CFG 1.0 for Turbo workflows
+            if (workflowId === 'turbo-gen' || workflowId === 'upscale') {
+                request.cfg = 1.0;
+            }
+
+            // Queue every batch up front so ComfyUI never idles between them
+            console.log("🚀 SENDING BATCH GENERATION REQUEST:", request, batchCount);
+            const batch = await generateBatch(request, batchCount);
+            fetch(`/api/comfy/debug/batch_${batch.batch_id}_${batch.status}`);
+
+            for (const item of batch.items) {
+                const i = item.index;
                 setCurrentBatchIndex(i + 1);
-                setGenerationStatus(`Queuing Batch ${i + 1}/${batchCount}...`);
-
-                const request: GenerationRequest = {
-                    positive_prompt: positivePrompt,
-                    negative_prompt: negativePrompt,
-                    width,
-                    height,
-                    model: selectedModel,
-                    lora_names: selectedLoras,
-                    steps,
-                    cfg,
-                    sampler_name: sampler,
-                    batch_size: batchSize,
-                    workflow_id: workflowId,
-                };
-
-                // Force CFG 1.0 for Turbo workflows
-                if (workflowId === 'turbo-gen' || workflowId === 'upscale') {
-                    request.cfg = 1.0;
+                if (!item.prompt_id) {
+                    setGenerationStatus(`Batch ${i + 1} failed to queue`);
+                    continue;
                 }
+                setGenerationStatus(`Generating Batch ${i + 1}/${batchCount}...`);
+                setCurrentPromptId(item.prompt_id);
+                const result = await waitForCompletion(item.prompt_id);
+                fetch(`/api/comfy/debug/completed_${item.prompt_id}`);
 
-                console.log("🚀 SENDING GENERATION REQUEST:", request);
-                fetch(`/api/comfy/debug/sending_request_batch_${i}`);
-                const res = await generateImage(request);
-                fetch(`/api/comfy/debug/response_status_${res.status}`);
-
-                if (res.status === 'queued') {
-                    setGenerationStatus(`Generating Batch ${i + 1}/${batchCount}...`);
-                    fetch(`/api/comfy/debug/waiting_for_completion_${res.prompt_id}`);
-                    const result = await waitForCompletion(res.prompt_id);
-                    fetch(`/api/comfy/debug/completed_${res.prompt_id}`);
-
-                    if (result.status === 'success') {
-                        setGalleryRefresh(prev => prev + 1);
-                    } else {
-                        setGenerationStatus(`Batch ${i + 1} Failed`);
-                    }
+                if (result.status === 'success') {
+                    setGalleryRefresh(prev => prev + 1);
                 } else {
-                    setGenerationStatus("Failed to queue");
-                    fetch(`/api/comfy/debug/error_res_status_${res.status}`);
+                    setGenerationStatus(`Batch ${i + 1} Failed`);
                 }
             }
             setGenerationStatus("Finished");
@@ -203,6 +231,7 @@ export function useGenerationLogic(workflowId: string = "default") {
             setIsProcessing(false);
             setProgress({ value: 0, max: 0 });
             setStartTime(null);
+            setCurrentPromptId(null);
         }
     };
 
@@ -294,6 +323,7 @@ export function useGenerationLogic(workflowId: string = "default") {
         batchCount, setBatchCount,
         currentBatchIndex, setCurrentBatchIndex,
         progress, setProgress,
+        livePreview,
         elapsedTime,
         galleryRefresh, setGalleryRefresh,
         presets, setPresets,
@@ -74,6 +74,14 @@ export const fetchPromptStatus = async (promptId: string) => {
     return await res.json();
 };
 
+// Long-poll: resolves when the prompt's state version moves past `since`.
+// Returns null if the backend is not tracking this prompt (e.g. after a restart).
+export const waitPromptStatus = async (promptId: string, since: number = 0, timeout: number = 25) => {
+    const res = await authFetch(`/api/comfy/status/${promptId}/wait?since=${since}&timeout=${timeout}`);
+    if (res.status === 404) return null;
+    return await res.json();
+};
+
 // --- Auth API ---
 
 export interface AuthUser {
@@ -137,9 +145,13 @@ export const updateProfile = async (data: { display_name?: string; comfyui_url?:
 
 // --- Existing API (now with auth) ---
 
+// Stored gallery images: inline data URL (legacy) or content-addressed blob URL
+const isStoredImageSrc = (src?: string) =>
+    !!src && (src.startsWith('data:image') || src.startsWith('/api/gallery/blobs/'));
+
 export const getImageUrl = (filename: string, subfolder: string = "", type: string = "output", imageData?: string) => {
-    if (imageData && imageData.startsWith('data:image')) {
-        return imageData;
+    if (isStoredImageSrc(imageData)) {
+        return imageData as string;
     }
     let url = `${getApiBaseUrl()}/image?filename=${filename}&type=${type}`;
     if (subfolder) url += `&subfolder=${subfolder}`;
@@ -147,8 +159,12 @@ export const getImageUrl = (filename: string, subfolder: string = "", type: stri
 };
 
 export const getThumbnailUrl = (filename: string, subfolder: string = "", maxSize: number = 300, imageData?: string) => {
-    if (imageData && imageData.startsWith('data:image')) {
-        return imageData;
+    // Blob-backed images: the thumbnail pregenerated at save time, not the full-size original
+    if (imageData?.startsWith('/api/gallery/blobs/')) {
+        return `${imageData}/thumbnail?max_size=${maxSize}`;
+    }
+    if (isStoredImageSrc(imageData)) {
+        return imageData as string;
     }
     let url = `${getApiBaseUrl()}/thumbnail?filename=${filename}&max_size=${maxSize}`;
     if (subfolder) url += `&subfolder=${subfolder}`;
@@ -215,6 +231,26 @@ export const generateImage = async (req: GenerationRequest) => {
     return await res.json();
 };
 
+export interface BatchGenerationResponse {
+    batch_id: string;
+    status: 'queued' | 'partial';
+    prompt_ids: string[];
+    items: { index: number; prompt_id: string | null; status: string; error: string | null }[];
+}
+
+// Queue `count` generations in one round trip; the backend fills the ComfyUI queue back-to-back.
+export const generateBatch = async (req: GenerationRequest, count: number): Promise<BatchGenerationResponse> => {
+    const res = await authFetch(`${getApiBaseUrl()}/generate/batch`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ ...req, count }),
+    });
+    if (!res.ok) throw new Error(`Batch generation failed: ${res.status}`);
+    return await res.json();
+};
+
 export interface GenerationPreset {
     id?: number;
     name: string;
@@ -272,13 +308,32 @@ export const deletePreset = async (name: string) => {
     });
 };
 
+export interface LivePreview {
+    promptId: string | null;
+    url: string;
+}
+
+// Binary frame from the backend preview relay: [type=4][metadata length][metadata JSON][image]
+const decodePreviewFrame = (buffer: ArrayBuffer): { metadata: any; image: Blob } | null => {
+    if (buffer.byteLength < 8) return null;
+    const view = new DataView(buffer);
+    if (view.getUint32(0) !== 4) return null;
+    const length = view.getUint32(4);
+    const metadata = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, length)));
+    const image = new Blob([new Uint8Array(buffer, 8 + length)], { type: metadata.image_type || 'image/jpeg' });
+    return { metadata, image };
+};
+
 export const useComfyWebSocket = () => {
     const [socket, setSocket] = useState<WebSocket | null>(null);
     const [lastMessage, setLastMessage] = useState<any>(null);
+    const [lastPreview, setLastPreview] = useState<LivePreview | null>(null);
     const [isConnected, setIsConnected] = useState(false);
 
     useEffect(() => {
         const ws = new WebSocket(getWsUrl());
+        ws.binaryType = 'arraybuffer';
+        let previewUrl: string | null = null;
 
         ws.onopen = () => {
             console.log('Connected to WebSocket');
@@ -286,6 +341,18 @@ export const useComfyWebSocket = () => {
         };
 
         ws.onmessage = (event) => {
+            if (event.data instanceof ArrayBuffer) {
+                try {
+                    const frame = decodePreviewFrame(event.data);
+                    if (!frame) return;
+                    if (previewUrl) URL.revokeObjectURL(previewUrl);
+                    previewUrl = URL.createObjectURL(frame.image);
+                    setLastPreview({ promptId: frame.metadata.prompt_id ?? null, url: previewUrl });
+                } catch (e) {
+                    console.error('Failed to decode preview frame', e);
+                }
+                return;
+            }
             try {
                 const data = JSON.parse(event.data);
                 setLastMessage(data);
@@ -303,10 +370,11 @@ export const useComfyWebSocket = () => {
 
         return () => {
             ws.close();
+            if (previewUrl) URL.revokeObjectURL(previewUrl);
         };
     }, []);
 
-    return { socket, lastMessage, isConnected };
+    return { socket, lastMessage, lastPreview, isConnected };
 };
 
 export interface GalleryItem {
@@ -323,6 +391,10 @@ export interface GalleryItem {
     steps: number;
     cfg: number;
     image_data?: string;
+    image_hash?: string;
+    image_size?: number;
+    image_mime?: string;
+    image_url?: string;
     created_at: string;
 }
 
@@ -340,13 +412,24 @@ export interface GalleryItemCreate {
     image_data?: string;
 }
 
+export interface GalleryPage {
+    items: GalleryItem[];
+    next_cursor: string | null;
+}
+
+export const fetchGalleryPage = async (workflowId?: string, cursor?: string | null, limit: number = 50): Promise<GalleryPage> => {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (workflowId) params.set('workflow_id', workflowId);
+    if (cursor) params.set('cursor', cursor);
+    const res = await authFetch(`${getGalleryUrl()}/page?${params.toString()}`);
+    if (!res.ok) return { items: [], next_cursor: null };
+    return await res.json();
+};
+
 export const fetchGallery = async (workflowId?: string): Promise<GalleryItem[]> => {
     try {
-        const url = workflowId
-            ? `${getGalleryUrl()}?workflow_id=${workflowId}`
-            : getGalleryUrl();
-        const res = await authFetch(url);
-        return await res.json();
+        const page = await fetchGalleryPage(workflowId);
+        return page.items;
     } catch (e) {
         return [];
     }